@@ -0,0 +1,74 @@
+"""
+أدوات مشتركة لسكربتات قياس الأداء.
+
+تعمل السكربتات على قاعدة بيانات اختبار مؤقتة (ملف SQLite في مجلد مؤقت) حتى لا تلمس البيانات الحقيقية:
+
+    python -m benchmarks.stock_ledger --workers 8
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_management.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+
+@contextmanager
+def benchmark_database():
+    """إنشاء قاعدة اختبار مؤقتة على القرص وحذفها بعد الانتهاء"""
+    old_name = connection.settings_dict['NAME']
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def timed(label, rows):
+    """طباعة الزمن المستغرق ومعدل الصفوف في الثانية"""
+    started = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed else float('inf')
+    print(f'{label:<40} {rows:>10} rows {elapsed:>9.3f}s {rate:>12.0f} rows/sec')
+
+
+def create_catalog(size, quantity=1000, batch_size=5000):
+    """إنشاء فئة ومنتجات للاختبار بإدخال مجمّع"""
+    from decimal import Decimal
+
+    from inventory.counters import rebuild_category_counters
+    from inventory.models import Category, Product
+
+    category = Category.objects.create(name='Benchmark')
+    Product.objects.bulk_create(
+        (
+            Product(
+                name=f'Benchmark product {i}',
+                sku=f'BM-{i:08d}',
+                category=category,
+                quantity=quantity,
+                cost_price=Decimal('10.00'),
+                selling_price=Decimal('15.00'),
+            )
+            for i in range(size)
+        ),
+        batch_size=batch_size,
+    )
+    rebuild_category_counters([category.pk])
+    return list(Product.objects.order_by('pk').values_list('pk', flat=True))
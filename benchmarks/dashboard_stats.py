@@ -0,0 +1,111 @@
+"""
+قياس زمن إحصائيات لوحة التحكم (p50 و p99) مقابل هدف 20 ms: الحساب المباشر من القاعدة ثم القراءة من
+الذاكرة المؤقتة، على كتالوج وطلبات وتجميعات يومية لسنة كاملة.
+
+    python -m benchmarks.dashboard_stats --products 50000 --orders 200000 --repeat 200
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks._common import benchmark_database, create_catalog, timed
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import Order
+from stats.models import DailySalesRollup
+from stats.utils import (
+    compute_dashboard_stats, compute_monthly_sales_data, get_dashboard_stats, get_monthly_sales_data,
+)
+
+TARGET_MS = 20
+
+
+def create_orders(count, seed=1):
+    """طلبات موزعة على السنة الماضية؛ إدخال مباشر لأن created_at يُملأ تلقائيًا عند الإنشاء"""
+    rng = random.Random(seed)
+    client = get_user_model().objects.create_user('benchmark-client')
+    now = timezone.now()
+    statuses = [choice for choice, _ in Order.OrderStatus.choices]
+    table = Order._meta.db_table
+    sql = (
+        f'INSERT INTO {table} (order_number, client_id, status, created_at, updated_at, '
+        f'cached_total_amount, cached_total_items) VALUES (%s, %s, %s, %s, %s, %s, %s)'
+    )
+    rows = []
+    for i in range(count):
+        created_at = now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+        total = Decimal(rng.randint(1000, 100000)) / 100
+        rows.append((f'BM-{i:010d}', client.pk, rng.choice(statuses), created_at, created_at, total, rng.randint(1, 20)))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def create_rollups(product_ids, per_day, seed=1):
+    """صفوف تجميع يومية لسنة كاملة لعينة من المنتجات في كل يوم"""
+    rng = random.Random(seed)
+    category_id = DailySalesRollup._meta.get_field('category').related_model.objects.get().pk
+    today = timezone.localdate()
+    DailySalesRollup.objects.bulk_create(
+        (
+            DailySalesRollup(
+                date=today - timedelta(days=day),
+                product_id=product_id,
+                category_id=category_id,
+                quantity=rng.randint(1, 50),
+                revenue=Decimal(rng.randint(1000, 100000)) / 100,
+                cost=Decimal(rng.randint(500, 50000)) / 100,
+            )
+            for day in range(365)
+            for product_id in rng.sample(product_ids, min(per_day, len(product_ids)))
+        ),
+        batch_size=5000,
+    )
+
+
+def measure(label, function, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    verdict = 'ok' if p99 <= TARGET_MS else 'over target'
+    print(f'{label:<40} p50 {p50:>8.2f} ms   p99 {p99:>8.2f} ms   {verdict}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--rollups-per-day', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        with timed('create catalog', args.products):
+            product_ids = create_catalog(args.products)
+        with timed('create orders', args.orders):
+            create_orders(args.orders)
+        with timed('create daily rollups', 365 * args.rollups_per_day):
+            create_rollups(product_ids, args.rollups_per_day)
+        year = timezone.localdate().year
+
+        measure('dashboard stats, uncached', compute_dashboard_stats, args.repeat)
+        measure('monthly sales, uncached', lambda: compute_monthly_sales_data(year), args.repeat)
+        measure('dashboard stats, first read (miss)', get_dashboard_stats, args.repeat, before=cache.clear)
+        measure('dashboard stats, cached', get_dashboard_stats, args.repeat)
+        measure('monthly sales, cached', get_monthly_sales_data, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
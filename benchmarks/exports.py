@@ -0,0 +1,93 @@
+"""
+قياس الذاكرة القصوى (peak RSS) ومعدل الصفوف لتصدير المنتجات إلى CSV/XLSX.
+
+كل حالة تعمل في عملية مستقلة حتى لا تتأثر قراءة الذاكرة بالحالات السابقة:
+
+    python -m benchmarks.exports --sizes 1000 100000 1000000 --formats csv xlsx
+"""
+import argparse
+import csv
+import gc
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def _reset_peak_rss():
+    # على Linux تعيد الكتابة في clear_refs ضبط VmHWM، فنقيس ذروة التصدير وحده دون مرحلة التعبئة
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(size, fmt, mode):
+    from benchmarks._common import benchmark_database, create_catalog
+
+    from inventory.models import Product
+    from inventory_management.exports import DATASETS, export_chunks
+
+    with benchmark_database():
+        create_catalog(size)
+        gc.collect()
+        _reset_peak_rss()
+        baseline = _peak_rss_mb()
+        started = time.perf_counter()
+        with open(os.devnull, 'w' if fmt == 'csv' else 'wb') as output:
+            if mode == 'naive':
+                # الطريقة التي تحمّل الجدول كاملًا: نسخ نماذج في قائمة ثم الكتابة
+                products = list(Product.objects.select_related('category').order_by('pk'))
+                writer = csv.writer(output)
+                writer.writerow(DATASETS['products'].headers)
+                for product in products:
+                    writer.writerow([
+                        product.sku, product.name, product.category.name, product.quantity, product.reorder_level,
+                        product.cost_price, product.selling_price, product.is_active, product.is_low_stock,
+                        product.updated_at,
+                    ])
+            else:
+                for chunk in export_chunks('products', fmt):
+                    output.write(chunk)
+        elapsed = time.perf_counter() - started
+    peak = _peak_rss_mb()
+    print(f'{mode:<10} {fmt:<5} {size:>10} rows {elapsed:>9.3f}s {size / elapsed:>12.0f} rows/sec '
+          f'{peak:>9.1f} MB peak RSS (+{peak - baseline:.1f} MB during export)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--formats', nargs='+', choices=['csv', 'xlsx'], default=['csv', 'xlsx'])
+    parser.add_argument('--naive', action='store_true', help='Also run the load-everything baseline (CSV)')
+    parser.add_argument('--case', nargs=3, metavar=('SIZE', 'FORMAT', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        size, fmt, mode = args.case
+        run_case(int(size), fmt, mode)
+        return
+
+    cases = [(size, fmt, 'streaming') for size in args.sizes for fmt in args.formats]
+    if args.naive:
+        cases += [(size, 'csv', 'naive') for size in args.sizes]
+    for size, fmt, mode in cases:
+        subprocess.run([sys.executable, '-m', 'benchmarks.exports', '--case', str(size), fmt, mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+قياس تحويل الفواتير إلى PDF: زمن التحويل داخل الطلب، والخدمة من الذاكرة المؤقتة، والتحويل المجمّع
+بعملية واحدة مقابل مجموعة عمليات.
+
+    python -m benchmarks.invoice_pdf --invoices 500 --items 8 --workers 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from benchmarks._common import benchmark_database, create_catalog, timed
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
+
+from invoices import pdf
+from invoices.models import Invoice
+from orders.models import Order, OrderItem
+
+
+def create_invoices(count, items):
+    client = get_user_model().objects.create_user('benchmark-client')
+    product_ids = create_catalog(items)
+    for _ in range(count):
+        order = Order.objects.create(client=client)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_id=product_id, quantity=2, price=Decimal('15.00'))
+            for product_id in product_ids
+        )
+        Invoice.objects.create(order=order, tax_rate=Decimal('15'))
+
+
+def per_request(label, invoice_ids, render):
+    started = time.perf_counter()
+    for invoice_id in invoice_ids:
+        document = pdf.build_document(pdf.load_invoices(Invoice.objects.all()).get(pk=invoice_id))
+        render(document)
+    elapsed = (time.perf_counter() - started) / len(invoice_ids) * 1000
+    print(f'{label:<40} {elapsed:>10.1f} ms/request')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invoices', type=int, default=500)
+    parser.add_argument('--items', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with benchmark_database(), tempfile.TemporaryDirectory() as directory:
+        create_invoices(args.invoices, args.items)
+        sample = list(Invoice.objects.order_by('pk').values_list('pk', flat=True)[:20])
+        quiet = open(os.devnull, 'w')
+
+        with override_settings(INVOICE_PDF_CACHE_DIR=os.path.join(directory, 'sync')):
+            per_request('render inside the request', sample, lambda d: pdf.render_file(d.html, d.path))
+            per_request('served from the PDF cache', sample, lambda d: d.is_cached())
+
+        for workers in sorted({1, args.workers}):
+            with override_settings(INVOICE_PDF_CACHE_DIR=os.path.join(directory, f'batch-{workers}')):
+                with timed(f'batch render, {workers} workers', args.invoices):
+                    call_command('render_invoice_pdfs', '--workers', str(workers), stdout=quiet, stderr=quiet)
+
+
+if __name__ == '__main__':
+    main()
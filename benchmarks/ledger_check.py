@@ -0,0 +1,84 @@
+"""
+قياس فحص اتساق الكميات مع سجل الحركات: المقارنة بإعادة تشغيل السجل في بايثون، ثم find_discrepancies
+دون لقطات ومع لقطة، ثم الإصلاح والفحص التزايدي بعد نقطة فحص.
+
+    python -m benchmarks.ledger_check --products 5000 --movements 100
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks._common import benchmark_database, create_catalog
+from benchmarks.stock_history import create_history, replay
+
+from django.db import connection
+
+from inventory.consistency import find_discrepancies, repair_quantities, save_checkpoint, start_check
+from inventory.history import END_OF_TIME, end_of_day, take_snapshots
+from inventory.ledger import record_movement
+from inventory.models import Product, StockMovement
+
+
+def measure(label, function):
+    started = time.perf_counter()
+    result = function()
+    print(f'{label:<44} {time.perf_counter() - started:>9.3f}s')
+    return result
+
+
+def python_check():
+    """المسار البديل: إعادة تشغيل كل السجل ومقارنته بكل المنتجات"""
+    expected = replay(END_OF_TIME)
+    return [
+        pk for pk, quantity in Product.objects.values_list('pk', 'quantity').iterator(chunk_size=5000)
+        if expected.get(pk, 0) != quantity
+    ]
+
+
+def sql_check(full=True):
+    products, checkpoint = start_check(full=full)
+    wrong = [row[0] for _, rows in find_discrepancies(products) for row in rows]
+    return wrong, checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--movements', type=int, default=100, help='Movements per product')
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    first_day = date(2023, 1, 1)
+    with benchmark_database():
+        product_ids = create_catalog(args.products, quantity=0)
+        total = create_history(product_ids, args.movements, first_day, args.days)
+        # الكميات المخزنة تطابق السجل ثم ينحرف 1% منها
+        expected = replay(END_OF_TIME)
+        Product.objects.bulk_update(
+            [Product(pk=pk, quantity=expected.get(pk, 0)) for pk in product_ids], ['quantity'], batch_size=2000,
+        )
+        drifted = random.Random(3).sample(product_ids, max(1, len(product_ids) // 100))
+        Product.objects.filter(pk__in=drifted).update(quantity=999)
+        print(f'{args.products} products, {total} movements, {len(drifted)} drifted')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        assert sorted(measure('replay every movement in Python', python_check)) == sorted(drifted)
+        wrong, _ = measure('full check, no snapshots', sql_check)
+        assert sorted(wrong) == sorted(drifted)
+        take_snapshots(end_of_day(first_day + timedelta(days=args.days - 2)))
+        wrong, checkpoint = measure('full check, latest daily snapshot', sql_check)
+        assert sorted(wrong) == sorted(drifted)
+
+        measure(f'repair {len(wrong)} products', lambda: repair_quantities(wrong))
+        save_checkpoint(checkpoint)
+        # الفحص التالي يقرأ المنتجات التي تحركت منذ نقطة الفحص فقط
+        for product in Product.objects.filter(pk__in=drifted):
+            record_movement(product, StockMovement.MOVEMENT_IN, 1)
+        wrong, _ = measure(f'incremental check, {len(drifted)} moved', lambda: sql_check(full=False))
+        assert wrong == []
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+مقارنة إنشاء المنتجات صفًا بصف عبر ProductForm مع الاستيراد المجمّع في inventory.importer.
+
+    python -m benchmarks.product_import --rows 100000 --form-rows 2000
+"""
+import argparse
+import csv
+import io
+
+from benchmarks._common import benchmark_database, timed
+
+from django.db import transaction
+
+from inventory.forms import ProductForm
+from inventory.importer import import_products, read_csv
+from inventory.ledger import record_movement
+from inventory.models import Category, StockMovement
+
+
+def generate_csv(count, categories=50):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['sku', 'name', 'category', 'cost_price', 'selling_price', 'quantity', 'reorder_level'])
+    for i in range(count):
+        writer.writerow([f'IMP-{i:08d}', f'Imported product {i}', f'Category {i % categories}', '10.00', '15.00', i % 100, 10])
+    return output.getvalue()
+
+
+def form_import(data):
+    """المسار الحالي: تحقق النموذج ثم حفظ المنتج ثم حركة افتتاحية، لكل صف"""
+    categories = {}
+    for row in read_csv(io.StringIO(data)):
+        if row['category'] not in categories:
+            categories[row['category']] = Category.objects.get_or_create(name=row['category'])[0].pk
+        form = ProductForm({**row, 'category': categories[row['category']], 'is_active': True})
+        if not form.is_valid():
+            continue
+        with transaction.atomic():
+            product = form.save(commit=False)
+            quantity, product.quantity = product.quantity, 0
+            product.save()
+            if quantity:
+                record_movement(product, StockMovement.MOVEMENT_IN, quantity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--form-rows', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        data = generate_csv(args.form_rows)
+        with timed('ProductForm + save per row', args.form_rows):
+            form_import(data)
+
+    with benchmark_database():
+        data = generate_csv(args.rows)
+        with timed(f'bulk import (batch={args.batch_size})', args.rows):
+            result = import_products(read_csv(io.StringIO(data)), batch_size=args.batch_size)
+        print(f'{"":<40} created: {result.created}, rejected: {result.rejected_count}')
+        with timed('bulk re-import (all updates)', args.rows):
+            result = import_products(read_csv(io.StringIO(data)), batch_size=args.batch_size)
+        print(f'{"":<40} updated: {result.updated}, rejected: {result.rejected_count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+قياس قائمة اختيار المنتج في نموذج الحركة: Select بخيار لكل منتج مقابل ProductPicker، ثم بناء فهرس
+البحث في الذاكرة وزمن الاستعلام عليه.
+
+    python -m benchmarks.product_picker --products 200000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from benchmarks._common import benchmark_database
+from benchmarks.product_search import WORDS, create_products
+
+from django import forms
+
+from inventory import typeahead
+from inventory.forms import StockMovementForm
+from inventory.models import Product
+
+
+class FullCatalogForm(StockMovementForm):
+    """النموذج كما كان: ModelChoiceField بخيار لكل منتج"""
+
+    class Meta(StockMovementForm.Meta):
+        widgets = {'notes': forms.Textarea(attrs={'rows': 3})}
+
+
+def measure(label, function, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f'{label:<44} {elapsed * 1000:>10.2f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        create_products(args.products)
+        product_id = Product.objects.order_by('pk').values_list('pk', flat=True).last()
+
+        html = measure('form, option per product', lambda: str(FullCatalogForm(initial={'product': product_id})))
+        print(f'{"":<44} {len(html) / 1024:>10.0f} KB')
+        html = measure('form, ProductPicker', lambda: str(StockMovementForm(initial={'product': product_id})), 20)
+        print(f'{"":<44} {len(html) / 1024:>10.0f} KB')
+
+        index = measure('build typeahead index', typeahead.get_index)
+        print(f'{"":<44} {len(index):>10} products')
+        rng = random.Random(1)
+        queries = [rng.choice(WORDS)[:rng.randint(2, 4)] for _ in range(args.queries)]
+        queries += [f'BM-{rng.randrange(args.products):08d}'[:rng.randint(5, 11)] for _ in range(args.queries)]
+        iterator = iter(queries)
+        measure(f'typeahead query ({len(queries)} prefixes)', lambda: typeahead.search(next(iterator)), len(queries))
+
+
+if __name__ == '__main__':
+    main()
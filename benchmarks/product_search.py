@@ -0,0 +1,78 @@
+"""
+مقارنة بحث المنتجات بـ icontains مع البحث عبر الفهرس النصي في inventory.search.
+
+    python -m benchmarks.product_search --products 500000 --queries 50
+"""
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks._common import benchmark_database, timed
+
+from django.db import connection
+
+from inventory.models import Category, Product
+from inventory.search import install_search_index, legacy_search, search_products
+from inventory.utils import get_product_summary
+
+# مفردات بحجم قريب من كتالوج حقيقي حتى لا تطابق كل كلمة جزءًا كبيرًا من المنتجات
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'te', 'vo', 'zi', 'bra', 'cle', 'dro', 'fli', 'gru']
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES][:2000]
+
+
+def create_products(size, batch_size=5000, seed=0):
+    rng = random.Random(seed)
+    category = Category.objects.create(name='Benchmark')
+    Product.objects.bulk_create(
+        (
+            Product(
+                name=' '.join(rng.sample(WORDS, 3)) + f' {i}',
+                sku=f'BM-{i:08d}',
+                description=' '.join(rng.choices(WORDS, k=12)),
+                category=category,
+                quantity=rng.randint(0, 100),
+                cost_price=Decimal('10.00'),
+                selling_price=Decimal('15.00'),
+            )
+            for i in range(size)
+        ),
+        batch_size=batch_size,
+    )
+
+
+def run(label, queries, search):
+    # ما تنفذه صفحة المنتجات: الإحصائيات (مع العدد) ثم الصفحة الأولى
+    with timed(label, len(queries)):
+        for query in queries:
+            products = search(Product.objects.all(), query)
+            get_product_summary(products)
+            list(products[:10])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=500000)
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    queries = [
+        rng.choice([rng.choice(WORDS), ' '.join(rng.sample(WORDS, 2)), f'BM-{rng.randrange(args.products):08d}'[:8]])
+        for _ in range(args.queries)
+    ]
+
+    with benchmark_database():
+        create_products(args.products)
+        run('icontains scan', queries, lambda products, query: legacy_search(products, query).order_by('name'))
+
+        with timed('build search index', args.products):
+            install_search_index(connection)
+        run(
+            'indexed search (ranked)',
+            queries,
+            lambda products, query: search_products(products, query).order_by('-search_rank', 'name'),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+قراءات وكتابات متزامنة على SQLite بإعدادات الاتصال الافتراضية مقارنة بإعدادات settings.DATABASES
+(PRAGMAs عبر init_command، و BEGIN IMMEDIATE، و CONN_MAX_AGE).
+
+كل عملية تُعامل كطلب: close_old_connections في نهايتها كما يفعل request_finished، فالاتصال يُغلق بعد
+كل طلب إلا إذا كان CONN_MAX_AGE يسمح بإبقائه.
+
+    python -m benchmarks.sqlite_profile --readers 4 --writers 4 --seconds 10
+"""
+import argparse
+import threading
+import time
+
+from benchmarks._common import benchmark_database, create_catalog
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from inventory.ledger import record_movement
+from inventory.models import Product, StockMovement
+from inventory.utils import get_product_summary
+
+PROFILES = {
+    'default connection': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}},
+    'tuned (settings.DATABASES)': {
+        key: settings.DATABASES['default'].get(key, default)
+        for key, default in (('CONN_MAX_AGE', 0), ('CONN_HEALTH_CHECKS', False), ('OPTIONS', {}))
+    },
+}
+
+
+def read_request():
+    products = Product.objects.select_related('category')
+    get_product_summary(products)
+    list(products.order_by('name', 'pk')[:10])
+
+
+def write_request(product_id, movement_type):
+    with transaction.atomic():
+        record_movement(Product(pk=product_id), movement_type, 1)
+
+
+def run(product_ids, readers, writers, seconds):
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def reader():
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    read_request()
+                    count('reads')
+                except OperationalError:
+                    count('locked')
+                close_old_connections()
+        finally:
+            connection.close()
+
+    def writer(offset):
+        try:
+            i = 0
+            while time.perf_counter() < deadline:
+                product_id = product_ids[(offset + i) % len(product_ids)]
+                movement_type = StockMovement.MOVEMENT_IN if i % 2 else StockMovement.MOVEMENT_OUT
+                try:
+                    write_request(product_id, movement_type)
+                    count('writes')
+                    i += 1
+                except OperationalError:
+                    # "database is locked": الطلب يفشل ويُعاد
+                    count('locked')
+                close_old_connections()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--products', type=int, default=5000)
+    args = parser.parse_args()
+
+    if connection.vendor != 'sqlite':
+        parser.error('this benchmark compares SQLite connection settings')
+
+    original = {key: connection.settings_dict.get(key) for key in PROFILES['default connection']}
+    try:
+        for label, profile in PROFILES.items():
+            # settings_dict مشترك بين اتصالات كل الخيوط، فيطبق الإعداد قبل إنشاء القاعدة
+            connection.settings_dict.update(profile)
+            connection.close()
+            with benchmark_database():
+                product_ids = create_catalog(args.products, quantity=1000)
+                close_old_connections()
+                counts = run(product_ids, args.readers, args.writers, args.seconds)
+                journal = connection.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+            print(
+                f'{label:<30} journal={journal:<6} '
+                f'{counts["reads"] / args.seconds:>9.0f} reads/sec '
+                f'{counts["writes"] / args.seconds:>8.0f} writes/sec '
+                f'{counts["locked"]:>6} locked'
+            )
+    finally:
+        connection.settings_dict.update(original)
+
+
+if __name__ == '__main__':
+    main()
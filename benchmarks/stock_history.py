@@ -0,0 +1,107 @@
+"""
+قياس إعادة بناء المخزون في نهاية فترة لكل الكتالوج: إعادة تشغيل السجل كاملًا في بايثون، ثم
+stock_as_of دون لقطات، ثم stock_as_of بعد كتابة اللقطات اليومية.
+
+    python -m benchmarks.stock_history --products 5000 --movements 100 --days 365
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, time as day_start, timedelta
+
+from benchmarks._common import benchmark_database, create_catalog
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from inventory.history import end_of_day, stock_as_of, take_snapshots
+from inventory.models import StockMovement
+
+
+def create_history(product_ids, per_product, first_day, days):
+    """حركات بتواريخ موزعة على الفترة؛ إدخال مباشر لأن created_at يُضبط تلقائيًا في ORM"""
+    rng = random.Random(1)
+    start = timezone.make_aware(datetime.combine(first_day, day_start.min))
+    span = days * 86400
+    table = StockMovement._meta.db_table
+    sql = f'INSERT INTO {table} (product_id, movement_type, quantity, created_at) VALUES (%s, %s, %s, %s)'
+    with transaction.atomic(), connection.cursor() as cursor:
+        for product_id in product_ids:
+            rows = []
+            on_hand = 0
+            for second in sorted(rng.randrange(span) for _ in range(per_product)):
+                kind = rng.choices(
+                    [StockMovement.MOVEMENT_IN, StockMovement.MOVEMENT_OUT, StockMovement.MOVEMENT_ADJUSTMENT],
+                    [50, 49, 1],
+                )[0]
+                quantity = rng.randint(1, 20)
+                # كما في السجل: لا إخراج بأكثر من المتوفر
+                if kind == StockMovement.MOVEMENT_OUT and quantity > on_hand:
+                    kind = StockMovement.MOVEMENT_IN
+                if kind == StockMovement.MOVEMENT_ADJUSTMENT:
+                    on_hand = quantity
+                else:
+                    on_hand += quantity if kind == StockMovement.MOVEMENT_IN else -quantity
+                rows.append((product_id, kind, quantity, start + timedelta(seconds=second)))
+            cursor.executemany(sql, rows)
+    return len(product_ids) * per_product
+
+
+def replay(timestamp):
+    """المسار البديل: قراءة كل الحركات قبل timestamp وإعادة تشغيلها"""
+    stock = {}
+    movements = StockMovement.objects.filter(created_at__lt=timestamp).order_by('product_id', 'created_at', 'pk')
+    for product_id, kind, quantity in movements.values_list('product_id', 'movement_type', 'quantity').iterator(chunk_size=5000):
+        if kind == StockMovement.MOVEMENT_ADJUSTMENT:
+            stock[product_id] = quantity
+        elif kind == StockMovement.MOVEMENT_IN:
+            stock[product_id] = stock.get(product_id, 0) + quantity
+        else:
+            stock[product_id] = stock.get(product_id, 0) - quantity
+    return stock
+
+
+def measure(label, function):
+    started = time.perf_counter()
+    result = function()
+    print(f'{label:<44} {time.perf_counter() - started:>9.3f}s')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--movements', type=int, default=100, help='Movements per product')
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    first_day = date(2023, 1, 1)
+    last_day = first_day + timedelta(days=args.days - 1)
+    period_end = end_of_day(last_day)
+
+    with benchmark_database():
+        product_ids = create_catalog(args.products, quantity=0)
+        total = create_history(product_ids, args.movements, first_day, args.days)
+        print(f'{args.products} products, {total} movements over {args.days} days')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        expected = measure('replay every movement in Python', lambda: replay(period_end))
+        result = measure('stock_as_of, no snapshots', lambda: stock_as_of(None, period_end))
+        assert {k: v for k, v in result.items() if k in expected} == expected
+
+        def snapshots():
+            day = first_day
+            while day < last_day:
+                take_snapshots(end_of_day(day))
+                day += timedelta(days=1)
+        measure(f'take_snapshots for {args.days - 1} days (one-off)', snapshots)
+
+        result = measure('stock_as_of, daily snapshots', lambda: stock_as_of(None, period_end))
+        assert {k: v for k, v in result.items() if k in expected} == expected
+        middle = end_of_day(first_day + timedelta(days=args.days // 2))
+        measure('stock_as_of mid-period, daily snapshots', lambda: stock_as_of(None, middle))
+
+
+if __name__ == '__main__':
+    main()
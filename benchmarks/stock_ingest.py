@@ -0,0 +1,53 @@
+"""
+مقارنة إدخال حركات المخزون صفًا بصف عبر StockMovement.save بالإدخال المجمّع في inventory.ingest.
+
+    python -m benchmarks.stock_ingest --rows 20000 --products 500
+"""
+import argparse
+import random
+
+from benchmarks._common import benchmark_database, create_catalog, timed
+
+from inventory.ingest import ingest_movements
+from inventory.ledger import record_movement
+from inventory.models import Product
+
+
+def generate_rows(product_ids, count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {
+            'product': product_ids[rng.randrange(len(product_ids))],
+            'movement_type': rng.choice(['IN', 'OUT', 'OUT']),
+            'quantity': rng.randint(1, 5),
+            'reference': 'benchmark',
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        product_ids = create_catalog(args.products)
+        rows = list(generate_rows(product_ids, args.rows))
+        with timed('per-row StockMovement.save', args.rows):
+            for row in rows:
+                try:
+                    record_movement(Product(pk=row['product']), row['movement_type'], row['quantity'])
+                except ValueError:
+                    pass
+
+    with benchmark_database():
+        product_ids = create_catalog(args.products)
+        rows = list(generate_rows(product_ids, args.rows))
+        with timed(f'bulk ingest (batch={args.batch_size})', args.rows):
+            result = ingest_movements(rows, batch_size=args.batch_size)
+        print(f'{"":<40} rejected: {result.rejected_count}')
+
+
+if __name__ == '__main__':
+    main()
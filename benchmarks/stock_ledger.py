@@ -0,0 +1,77 @@
+"""
+مقارنة مسار حركة المخزون القديم (قراءة الكمية وتعديلها في بايثون ثم حفظ المنتج كاملًا)
+بمسار السجل الذري في inventory.ledger، مع عدة عمال متزامنين على نفس المنتجات.
+
+    python -m benchmarks.stock_ledger --workers 8 --movements 500 --products 4
+"""
+import argparse
+import threading
+
+from benchmarks._common import benchmark_database, create_catalog, timed
+
+from django.db import OperationalError, connection, transaction
+
+from inventory.ledger import record_movement
+from inventory.models import Product, StockMovement
+
+
+def legacy_movement(product_id, quantity):
+    """المسار السابق لـ StockMovement.save: قراءة، تعديل في الذاكرة، حفظ كل الأعمدة"""
+    product = Product.objects.get(pk=product_id)
+    if product.quantity < quantity:
+        raise ValueError('Insufficient stock available')
+    product.quantity -= quantity
+    # حفظ كل الأعمدة دون تحديث العدادات، كما كان قبل السجل الذري
+    super(Product, product).save()
+    movement = StockMovement(product=product, movement_type=StockMovement.MOVEMENT_OUT, quantity=quantity)
+    super(StockMovement, movement).save()
+
+
+def ledger_movement(product_id, quantity):
+    record_movement(Product(pk=product_id), StockMovement.MOVEMENT_OUT, quantity)
+
+
+def run(apply, product_ids, workers, movements):
+    def worker(offset):
+        try:
+            for i in range(movements):
+                product_id = product_ids[(offset + i) % len(product_ids)]
+                while True:
+                    try:
+                        with transaction.atomic():
+                            apply(product_id, 1)
+                        break
+                    except OperationalError:
+                        continue
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--movements', type=int, default=500, help='movements per worker')
+    parser.add_argument('--products', type=int, default=4)
+    args = parser.parse_args()
+
+    total = args.workers * args.movements
+    initial = total + 1000
+
+    for label, apply in (('legacy read-modify-write', legacy_movement), ('atomic ledger', ledger_movement)):
+        with benchmark_database():
+            product_ids = create_catalog(args.products, quantity=initial)
+            with timed(label, total):
+                run(apply, product_ids, args.workers, args.movements)
+            expected = args.products * initial - total
+            actual = sum(Product.objects.values_list('quantity', flat=True))
+            print(f'{"":<40} lost updates: {actual - expected}')
+
+
+if __name__ == '__main__':
+    main()
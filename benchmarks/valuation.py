@@ -0,0 +1,77 @@
+"""
+قياس تقييم المخزون (FIFO والمتوسط المتحرك): إعادة البناء الكاملة بعملية واحدة وبعدة عمليات، ثم
+التشغيل التزايدي الذي يعالج الحركات الجديدة فقط.
+
+    python -m benchmarks.valuation --products 2000 --movements 500 --workers 8
+"""
+import argparse
+import os
+import random
+import time
+from decimal import Decimal
+
+from benchmarks._common import benchmark_database, create_catalog
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from inventory.models import StockMovement
+from inventory.valuation import recompute_all, update_valuations
+
+
+def create_movements(product_ids, per_product, seed=1):
+    """حركات IN/OUT/ADJUSTMENT متداخلة بين المنتجات؛ إدخال مباشر لتجاوز تطبيقها على الكميات"""
+    rng = random.Random(seed)
+    on_hand = dict.fromkeys(product_ids, 0)
+    now = timezone.now()
+    table = StockMovement._meta.db_table
+    sql = f'INSERT INTO {table} (product_id, movement_type, quantity, unit_cost, created_at) VALUES (%s, %s, %s, %s, %s)'
+    rows = []
+    for _ in range(per_product * len(product_ids)):
+        product_id = rng.choice(product_ids)
+        kind = rng.choices(['IN', 'OUT', 'ADJUSTMENT'], [50, 49, 1])[0]
+        quantity = rng.randint(1, 20)
+        if kind == 'OUT' and quantity > on_hand[product_id]:
+            kind = 'IN'
+        unit_cost = None
+        if kind == 'IN':
+            on_hand[product_id] += quantity
+            unit_cost = Decimal(rng.randint(500, 1500)) / 100
+        elif kind == 'OUT':
+            on_hand[product_id] -= quantity
+        else:
+            on_hand[product_id] = quantity
+        rows.append((product_id, kind, quantity, unit_cost, now))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+def measure(label, rows, function):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<44} {rows:>10} movements {elapsed:>9.3f}s {rows / elapsed:>12.0f} movements/sec')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--movements', type=int, default=500, help='Movements per product')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with benchmark_database():
+        product_ids = create_catalog(args.products, quantity=0)
+        total = create_movements(product_ids, args.movements)
+
+        measure('streaming update, empty state', total, update_valuations)
+        for workers in sorted({1, args.workers}):
+            measure(f'full recompute, {workers} workers', total, lambda: list(recompute_all(workers)))
+
+        new = create_movements(product_ids, max(1, args.movements // 100), seed=2)
+        measure('incremental update, 1% new movements', new, update_valuations)
+
+
+if __name__ == '__main__':
+    main()
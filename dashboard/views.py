@@ -1,8 +1,10 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from inventory_management.routers import use_replica
 from stats.utils import get_dashboard_stats, get_monthly_sales_data
 
 @login_required
+@use_replica
 def dashboard_view(request):
     """Dashboard view - requires login"""
     context = {
@@ -0,0 +1,48 @@
+"""
+تنبيهات انخفاض المخزون.
+
+العلم Product.is_low_stock يُحدّث مع كل كتابة تغير الكمية أو حد إعادة الطلب. مسارات الكتابة تسجل
+هنا المنتجات التي تغير علمها، وعند التزام المعاملة يُرسل low_stock_changed مرة واحدة لكل منتج
+اختلفت حالته النهائية عن حالته قبل المعاملة، فلا يتكرر التنبيه لنفس العبور ولا حاجة للاستطلاع.
+"""
+from django.db import transaction
+from django.dispatch import Signal
+
+# sender=Product مع product_id و is_low_stock (الحالة الجديدة)
+low_stock_changed = Signal()
+
+
+class _PendingTransitions(dict):
+    """حالة كل منتج قبل المعاملة الجارية {product_id: was_low}؛ send تُستدعى عند الالتزام"""
+
+    def __init__(self, connection):
+        super().__init__()
+        self.connection = connection
+
+    def send(self):
+        from .models import Product
+
+        if getattr(self.connection, '_low_stock_pending', None) is self:
+            self.connection._low_stock_pending = None
+        # القراءة بعد الالتزام تعكس الحالة النهائية حتى لو أُلغيت نقطة حفظ داخلية
+        current = dict(
+            Product.objects.using(self.connection.alias).filter(pk__in=list(self)).values_list('pk', 'is_low_stock')
+        )
+        for product_id, was_low in self.items():
+            if product_id in current and current[product_id] != was_low:
+                low_stock_changed.send(sender=Product, product_id=product_id, is_low_stock=current[product_id])
+
+
+def track_low_stock(product_id, was_low, using=None):
+    """تسجيل تغير علم انخفاض المخزون لمنتج؛ was_low هي حالته قبل التغيير"""
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, '_low_stock_pending', None)
+    # إذا أُلغيت المعاملة السابقة تسقط دالة الالتزام، فنبدأ سجلًا جديدًا
+    if pending is None or not any(getattr(entry[1], '__self__', None) is pending for entry in connection.run_on_commit):
+        pending = connection._low_stock_pending = _PendingTransitions(connection)
+        pending.setdefault(product_id, was_low)
+        # الكتابة التزمت فعلًا عند استدعائها؛ فشل القراءة (قاعدة مقفلة مثلًا) يُسجل ولا يظهر كفشل للكتابة
+        # فيعيدها المستدعي مرة ثانية
+        transaction.on_commit(pending.send, using=connection.alias, robust=True)
+    else:
+        pending.setdefault(product_id, was_low)
@@ -0,0 +1,59 @@
+"""
+التخزين المؤقت لصفحات المخزون.
+
+- GET الشرطي: ETag و Last-Modified من أحدث updated_at للصفوف المعروضة (وآخر حركة في صفحة المنتج)،
+  تُقرأ قبل بناء الصفحة؛ إذا طابقت ما لدى المتصفح تعود 304 دون استعلامات الصفحة ولا القالب.
+- أجزاء القوالب: صفوف جدول المنتجات (inventory/includes/product_rows.html) تُخزن بمفتاح فيه أجيال
+  المنتجات والحركات والفئات (inventory_management/cache.py)، فلا حاجة لحذف مفاتيح بعينها.
+"""
+import hashlib
+from calendar import timegm
+
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from inventory_management.cache import generations
+
+from .models import Category, Product, StockMovement
+
+
+def rows_version():
+    """جزء مفتاح صفوف المنتجات: يتغير مع أي كتابة على ما تعرضه"""
+    return '-'.join(map(str, generations(Product, StockMovement, Category)))
+
+
+class PageValidators:
+    """
+    ETag و Last-Modified لصفحة HTML من حالة البيانات التي تعرضها (parts و last_modified).
+
+    ETag يشمل المستخدم ورمز CSRF والمسار الكامل لأن الصفحة تتغير بها. الصفحة التي تنتظر عرض رسائل
+    (messages) لا تعود 304 حتى لا تضيع الرسالة.
+    """
+
+    def __init__(self, request, *parts, last_modified=None):
+        self.request = request
+        self.last_modified = last_modified
+        key = repr((request.user.pk, request.META.get('CSRF_COOKIE'), request.get_full_path(), *parts))
+        self.etag = quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+    def _timestamp(self):
+        return timegm(self.last_modified.utctimetuple()) if self.last_modified else None
+
+    def not_modified(self):
+        """استجابة 304 إذا كانت نسخة المتصفح حديثة، وإلا None"""
+        if self.request.method not in ('GET', 'HEAD') or len(messages.get_messages(self.request)):
+            return None
+        response = get_conditional_response(self.request, etag=self.etag, last_modified=self._timestamp())
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified:
+            response['Last-Modified'] = http_date(self._timestamp())
+        # المتصفح يحتفظ بالصفحة لكنه يتحقق منها في كل مرة
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
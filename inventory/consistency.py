@@ -0,0 +1,132 @@
+"""
+فحص اتساق Product.quantity مع سجل StockMovement.
+
+الكمية المتوقعة تُحسب بـ with_stock_as_of (آخر لقطة أو ADJUSTMENT ثم مجموع ما بعدها) لكل دفعة من
+المنتجات في استعلام واحد، ولا يُقفل إلا المنتجات المختلفة عند الإصلاح. الإصلاح بطريقتين:
+
+- quantity: السجل هو المرجع، فتُضبط الكمية المخزنة على كمية السجل.
+- ledger: الكمية المخزنة هي المرجع (جرد فعلي أو بيانات قديمة)، فتُسجل حركة ADJUSTMENT بها.
+
+LedgerCheckpoint يحفظ آخر حركة ووقت آخر فحص نظيف، فالفحص التزايدي يقرأ المنتجات التي تحركت أو
+عُدلت بعده فقط.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from inventory_management.cache import bump
+
+from .alerts import track_low_stock
+from .counters import COUNTER_FIELDS, apply_delta, contribution, product_values
+from .history import ledger_discrepancies
+from .models import LedgerCheckpoint, Product, StockMovement
+from .signals import stock_bulk_changed
+
+CHECKPOINT_NAME = 'stock-ledger'
+REPAIR_REFERENCE = 'ledger-check'
+
+
+def start_check(full=False):
+    """
+    (المنتجات المطلوب فحصها، نقطة الفحص الجديدة غير المحفوظة).
+
+    بلا نقطة سابقة أو مع full=True يُفحص الكتالوج كله.
+    """
+    checkpoint = LedgerCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+    upcoming = LedgerCheckpoint(
+        name=CHECKPOINT_NAME,
+        movement_id=StockMovement.objects.aggregate(last=Max('pk'))['last'] or 0,
+        checked_at=timezone.now(),
+    )
+    products = Product.objects.order_by('pk')
+    if checkpoint is not None and not full:
+        moved = StockMovement.objects.filter(pk__gt=checkpoint.movement_id).values('product_id')
+        products = products.filter(Q(pk__in=moved) | Q(updated_at__gte=checkpoint.checked_at))
+    return products, upcoming
+
+
+def save_checkpoint(checkpoint):
+    LedgerCheckpoint.objects.update_or_create(
+        name=checkpoint.name,
+        defaults={'movement_id': checkpoint.movement_id, 'checked_at': checkpoint.checked_at},
+    )
+
+
+def find_discrepancies(products, batch_size=1000):
+    """
+    مسح products على دفعات بالمفتاح؛ يُعاد لكل دفعة (عدد المنتجات، [(pk, sku, quantity, expected)]).
+    """
+    last_pk = 0
+    while True:
+        ids = list(products.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        last_pk = ids[-1]
+        rows = ledger_discrepancies(Product.objects.filter(pk__in=ids).order_by('pk'))
+        yield len(ids), list(rows.values_list('pk', 'sku', 'quantity', 'stock_as_of'))
+
+
+def repair_quantities(product_ids):
+    """
+    ضبط Product.quantity على كمية السجل للمنتجات التي ما زالت مختلفة بعد قفلها؛ تعيد معرفاتها.
+
+    كمية السجل السالبة لا تُكتب (تحتاج إصلاح السجل نفسه).
+    """
+    with transaction.atomic():
+        products = list(
+            ledger_discrepancies(Product.objects.select_for_update().filter(pk__in=product_ids).order_by())
+            .filter(stock_as_of__gte=0)
+            .only('pk', *COUNTER_FIELDS, 'is_low_stock')
+        )
+        before = {product.pk: product_values(product) for product in products}
+        now = timezone.now()
+        for product in products:
+            product.quantity = product.stock_as_of
+            product.updated_at = now
+            was_low = product.is_low_stock
+            product.is_low_stock = product.quantity <= product.reorder_level
+            if product.is_low_stock != was_low:
+                track_low_stock(product.pk, was_low)
+        Product.objects.bulk_update(products, ['quantity', 'is_low_stock', 'updated_at'])
+
+        deltas = defaultdict(lambda: (0, 0, 0, Decimal('0')))
+        for product in products:
+            old = contribution(before[product.pk])
+            new = contribution(product_values(product))
+            deltas[product.category_id] = tuple(
+                total + (n - o) for total, n, o in zip(deltas[product.category_id], new, old)
+            )
+        for category_id, delta in deltas.items():
+            apply_delta(category_id, delta)
+
+        stock_bulk_changed.send(sender=Product, product_ids=[product.pk for product in products])
+    return [product.pk for product in products]
+
+
+def repair_ledger(product_ids, created_by=None):
+    """
+    تسجيل حركة ADJUSTMENT بالكمية المخزنة للمنتجات التي ما زالت مختلفة بعد قفلها؛ تعيد معرفاتها.
+
+    الحركات تُنشأ بـ bulk_create فلا تُطبق على الكمية، وهي مطابقة لها أصلًا.
+    """
+    with transaction.atomic():
+        rows = list(
+            ledger_discrepancies(Product.objects.select_for_update().filter(pk__in=product_ids).order_by())
+            .values_list('pk', 'quantity')
+        )
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=product_id,
+                movement_type=StockMovement.MOVEMENT_ADJUSTMENT,
+                quantity=quantity,
+                reference=REPAIR_REFERENCE,
+                notes='Ledger consistency repair',
+                created_by=created_by,
+            )
+            for product_id, quantity in rows
+        ])
+        bump(StockMovement)
+    return [product_id for product_id, _ in rows]
@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Value, DecimalField, IntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventory_management.cache import bump
+
+from .utils import STOCK_VALUE
+
+
+COUNTER_FIELDS = ('category_id', 'is_active', 'quantity', 'reorder_level', 'cost_price')
+
+
+def contribution(values):
+    """مساهمة منتج واحد في عدادات فئته: (العدد، النشطة، منخفضة المخزون، القيمة)"""
+    if values is None:
+        return (0, 0, 0, Decimal('0'))
+    return (
+        1,
+        1 if values['is_active'] else 0,
+        1 if values['quantity'] <= values['reorder_level'] else 0,
+        Decimal(values['quantity']) * Decimal(values['cost_price'] or 0),
+    )
+
+
+def product_values(product):
+    """القيم التي تعتمد عليها العدادات من نسخة منتج في الذاكرة"""
+    return {field: getattr(product, field) for field in COUNTER_FIELDS}
+
+
+def apply_delta(category_id, delta):
+    """إضافة فرق المساهمة إلى عدادات الفئة بتحديث ذري واحد (مع updated_at، فصفحة الفئات تتغير معها)"""
+    from .models import Category
+
+    if category_id is None or not any(delta):
+        return
+    Category.objects.filter(pk=category_id).update(
+        product_count=F('product_count') + delta[0],
+        active_product_count=F('active_product_count') + delta[1],
+        low_stock_count=F('low_stock_count') + delta[2],
+        stock_value=F('stock_value') + delta[3],
+        updated_at=timezone.now(),
+    )
+    bump(Category)
+
+
+def apply_change(old, new):
+    """تحديث العدادات بعد تغير منتج من الحالة old إلى الحالة new (أي منهما قد يكون None)"""
+    old_category = old['category_id'] if old else None
+    new_category = new['category_id'] if new else None
+    before, after = contribution(old), contribution(new)
+
+    if old_category == new_category:
+        apply_delta(new_category, tuple(a - b for a, b in zip(after, before)))
+    else:
+        apply_delta(old_category, tuple(-b for b in before))
+        apply_delta(new_category, after)
+
+
+def rebuild_category_counters(category_ids=None):
+    """إعادة حساب العدادات من الصفر في استعلام UPDATE واحد"""
+    from .models import Category, Product
+
+    stats = Product.objects.filter(category=OuterRef('pk')).order_by().values('category')
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+
+    def counter(aggregate, output_field, default):
+        return Coalesce(
+            Subquery(stats.annotate(value=aggregate).values('value')[:1], output_field=output_field),
+            Value(default, output_field=output_field),
+        )
+
+    integer = IntegerField()
+    money = DecimalField(max_digits=14, decimal_places=2)
+    bump(Category)
+    return categories.update(
+        product_count=counter(Count('pk'), integer, 0),
+        active_product_count=counter(Count('pk', filter=Q(is_active=True)), integer, 0),
+        low_stock_count=counter(Count('pk', filter=Q(quantity__lte=F('reorder_level'))), integer, 0),
+        stock_value=counter(Sum(STOCK_VALUE), money, Decimal('0')),
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,28 @@
+"""مجموعات بيانات التصدير للمنتجات وحركات المخزون (انظر inventory_management/exports.py)"""
+from inventory_management.exports import Dataset, register
+
+from .models import Product, StockMovement
+
+register(
+    Dataset('products', Product.objects.all, (
+        ('SKU', 'sku'),
+        ('Name', 'name'),
+        ('Category', 'category__name'),
+        ('Quantity', 'quantity'),
+        ('Reorder Level', 'reorder_level'),
+        ('Cost Price', 'cost_price'),
+        ('Selling Price', 'selling_price'),
+        ('Active', 'is_active'),
+        ('Low Stock', 'is_low_stock'),
+        ('Updated At', 'updated_at'),
+    ), {'category': 'category_id'}),
+    Dataset('movements', StockMovement.objects.all, (
+        ('Date', 'created_at'),
+        ('SKU', 'product__sku'),
+        ('Product', 'product__name'),
+        ('Type', 'movement_type'),
+        ('Quantity', 'quantity'),
+        ('Reference', 'reference'),
+        ('Created By', 'created_by__username'),
+    ), {'product': 'product_id', 'type': 'movement_type'}),
+)
@@ -1,6 +1,26 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import Product, Category, StockMovement
 
+
+class ProductPicker(forms.Select):
+    """
+    قائمة منتج تحمل الخيار المختار فقط بدلًا من خيار لكل منتج؛ البقية تُجلب بالبحث من
+    product-typeahead (انظر initTypeahead في static/js/main.js).
+    """
+
+    def __init__(self, attrs=None):
+        super().__init__({'data-typeahead': reverse_lazy('product-typeahead'), **(attrs or {})})
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [int(pk) for pk in value if str(pk).isdigit()]
+        options = [self.create_option(name, '', '---------', not selected, 0)]
+        products = Product.objects.filter(pk__in=selected).values_list('pk', 'sku', 'name')
+        for index, (pk, sku, product_name) in enumerate(products, 1):
+            options.append(self.create_option(name, pk, f'{sku} - {product_name}', True, index))
+        return [(None, options, 0)]
+
+
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
@@ -35,8 +55,9 @@ class ProductForm(forms.ModelForm):
 class StockMovementForm(forms.ModelForm):
     class Meta:
         model = StockMovement
-        fields = ['product', 'movement_type', 'quantity', 'reference', 'notes']
+        fields = ['product', 'movement_type', 'quantity', 'unit_cost', 'reference', 'notes']
         widgets = {
+            'product': ProductPicker,
             'notes': forms.Textarea(attrs={'rows': 3})
         }
     
@@ -0,0 +1,112 @@
+"""
+المخزون في لحظة سابقة، معاد بناؤه من سجل StockMovement.
+
+الكمية قبل اللحظة T = كمية آخر نقطة ارتكاز قبل T + مجموع حركات IN/OUT بعدها وحتى T. نقطة الارتكاز
+هي الأحدث بين:
+
+- آخر StockSnapshot بـ as_of <= T (تشمل كل الحركات قبل as_of)،
+- آخر حركة ADJUSTMENT قبل T (تضبط الكمية بقيمة مطلقة، فما قبلها لا يهم).
+
+كل ذلك استعلامات فرعية مرتبطة بالمنتج تستخدم الفهرسين (product, as_of) و (product, created_at)، فيُحسب
+الكتالوج كله في استعلام واحد ويُقرأ لكل منتج ذيل الحركات بعد آخر لقطة فقط. take_snapshots تكتب
+اللقطات اليومية للمنتجات التي تحركت منذ لقطتها السابقة، فيبقى الذيل قصيرًا مهما طال السجل.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockSnapshot
+
+# بديل NULL لمنتج بلا لقطة، حتى تبقى المقارنات نطاقًا على الفهرس
+BEGINNING = datetime(1, 1, 1, tzinfo=dt_timezone.utc)
+# بعد أي حركة: كل السجل حتى الآن
+END_OF_TIME = datetime(9999, 12, 31, tzinfo=dt_timezone.utc)
+
+SIGNED_QUANTITY = Case(
+    When(movement_type=StockMovement.MOVEMENT_IN, then=F('quantity')),
+    When(movement_type=StockMovement.MOVEMENT_OUT, then=-F('quantity')),
+    default=Value(0),
+)
+
+
+def with_stock_as_of(queryset, timestamp):
+    """إضافة stock_as_of (الكمية قبل timestamp مباشرة) لكل منتج في queryset"""
+    snapshots = StockSnapshot.objects.filter(product=OuterRef('pk'), as_of__lte=timestamp).order_by('-as_of')
+    queryset = queryset.annotate(
+        history_snapshot_at=Coalesce(
+            Subquery(snapshots.values('as_of')[:1]), Value(BEGINNING, output_field=DateTimeField()),
+        ),
+        history_snapshot_quantity=Coalesce(Subquery(snapshots.values('quantity')[:1]), Value(0)),
+    )
+
+    # التعديلات قبل آخر لقطة محسوبة فيها، فلا نبحث إلا بعدها
+    adjustments = StockMovement.objects.filter(
+        product=OuterRef('pk'),
+        movement_type=StockMovement.MOVEMENT_ADJUSTMENT,
+        created_at__gte=OuterRef('history_snapshot_at'),
+        created_at__lt=timestamp,
+    ).order_by('-created_at', '-pk')
+    queryset = queryset.annotate(
+        history_anchor_at=Coalesce(Subquery(adjustments.values('created_at')[:1]), F('history_snapshot_at')),
+        # اللقطة تسبق كل حركة بنفس as_of، والتعديل يسبق ما بعده بنفس الوقت حسب id
+        history_anchor_id=Coalesce(Subquery(adjustments.values('pk')[:1]), Value(0)),
+        history_anchor_quantity=Coalesce(
+            Subquery(adjustments.values('quantity')[:1]), F('history_snapshot_quantity'),
+        ),
+    )
+
+    tail = StockMovement.objects.filter(
+        product=OuterRef('pk'),
+        created_at__gte=OuterRef('history_anchor_at'),
+        created_at__lt=timestamp,
+    ).filter(
+        Q(created_at__gt=OuterRef('history_anchor_at')) | Q(pk__gt=OuterRef('history_anchor_id')),
+    ).order_by().values('product').annotate(total=Sum(SIGNED_QUANTITY)).values('total')
+    return queryset.annotate(
+        stock_as_of=F('history_anchor_quantity') + Coalesce(Subquery(tail, output_field=IntegerField()), Value(0)),
+    )
+
+
+def stock_as_of(product_ids, timestamp):
+    """{product_id: الكمية} قبل timestamp مباشرة؛ product_ids=None يعني الكتالوج كله"""
+    products = Product.objects.order_by()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return dict(with_stock_as_of(products, timestamp).values_list('pk', 'stock_as_of').iterator(chunk_size=5000))
+
+
+def ledger_discrepancies(queryset):
+    """
+    المنتجات التي تختلف كميتها المخزنة عن إعادة تشغيل سجلها، مع الكمية المتوقعة في stock_as_of.
+
+    الكمية والسجل يُقرآن في نفس الاستعلام، فلا تظهر حركة تُسجل أثناء الفحص كفرق.
+    """
+    return with_stock_as_of(queryset, END_OF_TIME).exclude(stock_as_of=F('quantity'))
+
+
+def end_of_day(day):
+    """بداية اليوم التالي بالتوقيت المحلي: لقطة اليوم تشمل كل حركاته"""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def take_snapshots(as_of, batch_size=2000):
+    """
+    كتابة لقطات as_of للمنتجات التي لها حركات منذ آخر لقطة لها؛ تعيد عدد اللقطات.
+
+    المنتجات التي لم تتحرك تبقى لقطتها السابقة نقطة ارتكاز صحيحة. إعادة التشغيل لنفس as_of تعيد
+    حساب لقطاته.
+    """
+    with transaction.atomic():
+        StockSnapshot.objects.filter(as_of=as_of).delete()
+        moved = StockMovement.objects.filter(
+            product=OuterRef('pk'), created_at__gte=OuterRef('history_snapshot_at'), created_at__lt=as_of,
+        )
+        rows = with_stock_as_of(Product.objects.order_by('pk'), as_of).filter(Exists(moved))
+        snapshots = (
+            StockSnapshot(product_id=product_id, as_of=as_of, quantity=quantity)
+            for product_id, quantity in rows.values_list('pk', 'stock_as_of').iterator(chunk_size=batch_size)
+        )
+        return len(StockSnapshot.objects.bulk_create(snapshots, batch_size=batch_size))
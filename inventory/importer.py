@@ -0,0 +1,253 @@
+"""
+استيراد كتالوج منتجات كبير (CSV أو XLSX) دفعة دفعة.
+
+كل دفعة: تحقق من الصفوف في بايثون، ثم upsert واحد على sku عبر bulk_create(update_conflicts=True)،
+ثم bulk_create واحد لحركات المخزون الافتتاحية للمنتجات الجديدة، ثم تحديث عدادات الفئات المتأثرة بفروقها.
+الفئات تُحل بالاسم من خريطة في الذاكرة (وتُنشأ الناقصة دفعة واحدة).
+
+الكمية في الملف هي المخزون الافتتاحي للمنتجات الجديدة فقط؛ المنتجات الموجودة تُحدّث بياناتها
+وتبقى كميتها كما هي (تغييرها يتم عبر حركات المخزون).
+"""
+import csv
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from inventory_management.cache import bump
+
+from .alerts import track_low_stock
+from .counters import COUNTER_FIELDS, apply_delta, contribution, product_values
+from .models import Category, Product, StockMovement
+from .signals import stock_bulk_changed
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # XLSX اختياري
+    load_workbook = None
+
+
+UPDATE_FIELDS = [
+    'name', 'category', 'description', 'cost_price', 'selling_price',
+    'reorder_level', 'is_active', 'is_low_stock', 'updated_at',
+]
+PRICE_LIMIT = Decimal('100000000')  # max_digits=10, decimal_places=2
+COUNT_LIMIT = 2147483647  # PositiveIntegerField
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off'}
+
+
+@dataclass
+class ImportResult:
+    """نتيجة استيراد كتالوج المنتجات"""
+    created: int = 0
+    updated: int = 0
+    rejected: list = field(default_factory=list)  # [(row_number, reason), ...]
+
+    @property
+    def rejected_count(self):
+        return len(self.rejected)
+
+
+def read_csv(stream):
+    """قراءة المنتجات من CSV بأعمدة: sku، name، category، description، cost_price، selling_price، quantity، reorder_level، is_active"""
+    return csv.DictReader(stream)
+
+
+def read_xlsx(path):
+    """قراءة المنتجات من أول ورقة في ملف XLSX (الصف الأول عناوين الأعمدة)"""
+    if load_workbook is None:
+        raise ImportError('XLSX import requires openpyxl')
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = [str(header).strip() if header is not None else '' for header in next(rows, [])]
+        for values in rows:
+            if any(value is not None for value in values):
+                yield dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+
+def import_products(rows, batch_size=1000, created_by=None, create_categories=True):
+    """
+    استيراد المنتجات مع upsert على sku.
+
+    الصفوف غير الصالحة تُرفض وتُسجل مع رقمها دون إيقاف الاستيراد؛ تكرار sku في نفس الملف يُرفض.
+    """
+    result = ImportResult()
+    categories = dict(Category.objects.values_list('name', 'pk'))
+    seen = set()
+    numbered = enumerate(rows, start=1)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            result.rejected.sort()
+            return result
+        _import_batch(batch, result, categories, seen, created_by, create_categories)
+
+
+def _text(row, name, max_length, required=False):
+    value = row.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f'Missing {name}')
+    if len(value) > max_length:
+        raise ValueError(f'{name} is longer than {max_length} characters')
+    return value
+
+
+def _price(row, name):
+    try:
+        value = Decimal(str(row.get(name)).strip()).quantize(Decimal('0.01'))
+    except (ArithmeticError, ValueError):
+        raise ValueError(f'Invalid {name}: {row.get(name)!r}')
+    # NaN يمر من quantize ثم تفشل مقارنته، فيُرفض قبلها
+    if not value.is_finite() or value < 0 or value >= PRICE_LIMIT:
+        raise ValueError(f'Invalid {name}: {value}')
+    return value
+
+
+def _count(row, name, default):
+    value = row.get(name)
+    if value is None or str(value).strip() == '':
+        return default
+    try:
+        value = int(Decimal(str(value).strip()))
+    except (ArithmeticError, ValueError):  # NaN و Infinity ترفع ValueError و OverflowError من int()
+        raise ValueError(f'Invalid {name}: {row.get(name)!r}')
+    if value < 0 or value > COUNT_LIMIT:
+        raise ValueError(f'Invalid {name}: {value}')
+    return value
+
+
+def _flag(row, name, default=True):
+    value = row.get(name)
+    if value is None or str(value).strip() == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'Invalid {name}: {row.get(name)!r}')
+
+
+def _parse(row):
+    return {
+        'sku': _text(row, 'sku', 20, required=True),
+        'name': _text(row, 'name', 100, required=True),
+        'category': _text(row, 'category', 100, required=True),
+        'description': _text(row, 'description', 10000) or None,
+        'cost_price': _price(row, 'cost_price'),
+        'selling_price': _price(row, 'selling_price'),
+        'quantity': _count(row, 'quantity', 0),
+        'reorder_level': _count(row, 'reorder_level', 10),
+        'is_active': _flag(row, 'is_active'),
+    }
+
+
+def _import_batch(batch, result, categories, seen, created_by, create_categories):
+    parsed = []
+    for number, row in batch:
+        try:
+            values = _parse(row)
+        except ValueError as e:
+            result.rejected.append((number, str(e)))
+            continue
+        if values['sku'] in seen:
+            result.rejected.append((number, f'Duplicate sku in file: {values["sku"]}'))
+            continue
+        seen.add(values['sku'])
+        parsed.append((number, values))
+
+    with transaction.atomic():
+        missing = {values['category'] for _, values in parsed} - categories.keys()
+        if missing and create_categories:
+            Category.objects.bulk_create([Category(name=name) for name in sorted(missing)], ignore_conflicts=True)
+            bump(Category)
+            categories.update(Category.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+        existing = {
+            row['sku']: row
+            for row in Product.objects.select_for_update().filter(
+                sku__in=[values['sku'] for _, values in parsed]
+            ).order_by().values('sku', 'pk', 'is_low_stock', *COUNTER_FIELDS)
+        }
+
+        now = timezone.now()
+        products = []
+        for number, values in parsed:
+            category_id = categories.get(values['category'])
+            if category_id is None:
+                result.rejected.append((number, f'Unknown category: {values["category"]}'))
+                continue
+            old = existing.get(values['sku'])
+            quantity = old['quantity'] if old else values['quantity']
+            products.append(Product(
+                sku=values['sku'],
+                name=values['name'],
+                category_id=category_id,
+                description=values['description'],
+                cost_price=values['cost_price'],
+                selling_price=values['selling_price'],
+                quantity=quantity,
+                reorder_level=values['reorder_level'],
+                is_active=values['is_active'],
+                is_low_stock=quantity <= values['reorder_level'],
+                updated_at=now,
+            ))
+
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS,
+        )
+
+        new_skus = [product.sku for product in products if product.sku not in existing]
+        # المحركات التي تدعم RETURNING تضبط pk مباشرة؛ غيرها يحتاج قراءة المعرفات
+        if any(product.pk is None for product in products):
+            new_ids = dict(Product.objects.filter(sku__in=new_skus).order_by().values_list('sku', 'pk'))
+            for product in products:
+                product.pk = existing[product.sku]['pk'] if product.sku in existing else new_ids[product.sku]
+
+        movements = []
+        for product in products:
+            old = existing.get(product.sku)
+            if old is None:
+                if product.quantity:
+                    movements.append(StockMovement(
+                        product_id=product.pk,
+                        movement_type=StockMovement.MOVEMENT_IN,
+                        quantity=product.quantity,
+                        unit_cost=product.cost_price,
+                        reference='import',
+                        notes='Initial stock',
+                        created_by=created_by,
+                    ))
+                was_low = False
+            else:
+                was_low = old['is_low_stock']
+            if product.is_low_stock != was_low:
+                track_low_stock(product.pk, was_low)
+        # الحركات الافتتاحية تُسجل كما هي: الكمية أُدخلت مع المنتج، فلا تمر بـ StockMovement.save
+        StockMovement.objects.bulk_create(movements)
+
+        # تجميع فروق عدادات الفئات كما في inventory.ingest بدلًا من إعادة حسابها من جدول المنتجات
+        deltas = defaultdict(lambda: (0, 0, 0, Decimal('0')))
+        for product in products:
+            old = existing.get(product.sku)
+            if old is not None:
+                deltas[old['category_id']] = tuple(a - b for a, b in zip(deltas[old['category_id']], contribution(old)))
+            deltas[product.category_id] = tuple(
+                a + b for a, b in zip(deltas[product.category_id], contribution(product_values(product)))
+            )
+        for category_id, delta in deltas.items():
+            apply_delta(category_id, delta)
+        stock_bulk_changed.send(sender=Product, product_ids=[product.pk for product in products])
+
+    result.created += len(new_skus)
+    result.updated += len(products) - len(new_skus)
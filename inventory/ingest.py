@@ -0,0 +1,198 @@
+import csv
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .alerts import track_low_stock
+from .counters import apply_delta, contribution, product_values
+from .models import Product, StockMovement
+from .signals import stock_bulk_changed
+
+
+MOVEMENT_TYPES = {value for value, _label in StockMovement.MOVEMENT_TYPES}
+
+
+@dataclass
+class IngestResult:
+    """نتيجة إدخال دفعة من حركات المخزون"""
+    created: int = 0
+    rejected: list = field(default_factory=list)  # [(row_number, reason), ...]
+
+    @property
+    def rejected_count(self):
+        return len(self.rejected)
+
+
+def read_csv(stream):
+    """قراءة الحركات من CSV بأعمدة: sku أو product، movement_type، quantity، unit_cost، reference، notes"""
+    return csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    """
+    قراءة الحركات من JSON Lines، كائن واحد في كل سطر.
+
+    السطر الذي ليس JSON صالحًا يُعاد كـ ValueError فيُرفض برقمه مثل بقية الصفوف غير الصالحة.
+    """
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f'Invalid JSON: {e.msg}')
+
+
+def _product_id(value):
+    """معرف المنتج عدد صحيح موجب (أو نص أرقامه فقط من CSV)؛ 1.5 أو True ليسا معرفًا"""
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    raise ValueError(f'Invalid product: {value!r}')
+
+
+def ingest_movements(rows, batch_size=1000, created_by=None):
+    """
+    إدخال عدد كبير من حركات المخزون دفعة واحدة.
+
+    تُجمع الحركات حسب المنتج وتُطبق بالترتيب على الكمية في الذاكرة، ثم يُنفذ لكل دفعة
+    bulk_update واحد للكميات و bulk_create واحد للحركات داخل معاملة واحدة.
+    الصفوف غير الصالحة أو التي لا يكفيها المخزون تُرفض وتُسجل مع رقمها دون إيقاف الدفعة.
+    """
+    result = IngestResult()
+    numbered = enumerate(rows, start=1)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            result.rejected.sort()
+            return result
+        _ingest_batch(batch, result, created_by)
+
+
+def _parse(row):
+    if isinstance(row, ValueError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError('Row is not an object')
+    movement_type = (row.get('movement_type') or '').strip().upper()
+    if movement_type not in MOVEMENT_TYPES:
+        raise ValueError(f'Unknown movement type: {movement_type or "(empty)"}')
+    try:
+        quantity = int(row.get('quantity'))
+    except (TypeError, ValueError, ArithmeticError):  # JSON يقبل NaN و Infinity
+        raise ValueError(f'Invalid quantity: {row.get("quantity")!r}')
+    if quantity < 0 or (quantity == 0 and movement_type != StockMovement.MOVEMENT_ADJUSTMENT):
+        raise ValueError(f'Invalid quantity: {quantity}')
+
+    unit_cost = row.get('unit_cost')
+    if unit_cost in (None, ''):
+        unit_cost = None
+    else:
+        try:
+            unit_cost = Decimal(str(unit_cost)).quantize(Decimal('0.01'))
+        except ArithmeticError:
+            raise ValueError(f'Invalid unit_cost: {unit_cost!r}')
+        # NaN يمر من quantize ثم تفشل مقارنته، فيُرفض قبلها
+        if not unit_cost.is_finite() or unit_cost < 0:
+            raise ValueError(f'Invalid unit_cost: {unit_cost}')
+
+    product = row.get('product') or row.get('product_id')
+    sku = (row.get('sku') or '').strip()
+    if not product and not sku:
+        raise ValueError('Missing product or sku')
+    return {
+        'product': _product_id(product) if product else None,
+        'sku': sku,
+        'movement_type': movement_type,
+        'quantity': quantity,
+        'unit_cost': unit_cost,
+        'reference': row.get('reference') or None,
+        'notes': row.get('notes') or None,
+    }
+
+
+def _ingest_batch(batch, result, created_by):
+    parsed = []
+    for number, row in batch:
+        try:
+            parsed.append((number, _parse(row)))
+        except ValueError as e:
+            result.rejected.append((number, str(e)))
+
+    ids = {row['product'] for _, row in parsed if row['product']}
+    skus = {row['sku'] for _, row in parsed if not row['product']}
+
+    with transaction.atomic():
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update().filter(Q(pk__in=ids) | Q(sku__in=skus)).order_by().only(
+                'pk', 'sku', 'category_id', 'is_active', 'quantity', 'reorder_level', 'cost_price', 'is_low_stock'
+            )
+        }
+        by_sku = {product.sku: product for product in products.values()}
+        before = {pk: product_values(product) for pk, product in products.items()}
+
+        movements = []
+        for number, row in parsed:
+            product = products.get(row['product']) if row['product'] else by_sku.get(row['sku'])
+            if product is None:
+                result.rejected.append((number, f'Unknown product: {row["product"] or row["sku"]}'))
+                continue
+
+            quantity = row['quantity']
+            unit_cost = row['unit_cost']
+            if row['movement_type'] == StockMovement.MOVEMENT_IN:
+                product.quantity += quantity
+                if unit_cost is None:
+                    unit_cost = product.cost_price
+            elif row['movement_type'] == StockMovement.MOVEMENT_OUT:
+                if product.quantity < quantity:
+                    result.rejected.append((number, 'Insufficient stock available'))
+                    continue
+                product.quantity -= quantity
+            else:
+                product.quantity = quantity
+
+            movements.append(StockMovement(
+                product=product,
+                movement_type=row['movement_type'],
+                quantity=quantity,
+                unit_cost=unit_cost,
+                reference=row['reference'],
+                notes=row['notes'],
+                created_by=created_by,
+            ))
+
+        changed = [product for pk, product in products.items() if product.quantity != before[pk]['quantity']]
+        now = timezone.now()
+        for product in changed:
+            product.updated_at = now
+            was_low = product.is_low_stock
+            product.is_low_stock = product.quantity <= product.reorder_level
+            if product.is_low_stock != was_low:
+                track_low_stock(product.pk, was_low)
+        Product.objects.bulk_update(changed, ['quantity', 'is_low_stock', 'updated_at'])
+        StockMovement.objects.bulk_create(movements)
+
+        # تجميع فروق عدادات الفئات بدلًا من تحديث الفئة لكل منتج
+        deltas = defaultdict(lambda: (0, 0, 0, Decimal('0')))
+        for product in changed:
+            old = contribution(before[product.pk])
+            new = contribution(product_values(product))
+            deltas[product.category_id] = tuple(
+                total + (n - o) for total, n, o in zip(deltas[product.category_id], new, old)
+            )
+        for category_id, delta in deltas.items():
+            apply_delta(category_id, delta)
+
+        stock_bulk_changed.send(sender=StockMovement, product_ids=[product.pk for product in changed])
+
+    result.created += len(movements)
+
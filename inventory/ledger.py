@@ -0,0 +1,83 @@
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from inventory_management.cache import bump
+
+from .alerts import track_low_stock
+from .counters import COUNTER_FIELDS, apply_change
+
+
+class InsufficientStock(ValueError):
+    """الكمية المتوفرة لا تكفي لحركة الإخراج"""
+
+    def __init__(self, message=None):
+        super().__init__(message or _('Insufficient stock available'))
+
+
+def _low_stock_after(delta):
+    """قيمة is_low_stock بعد إضافة delta إلى الكمية، محسوبة داخل نفس UPDATE"""
+    return Case(When(quantity__lte=F('reorder_level') - delta, then=Value(True)), default=Value(False))
+
+
+def apply_movement(product, movement_type, quantity):
+    """
+    تطبيق حركة مخزون على المنتج بتحديث ذري واحد بدلًا من قراءة الكمية وتعديلها في بايثون.
+
+    يجب استدعاؤها داخل معاملة تنشئ سجل الحركة أيضًا (انظر record_movement و StockMovement.save).
+    تعيد الكمية الجديدة وتحدّث product.quantity في الذاكرة.
+    """
+    from .models import Product, StockMovement
+
+    rows = Product.objects.filter(pk=product.pk)
+    now = timezone.now()
+
+    if movement_type == StockMovement.MOVEMENT_ADJUSTMENT:
+        # التعديل يضبط الكمية بقيمة مطلقة، لذا نقفل الصف ثم نحفظ الحقل وحده
+        locked = rows.select_for_update().get()
+        locked.quantity = quantity
+        locked.save(update_fields=['quantity', 'updated_at'])
+        product.quantity = quantity
+        product.is_low_stock = locked.is_low_stock
+        return quantity
+
+    if movement_type == StockMovement.MOVEMENT_IN:
+        delta = quantity
+        updated = rows.update(quantity=F('quantity') + quantity, is_low_stock=_low_stock_after(delta), updated_at=now)
+    elif movement_type == StockMovement.MOVEMENT_OUT:
+        delta = -quantity
+        # UPDATE ... SET quantity = quantity - n WHERE quantity >= n
+        updated = rows.filter(quantity__gte=quantity).update(
+            quantity=F('quantity') - quantity, is_low_stock=_low_stock_after(delta), updated_at=now,
+        )
+    else:
+        raise ValueError(_('Unknown movement type: %s') % movement_type)
+
+    if not updated:
+        if movement_type == StockMovement.MOVEMENT_OUT and rows.exists():
+            raise InsufficientStock()
+        raise Product.DoesNotExist()
+    bump(Product)
+
+    # الصف مقفل الآن حتى نهاية المعاملة، فالقراءة التالية تعكس تحديثنا بالضبط
+    new = rows.values(*COUNTER_FIELDS, 'is_low_stock').get()
+    old = {**new, 'quantity': new['quantity'] - delta}
+    apply_change(old, new)
+    was_low = old['quantity'] <= old['reorder_level']
+    if new['is_low_stock'] != was_low:
+        track_low_stock(product.pk, was_low)
+
+    product.is_low_stock = new['is_low_stock']
+
+    product.quantity = new['quantity']
+    product.updated_at = now
+    return new['quantity']
+
+
+def record_movement(product, movement_type, quantity, **fields):
+    """إنشاء حركة مخزون وتطبيقها على المنتج في نفس المعاملة"""
+    from .models import StockMovement
+
+    movement = StockMovement(product=product, movement_type=movement_type, quantity=quantity, **fields)
+    movement.save()
+    return movement
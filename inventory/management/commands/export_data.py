@@ -0,0 +1,42 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory_management.exports import DATASETS, export_chunks
+
+
+class Command(BaseCommand):
+    help = 'Stream products, movements, orders or invoices to a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', help='Output file (CSV defaults to stdout)')
+        parser.add_argument('--status', help='Only orders or invoices with this status')
+        parser.add_argument('--category', help='Only products in this category id')
+        parser.add_argument('--product', help='Only movements of this product id')
+        parser.add_argument('--type', help='Only movements of this type (IN, OUT or ADJUSTMENT)')
+
+    def handle(self, *args, **options):
+        if options['format'] == 'xlsx' and not options['output']:
+            raise CommandError('--output is required for XLSX exports')
+
+        # نفس معاملات التصفية في العروض، ويُتحقق منها بنفس clean_filters
+        params = {key: options[key] for key in ('status', 'category', 'product', 'type') if options[key]}
+        ignored = params.keys() - DATASETS[options['dataset']].filters.keys()
+        if ignored:
+            raise CommandError(f'--{min(ignored)} does not apply to {options["dataset"]}')
+        try:
+            chunks = export_chunks(options['dataset'], options['format'], params)
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+
+        if options['format'] == 'xlsx':
+            with open(options['output'], 'wb') as output:
+                for block in chunks:
+                    output.write(block)
+        elif options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
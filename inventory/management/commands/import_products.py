@@ -0,0 +1,59 @@
+import csv
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.importer import import_products, read_csv, read_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import a product catalog from CSV or XLSX, upserting on SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Input file (CSV defaults to stdin)')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help='Defaults to the file extension, or csv')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', help='Username recorded as the creator of the initial stock movements')
+        parser.add_argument('--no-create-categories', action='store_true', help='Reject rows with unknown categories')
+        parser.add_argument('--report', help='Write rejected rows (row, reason) to this CSV file')
+
+    def handle(self, *args, **options):
+        created_by = None
+        if options['user']:
+            try:
+                created_by = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'Unknown user: {options["user"]}')
+
+        path = options['path']
+        fmt = options['format'] or ('xlsx' if path and path.lower().endswith('.xlsx') else 'csv')
+        if fmt == 'xlsx':
+            if not path:
+                raise CommandError('A file path is required for XLSX imports')
+            result = self._import(read_xlsx(path), options, created_by)
+        elif path:
+            with open(path, newline='', encoding='utf-8-sig') as stream:
+                result = self._import(read_csv(stream), options, created_by)
+        else:
+            result = self._import(read_csv(sys.stdin), options, created_by)
+
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as report:
+                writer = csv.writer(report)
+                writer.writerow(['row', 'reason'])
+                writer.writerows(result.rejected)
+        else:
+            for number, reason in result.rejected:
+                self.stderr.write(f'row {number}: {reason}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} products, updated {result.updated}, rejected {result.rejected_count} rows.'
+        ))
+
+    def _import(self, rows, options, created_by):
+        return import_products(
+            rows,
+            batch_size=options['batch_size'],
+            created_by=created_by,
+            create_categories=not options['no_create_categories'],
+        )
@@ -0,0 +1,32 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.ingest import ingest_movements, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Bulk-ingest stock movements from CSV or JSON Lines read on stdin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', help='Username recorded as the creator of the movements')
+
+    def handle(self, *args, **options):
+        created_by = None
+        if options['user']:
+            try:
+                created_by = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'Unknown user: {options["user"]}')
+
+        reader = read_csv if options['format'] == 'csv' else read_jsonl
+        result = ingest_movements(reader(sys.stdin), batch_size=options['batch_size'], created_by=created_by)
+
+        for number, reason in result.rejected:
+            self.stderr.write(f'row {number}: {reason}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} movements, rejected {result.rejected_count} rows.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.counters import rebuild_category_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized product counters stored on each category'
+
+    def add_arguments(self, parser):
+        parser.add_argument('category_ids', nargs='*', type=int, help='Only rebuild these categories')
+
+    def handle(self, *args, **options):
+        category_ids = options['category_ids'] or None
+        with transaction.atomic():
+            updated = rebuild_category_counters(category_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} categories.'))
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory.history import end_of_day, take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Write end-of-day stock snapshots from the stock movement ledger (run daily, or with --start to backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD), defaults to --end')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD), defaults to yesterday')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate() - timedelta(days=1)
+        start = options['start'] or end
+        if end < start:
+            raise CommandError('--end is before --start')
+        if end >= timezone.localdate():
+            raise CommandError('Only days that have ended can be snapshotted')
+
+        # كل يوم يبني على لقطات اليوم السابق، لذا تُكتب بالترتيب
+        total = 0
+        day = start
+        while day <= end:
+            written = take_snapshots(end_of_day(day), batch_size=options['batch_size'])
+            total += written
+            self.stdout.write(f'{day}: {written} snapshots')
+            day += timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} snapshots.'))
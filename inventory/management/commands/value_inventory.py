@@ -0,0 +1,31 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.valuation import recompute_all, update_valuations
+
+
+class Command(BaseCommand):
+    help = 'Update the FIFO and moving-average inventory valuations from new stock movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every product from its whole movement history')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes for --full')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Products per worker task for --full')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Movements per batch for incremental updates')
+
+    def handle(self, *args, **options):
+        if min(options['chunk_size'], options['batch_size']) < 1:
+            raise CommandError('--chunk-size and --batch-size must be positive')
+
+        if not options['full']:
+            processed = update_valuations(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} new movements.'))
+            return
+
+        products = movements = 0
+        for chunk_products, chunk_movements in recompute_all(options['workers'], options['chunk_size']):
+            products += chunk_products
+            movements += chunk_movements
+            self.stdout.write(f'{products} products valued ({movements} movements)')
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {products} products from {movements} movements.'))
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def rebuild_counters(apps, schema_editor):
+    Category = apps.get_model('inventory', 'Category')
+    Product = apps.get_model('inventory', 'Product')
+
+    for category in Category.objects.all():
+        products = Product.objects.filter(category=category)
+        stats = products.aggregate(
+            product_count=models.Count('pk'),
+            active_product_count=models.Count('pk', filter=models.Q(is_active=True)),
+            low_stock_count=models.Count('pk', filter=models.Q(quantity__lte=models.F('reorder_level'))),
+            stock_value=models.Sum(models.F('quantity') * models.F('cost_price'), output_field=models.DecimalField()),
+        )
+        stats['stock_value'] = stats['stock_value'] or Decimal('0')
+        Category.objects.filter(pk=category.pk).update(**stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Product Count'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='active_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Active Product Count'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='low_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Low Stock Count'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='stock_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='Stock Value'),
+        ),
+        migrations.RunPython(rebuild_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def fill_low_stock(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Product.objects.update(
+        is_low_stock=models.Case(
+            models.When(quantity__lte=models.F('reorder_level'), then=models.Value(True)),
+            default=models.Value(False),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Low Stock'),
+        ),
+        migrations.RunPython(fill_low_stock, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_low_stock_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_low_stock', True)), fields=['quantity'], name='product_low_stock_idx'),
+        ),
+    ]
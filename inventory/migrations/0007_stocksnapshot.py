@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_product_is_low_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField(verbose_name='As Of')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Quantity')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Stock Snapshot',
+                'verbose_name_plural': 'Stock Snapshots',
+                'ordering': ['-as_of'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'as_of'), name='stocksnapshot_product_as_of_uniq')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(condition=models.Q(('movement_type', 'ADJUSTMENT')), fields=['product', '-created_at', '-id'], name='stockmove_adjustment_idx'),
+        ),
+    ]
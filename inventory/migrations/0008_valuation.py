@@ -0,0 +1,49 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Unit Cost'),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remaining', models.PositiveIntegerField(verbose_name='Remaining Quantity')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Cost')),
+                ('movement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.stockmovement', verbose_name='Stock Movement')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='inventory.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Cost Layer',
+                'verbose_name_plural': 'Cost Layers',
+                'ordering': ['product', 'movement_id'],
+                'indexes': [models.Index(fields=['product', 'movement'], name='costlayer_product_movement_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductValuation',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valuation', serialize=False, to='inventory.product', verbose_name='Product')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Quantity')),
+                ('average_cost', models.DecimalField(decimal_places=4, default=0, max_digits=14, verbose_name='Average Cost')),
+                ('average_value', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Value (Moving Average)')),
+                ('fifo_value', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Value (FIFO)')),
+                ('checkpoint', models.PositiveBigIntegerField(default=0, verbose_name='Last Movement')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Product Valuation',
+                'verbose_name_plural': 'Product Valuations',
+            },
+        ),
+    ]
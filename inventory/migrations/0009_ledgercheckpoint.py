@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_valuation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Name')),
+                ('movement_id', models.PositiveBigIntegerField(default=0, verbose_name='Last Movement')),
+                ('checked_at', models.DateTimeField(verbose_name='Checked At')),
+            ],
+            options={
+                'verbose_name': 'Ledger Checkpoint',
+                'verbose_name_plural': 'Ledger Checkpoints',
+            },
+        ),
+    ]
@@ -1,11 +1,19 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from users.models import User
+from .alerts import track_low_stock
+from .counters import COUNTER_FIELDS, apply_change, product_values, rebuild_category_counters
+from .ledger import apply_movement
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name=_('Name'))
     description = models.TextField(blank=True, null=True, verbose_name=_('Description'))
+    # عدادات مخزنة يتم تحديثها مع كل تغيير في المنتجات (انظر inventory/counters.py)
+    product_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Product Count'))
+    active_product_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Active Product Count'))
+    low_stock_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Low Stock Count'))
+    stock_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False, verbose_name=_('Stock Value'))
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -15,6 +23,11 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('category-detail', kwargs={'pk': self.pk})
     
+    def refresh_counters(self):
+        """إعادة حساب عدادات هذه الفئة من جدول المنتجات"""
+        rebuild_category_counters([self.pk])
+        self.refresh_from_db(fields=['product_count', 'active_product_count', 'low_stock_count', 'stock_value'])
+    
     class Meta:
         verbose_name = _('Category')
         verbose_name_plural = _('Categories')
@@ -32,6 +45,8 @@ class Product(models.Model):
     reorder_level = models.PositiveIntegerField(default=10, verbose_name=_('Reorder Level'))
     image = models.ImageField(upload_to='products/', blank=True, null=True, verbose_name=_('Image'))
     is_active = models.BooleanField(default=True, verbose_name=_('Active'))
+    # quantity <= reorder_level مخزنة ليخدمها فهرس؛ تُحدّث في save ومسارات الكتابة المجمّعة (انظر inventory/alerts.py)
+    is_low_stock = models.BooleanField(default=False, editable=False, verbose_name=_('Low Stock'))
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -41,20 +56,52 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('product-detail', kwargs={'pk': self.pk})
     
-    @property
-    def is_low_stock(self):
-        return self.quantity <= self.reorder_level
-    
     @property
     def profit_margin(self):
         if self.cost_price:
             return ((self.selling_price - self.cost_price) / self.cost_price) * 100
         return 0
     
+    def save(self, *args, **kwargs):
+        """حفظ المنتج وتحديث عدادات الفئة وعلم انخفاض المخزون في نفس المعاملة"""
+        update_fields = kwargs.get('update_fields')
+        tracked = [
+            field for field in COUNTER_FIELDS
+            if update_fields is None or field in update_fields or field.removesuffix('_id') in update_fields
+        ]
+        if not tracked:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic(using=kwargs.get('using')):
+            old = None
+            if self.pk is not None and not self._state.adding:
+                old = Product.objects.select_for_update().filter(pk=self.pk).values(*COUNTER_FIELDS, 'is_low_stock').first()
+            new = product_values(self)
+            if old is not None:
+                new = {**old, **{field: new[field] for field in tracked}}
+            self.is_low_stock = new['quantity'] <= new['reorder_level']
+            if update_fields is not None and 'is_low_stock' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'is_low_stock']
+            super().save(*args, **kwargs)
+            apply_change(old, new)
+
+            was_low = old['is_low_stock'] if old is not None else False
+            if self.is_low_stock != was_low:
+                track_low_stock(self.pk, was_low, using=self._state.db)
+    
     class Meta:
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['category', 'name'], name='product_category_name_idx'),
+            # فهرس جزئي صغير لصفحة المنتجات منخفضة المخزون
+            models.Index(
+                fields=['quantity'],
+                condition=models.Q(is_active=True, is_low_stock=True),
+                name='product_low_stock_idx',
+            ),
+        ]
 
 
 class StockMovement(models.Model):
@@ -71,6 +118,8 @@ class StockMovement(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements', verbose_name=_('Product'))
     movement_type = models.CharField(max_length=10, choices=MOVEMENT_TYPES, verbose_name=_('Movement Type'))
     quantity = models.PositiveIntegerField(verbose_name=_('Quantity'))
+    # تكلفة الوحدة لحركات الإدخال (انظر inventory/valuation.py)؛ الافتراضي سعر تكلفة المنتج وقت الحركة
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name=_('Unit Cost'))
     reference = models.CharField(max_length=100, blank=True, null=True, verbose_name=_('Reference'))
     notes = models.TextField(blank=True, null=True, verbose_name=_('Notes'))
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name=_('Created By'))
@@ -80,24 +129,100 @@ class StockMovement(models.Model):
         return f"{self.get_movement_type_display()} - {self.product.name} ({self.quantity})"
     
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
+        """تطبيق الحركة على كمية المنتج وإنشاء سجلها في نفس المعاملة"""
+        if self.pk is not None:
+            return super().save(*args, **kwargs)
         
-        if is_new:
-            if self.movement_type == self.MOVEMENT_IN:
-                self.product.quantity += self.quantity
-            elif self.movement_type == self.MOVEMENT_OUT:
-                if self.product.quantity >= self.quantity:
-                    self.product.quantity -= self.quantity
-                else:
-                    raise ValueError(_('Insufficient stock available'))
-            elif self.movement_type == self.MOVEMENT_ADJUSTMENT:
-                self.product.quantity = self.quantity
-            
-            self.product.save()
-        
-        super().save(*args, **kwargs)
+        if self.movement_type == self.MOVEMENT_IN and self.unit_cost is None:
+            self.unit_cost = self.product.cost_price
+        with transaction.atomic(using=kwargs.get('using')):
+            apply_movement(self.product, self.movement_type, self.quantity)
+            super().save(*args, **kwargs)
     
     class Meta:
         verbose_name = _('Stock Movement')
         verbose_name_plural = _('Stock Movements')
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        # id في نهاية كل فهرس يطابق ترتيب التصفح بالمفاتيح (-created_at, -pk)
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='stockmove_product_created_idx'),
+            models.Index(fields=['movement_type', '-created_at', '-id'], name='stockmove_type_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='stockmove_created_idx'),
+            # آخر تعديل لكل منتج في inventory/history.py؛ التعديلات قليلة فالفهرس صغير
+            models.Index(
+                fields=['product', '-created_at', '-id'], name='stockmove_adjustment_idx',
+                condition=models.Q(movement_type='ADJUSTMENT'),
+            ),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """الكمية المتوفرة من منتج قبل لحظة as_of مباشرة، محسوبة من سجل الحركات (انظر inventory/history.py)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots', verbose_name=_('Product'))
+    as_of = models.DateTimeField(verbose_name=_('As Of'))
+    quantity = models.PositiveIntegerField(verbose_name=_('Quantity'))
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.product_id} @ {self.as_of:%Y-%m-%d %H:%M}: {self.quantity}"
+    
+    class Meta:
+        verbose_name = _('Stock Snapshot')
+        verbose_name_plural = _('Stock Snapshots')
+        ordering = ['-as_of']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'as_of'], name='stocksnapshot_product_as_of_uniq'),
+        ]
+
+
+class CostLayer(models.Model):
+    """طبقة تكلفة مفتوحة (كمية متبقية من إدخال واحد) لتقييم FIFO"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers', verbose_name=_('Product'))
+    movement = models.ForeignKey(StockMovement, on_delete=models.CASCADE, related_name='cost_layers', verbose_name=_('Stock Movement'))
+    remaining = models.PositiveIntegerField(verbose_name=_('Remaining Quantity'))
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('Unit Cost'))
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.remaining} @ {self.unit_cost}"
+    
+    class Meta:
+        verbose_name = _('Cost Layer')
+        verbose_name_plural = _('Cost Layers')
+        # ترتيب الاستهلاك: الأقدم أولًا
+        ordering = ['product', 'movement_id']
+        indexes = [
+            models.Index(fields=['product', 'movement'], name='costlayer_product_movement_idx'),
+        ]
+
+
+class ProductValuation(models.Model):
+    """تقييم مخزون المنتج بطريقتي FIFO والمتوسط المتحرك حتى الحركة checkpoint"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='valuation', verbose_name=_('Product'))
+    quantity = models.PositiveIntegerField(default=0, verbose_name=_('Quantity'))
+    average_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0, verbose_name=_('Average Cost'))
+    average_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('Value (Moving Average)'))
+    fifo_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('Value (FIFO)'))
+    # معرّف آخر حركة عولجت لهذا المنتج
+    checkpoint = models.PositiveBigIntegerField(default=0, verbose_name=_('Last Movement'))
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.product_id}: FIFO {self.fifo_value}, average {self.average_value}"
+    
+    class Meta:
+        verbose_name = _('Product Valuation')
+        verbose_name_plural = _('Product Valuations')
+
+
+class LedgerCheckpoint(models.Model):
+    """موضع آخر فحص مكتمل لاتساق الكميات مع سجل الحركات (انظر أمر check_stock_ledger)"""
+    name = models.CharField(max_length=50, unique=True, verbose_name=_('Name'))
+    movement_id = models.PositiveBigIntegerField(default=0, verbose_name=_('Last Movement'))
+    checked_at = models.DateTimeField(verbose_name=_('Checked At'))
+    
+    def __str__(self):
+        return f"{self.name}: {self.checked_at:%Y-%m-%d %H:%M}"
+    
+    class Meta:
+        verbose_name = _('Ledger Checkpoint')
+        verbose_name_plural = _('Ledger Checkpoints')
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+تصفح بالمفاتيح (keyset / seek) بدلًا من OFFSET/LIMIT.
+
+الصفحة التالية تُجلب بشرط على مفاتيح الترتيب (مثل created_at < X OR (created_at = X AND id < Y))
+فيبقى زمن أي صفحة ثابتًا مهما ابتعدت عن البداية، ولا حاجة إلى COUNT(*).
+
+رقم الصفحة يُستبدل برمز مبهم (base64) يُمرر في نفس المعامل ?page=، و next_page_number و
+previous_page_number تعيدان هذا الرمز، لذا تعمل القوالب الحالية دون تعديل. مفاتيح الترتيب يجب ألا
+تكون NULL، وآخرها يجب أن يكون فريدًا (عادةً pk).
+
+الصفحة تحمل باقي واجهة Page (number و start_index و end_index، والرمز يحمل رقم الصفحة). روابط
+الأرقام في القوالب (?page=3 من paginator.page_range، أو ?page=last) تُجلب بـ OFFSET كما في Paginator.
+بدون count يكون paginator.count و num_pages هما None و page_range فارغًا، فتبقى روابط السابق والتالي فقط.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def _json_default(value):
+    # DjangoJSONEncoder يقتطع الأجزاء الدقيقة من الثانية، والمفتاح يجب أن يُعاد بقيمته الدقيقة
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a page token')
+
+
+class KeysetPaginator:
+    """Paginator بالمفاتيح؛ ordering مثل ('-created_at', '-pk')"""
+
+    def __init__(self, object_list, per_page, ordering, count=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self._keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        # العدد اختياري (مثلًا عندما يحسبه العرض ضمن الإحصائيات)، ولا يُنفذ COUNT لأجله
+        self.count = count
+        self.num_pages = None if count is None else max(1, -(-count // self.per_page))
+
+    @property
+    def page_range(self):
+        return range(1, (self.num_pages or 0) + 1)
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def encode(self, direction, obj, number):
+        values = [getattr(obj, 'pk' if name == 'pk' else self._field(name).attname) for name, _ in self._keys]
+        data = json.dumps([direction, values, number], default=_json_default, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode(self, token):
+        """فك الرمز إلى (الاتجاه، القيم، رقم الصفحة)؛ الرمز غير الصالح يعني الصفحة الأولى"""
+        if not token:
+            return None
+        try:
+            data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direction, values, number = json.loads(data)
+            if direction not in (NEXT, PREVIOUS) or len(values) != len(self._keys):
+                return None
+            if type(number) is not int or number < 1:
+                return None
+            values = [self._field(name).to_python(value) for (name, _), value in zip(self._keys, values)]
+            return direction, values, number
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+
+    def _seek(self, values, backwards):
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self._keys, values):
+            lookup = '__lt' if descending != backwards else '__gt'
+            condition |= Q(**equal, **{name + lookup: value})
+            equal[name] = value
+        return condition
+
+    def _number(self, token):
+        """رقم صفحة صريح من روابط الأرقام، أو None إذا كان token رمزًا"""
+        if token == 'last':
+            return self.num_pages
+        if isinstance(token, int) or (isinstance(token, str) and token.isdigit()):
+            number = max(1, int(token))
+            return min(number, self.num_pages) if self.num_pages else number
+        return None
+
+    def get_page(self, token=None):
+        number = self._number(token)
+        if number is not None and number > 1:
+            # قفزة إلى رقم صفحة: OFFSET كما في Paginator، ثم يكمل التصفح بالرموز
+            offset = (number - 1) * self.per_page
+            rows = list(self.object_list.order_by(*self.ordering)[offset:offset + self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, number, has_next=len(rows) > self.per_page, has_previous=True)
+
+        cursor = self.decode(token)
+        backwards = cursor is not None and cursor[0] == PREVIOUS
+        ordering = self.ordering
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else '-' + name for name in ordering]
+
+        queryset = self.object_list.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self._seek(cursor[1], backwards))
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if cursor is None:
+            return KeysetPage(rows, self, 1, has_next=more, has_previous=False)
+        if backwards:
+            rows.reverse()
+            # لا صفوف قبلها: هي الأولى مهما تغير عدد الصفوف منذ إنشاء الرمز
+            return KeysetPage(rows, self, cursor[2] if more else 1, has_next=True, has_previous=more)
+        return KeysetPage(rows, self, cursor[2], has_next=more, has_previous=True)
+
+
+class KeysetPage:
+    """صفحة بنفس واجهة django.core.paginator.Page المستخدمة في القوالب"""
+
+    def __init__(self, object_list, paginator, number, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        if not self.has_next():
+            raise EmptyPage('That page contains no results')
+        return self.paginator.encode(NEXT, self.object_list[-1], self.number + 1)
+
+    def previous_page_number(self):
+        if not self.has_previous():
+            raise EmptyPage('That page number is less than 1')
+        return self.paginator.encode(PREVIOUS, self.object_list[0], max(1, self.number - 1))
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
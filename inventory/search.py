@@ -0,0 +1,168 @@
+"""
+بحث المنتجات عبر فهارس مخصصة بدلًا من icontains.
+
+- SKU: بحث بالبادئة كنطاق (sku >= q AND sku < q + '\\uffff') يستخدم الفهرس الفريد على العمود.
+- الاسم والوصف: جدول FTS5 على SQLite (تحافظ عليه triggers)، وفهارس trigram (GIN) على PostgreSQL.
+
+تُنشأ الفهارس في الترحيل 0004_product_search. إذا لم يوجد فهرس يعود البحث إلى icontains كما كان.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+FTS_TABLE = 'inventory_product_fts'
+PRODUCT_TABLE = 'inventory_product'
+SKU_PREFIX_END = '\uffff'
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, content='{PRODUCT_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON {PRODUCT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRESQL_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS {PRODUCT_TABLE}_name_trgm ON {PRODUCT_TABLE} USING gin (name gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS {PRODUCT_TABLE}_description_trgm ON {PRODUCT_TABLE} USING gin (description gin_trgm_ops)",
+]
+
+POSTGRESQL_UNINSTALL = [
+    f"DROP INDEX IF EXISTS {PRODUCT_TABLE}_name_trgm",
+    f"DROP INDEX IF EXISTS {PRODUCT_TABLE}_description_trgm",
+]
+
+_available = {}
+
+
+def install_search_index(connection):
+    """إنشاء فهرس البحث المناسب لقاعدة البيانات (لا يفعل شيئًا مع المحركات الأخرى)"""
+    statements = {'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRESQL_INSTALL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _available.pop(connection.alias, None)
+
+
+def uninstall_search_index(connection):
+    statements = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRESQL_UNINSTALL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _available.pop(connection.alias, None)
+
+
+def search_index_available(using='default'):
+    """هل يوجد فهرس بحث على قاعدة البيانات؟ (تُحفظ النتيجة لكل اتصال)"""
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor == 'sqlite':
+            _available[using] = FTS_TABLE in connection.introspection.table_names()
+        elif connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [f'{PRODUCT_TABLE}_name_trgm'])
+                _available[using] = cursor.fetchone() is not None
+        else:
+            _available[using] = False
+    return _available[using]
+
+
+def reset_search_index_cache():
+    _available.clear()
+
+
+def _fts_query(query):
+    """تحويل نص المستخدم إلى استعلام FTS5 آمن: كل كلمة كبادئة، والكلمات مجتمعة (AND)"""
+    tokens = re.findall(r'\w+', query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _sku_prefix(query):
+    condition = Q()
+    for prefix in {query, query.upper()}:
+        condition |= Q(sku__gte=prefix, sku__lt=prefix + SKU_PREFIX_END)
+    return condition
+
+
+def legacy_search(queryset, query):
+    """البحث القديم بـ icontains (بدون ترتيب حسب الصلة)"""
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(sku__icontains=query) |
+        Q(description__icontains=query)
+    )
+
+
+def search_products(queryset, query):
+    """
+    البحث في المنتجات مع ترتيب حسب الصلة.
+
+    تعيد queryset مع الحقل search_rank (الأعلى أولًا)، وتكون قيمته None عند الرجوع إلى icontains.
+    """
+    query = query.strip()
+    connection = connections[queryset.db]
+    if not query or not search_index_available(queryset.db):
+        return legacy_search(queryset, query).annotate(search_rank=Value(None, output_field=FloatField()))
+
+    sku_exact = Q(sku=query) | Q(sku=query.upper())
+    sku_prefix = _sku_prefix(query)
+
+    if connection.vendor == 'sqlite':
+        match = _fts_query(query)
+        if not match:
+            return queryset.filter(sku_prefix).annotate(
+                search_rank=Case(When(sku_exact, then=Value(100.0)), default=Value(50.0), output_field=FloatField())
+            )
+        matched = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        # bm25 أصغر كلما كانت الصلة أقوى؛ نعكس الإشارة ونعطي الاسم وزنًا أكبر من الوصف.
+        # MATERIALIZED يجعل SQLite ينفذ المطابقة مرة واحدة بدل تكرارها لكل صف
+        text_rank = RawSQL(
+            f"WITH ranked AS MATERIALIZED (SELECT rowid, -bm25({FTS_TABLE}, 10.0, 1.0) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) "
+            f"SELECT score FROM ranked WHERE ranked.rowid = {PRODUCT_TABLE}.id",
+            (match,),
+            output_field=FloatField(),
+        )
+    else:
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Greatest
+
+        matched = RawSQL(
+            f"SELECT id FROM {PRODUCT_TABLE} WHERE %s <%% name OR %s <%% description",
+            (query, query),
+        )
+        text_rank = Greatest(
+            TrigramWordSimilarity(query, 'name') * 10,
+            Coalesce(TrigramWordSimilarity(query, 'description'), Value(0.0)),
+            output_field=FloatField(),
+        )
+
+    return queryset.filter(Q(pk__in=matched) | sku_prefix).annotate(
+        search_rank=Coalesce(text_rank, Value(0.0)) + Case(
+            When(sku_exact, then=Value(1000.0)),
+            When(sku_prefix, then=Value(100.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from inventory_management.cache import bump, track
+
+from . import typeahead
+from .counters import apply_change
+from .models import Category, Product, StockMovement
+
+# يُرسل بعد تعديل كميات منتجات دون المرور بـ save() (الإدخال المجمّع مثلًا)، مع product_ids
+stock_bulk_changed = Signal()
+
+# نتائج القراءة المخزنة التي تعتمد على المخزون (inventory_management/cache.py)
+track(Product, Category, StockMovement)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """طرح مساهمة المنتج المحذوف من عدادات فئته"""
+    apply_change({
+        'category_id': instance.category_id,
+        'is_active': instance.is_active,
+        'quantity': instance.quantity,
+        'reorder_level': instance.reorder_level,
+        'cost_price': instance.cost_price,
+    }, None)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_labels_changed(sender, **kwargs):
+    """المنتج الجديد أو المعدل يظهر في البحث من هذه العملية فورًا؛ العمليات الأخرى عند انتهاء مدة فهرسها"""
+    typeahead.invalidate()
+
+
+@receiver(stock_bulk_changed)
+def stock_written_in_bulk(sender, **kwargs):
+    """الكتابات الجماعية لا ترسل post_save، فنرفع أجيال المنتجات والحركات هنا"""
+    bump(Product, StockMovement)
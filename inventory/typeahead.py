@@ -0,0 +1,103 @@
+"""
+فهرس مضغوط في الذاكرة لاختيار المنتجات بالبحث (product-typeahead) بدلًا من قوائم تحمل الكتالوج كله.
+
+المفاتيح مرتبة: SKU كاملًا وكل كلمة من الاسم بحروف صغيرة، مع معرف المنتج في مصفوفة موازية. البحث
+بالبادئة هو bisect ثم قراءة متتالية حتى تنتهي البادئة، فلا يتعلق زمنه بحجم الكتالوج.
+
+كل عملية تبني فهرسها عند أول طلب وتعيد بناءه كل PRODUCT_TYPEAHEAD_REFRESH ثانية (أو بعد تعديل
+منتج في نفس العملية)؛ الطلبات أثناء إعادة البناء تستخدم الفهرس السابق.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Product
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+
+def _words(text):
+    return text.casefold().split()
+
+
+class ProductIndex:
+    def __init__(self, rows):
+        """rows: (id, sku, name)"""
+        self.labels = {}
+        keys, ids = [], array('q')
+        for pk, sku, name in rows:
+            self.labels[pk] = (sku, name)
+            words = {sku.casefold(), *_words(name)}
+            keys.extend(words)
+            ids.extend([pk] * len(words))
+        # ترتيب المواضع بالمفتاح وحده أسرع من ترتيب أزواج (مفتاح، معرف)؛ المتساوية تبقى بترتيب rows
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[position] for position in order]
+        self.ids = array('q', (ids[position] for position in order))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        المنتجات التي يبدأ SKU أو إحدى كلمات اسمها بأول كلمة من query، وتبدأ كلمات اسمها (أو SKU)
+        ببقية الكلمات؛ تعاد [(id, sku, name)] بترتيب المفاتيح.
+        """
+        first, *rest = _words(query) or ['']
+        if not first:
+            return []
+        results, seen = [], set()
+        for position in range(bisect_left(self.keys, first), len(self.keys)):
+            if not self.keys[position].startswith(first):
+                break
+            pk = self.ids[position]
+            if pk in seen:
+                continue
+            seen.add(pk)
+            sku, name = self.labels[pk]
+            if rest:
+                words = [sku.casefold(), *_words(name)]
+                if not all(any(word.startswith(part) for word in words) for part in rest):
+                    continue
+            results.append((pk, sku, name))
+            if len(results) >= limit:
+                break
+        return results
+
+
+_index = None
+_built_at = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """فهرس العملية الحالية، معاد بناؤه إذا انتهت مدته"""
+    global _index, _built_at
+    stale = _built_at is None or time.monotonic() - _built_at > settings.PRODUCT_TYPEAHEAD_REFRESH
+    if not stale:
+        return _index
+    # طلب واحد يعيد البناء؛ البقية تستخدم الفهرس الحالي إن وُجد
+    if not _lock.acquire(blocking=_index is None):
+        return _index
+    try:
+        if _built_at is None or time.monotonic() - _built_at > settings.PRODUCT_TYPEAHEAD_REFRESH:
+            rows = Product.objects.order_by('pk').values_list('pk', 'sku', 'name').iterator(chunk_size=5000)
+            _index = ProductIndex(rows)
+            _built_at = time.monotonic()
+        return _index
+    finally:
+        _lock.release()
+
+
+def invalidate():
+    """إعادة البناء عند الطلب التالي في هذه العملية"""
+    global _built_at
+    _built_at = None
+
+
+def search(query, limit=DEFAULT_LIMIT):
+    return get_index().search(query, min(max(limit, 1), MAX_LIMIT))
@@ -2,5 +2,20 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.inventory_list, name='inventory-list'),
-]
\ No newline at end of file
+    path('', views.product_list, name='inventory-list'),
+    path('products/', views.product_list, name='product-list'),
+    path('products/add/', views.product_create, name='product-create'),
+    path('products/<int:pk>/', views.product_detail, name='product-detail'),
+    path('products/<int:pk>/edit/', views.product_update, name='product-update'),
+    path('products/<int:pk>/delete/', views.product_delete, name='product-delete'),
+    path('products/export/', views.product_export, name='product-export'),
+    path('products/low-stock/', views.low_stock_products, name='low-stock-products'),
+    path('products/typeahead/', views.product_typeahead, name='product-typeahead'),
+    path('categories/', views.category_list, name='category-list'),
+    path('categories/add/', views.category_create, name='category-create'),
+    path('categories/<int:pk>/edit/', views.category_update, name='category-update'),
+    path('categories/<int:pk>/delete/', views.category_delete, name='category-delete'),
+    path('stock-movements/', views.stock_movement_list, name='stock-movement-list'),
+    path('stock-movements/add/', views.stock_movement_create, name='stock-movement-create'),
+    path('stock-movements/export/', views.stock_movement_export, name='stock-movement-export'),
+]
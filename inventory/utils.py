@@ -0,0 +1,30 @@
+from django.core.paginator import Paginator
+from django.db.models import Count, Max, Sum, Q, F, ExpressionWrapper, DecimalField
+
+
+STOCK_VALUE = ExpressionWrapper(F('quantity') * F('cost_price'), output_field=DecimalField())
+
+
+def get_product_summary(products):
+    """
+    حساب إحصائيات المخزون (العدد، القيمة، المنتجات منخفضة المخزون) في استعلام واحد، مع آخر تعديل
+    (last_modified) لتحقق GET الشرطي
+    """
+    summary = products.order_by().aggregate(
+        total_products=Count('pk'),
+        total_value=Sum(STOCK_VALUE),
+        low_stock_count=Count('pk', filter=Q(is_low_stock=True)),
+        last_modified=Max('updated_at'),
+    )
+    summary['total_value'] = summary['total_value'] or 0
+    return summary
+
+
+class CountedPaginator(Paginator):
+    """Paginator يستخدم عددًا محسوبًا مسبقًا بدلًا من تنفيذ COUNT إضافي"""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # count هو cached_property، لذا يكفي وضع القيمة في __dict__
+            self.__dict__['count'] = count
@@ -0,0 +1,239 @@
+"""
+تقييم المخزون بطريقتي FIFO والمتوسط المتحرك من سجل StockMovement.
+
+الحركات تُعالج بترتيب إدخالها (pk)، وهو الترتيب الذي طُبقت به على Product.quantity. لكل منتج:
+
+- IN تضيف طبقة تكلفة بـ unit_cost (أو سعر تكلفة المنتج الحالي إن لم تُسجل) وتعيد حساب المتوسط المرجح.
+- OUT تستهلك أقدم الطبقات أولًا؛ المتوسط لا يتغير بالإخراج.
+- ADJUSTMENT تضبط الكمية: الزيادة طبقة جديدة بالمتوسط الحالي، والنقص يُستهلك كإخراج.
+
+حالة كل منتج (ProductValuation والطبقات المفتوحة CostLayer) تُحفظ مع معرّف آخر حركة عولجت، فكل
+تشغيل لـ update_valuations يقرأ الحركات الجديدة فقط على دفعات بالمفتاح، ولا يُحمّل إلا حالة منتجات
+الدفعة الجارية. recompute_all يعيد البناء من الصفر على مجموعات من المنتجات في عمليات متوازية.
+
+المخزون الذي لم يدخل عبر حركات (بيانات قديمة) ليس له طبقات، فيظهر في الكمية ولا يظهر في قيمة FIFO.
+"""
+import multiprocessing
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from inventory_management.cache import bump
+
+from .models import CostLayer, Product, ProductValuation, StockMovement
+
+CENT = Decimal('0.01')
+COST_PLACES = Decimal('0.0001')
+MOVEMENT_FIELDS = ('pk', 'product_id', 'movement_type', 'quantity', 'unit_cost')
+VALUATION_FIELDS = ['quantity', 'average_cost', 'average_value', 'fifo_value', 'checkpoint', 'updated_at']
+
+
+class ProductCost:
+    """
+    حالة تقييم منتج واحد في الذاكرة: الكمية، المتوسط، والطبقات المفتوحة [movement_id, remaining, unit_cost, pk].
+
+    pk الطبقات المحفوظة وكمياتها عند التحميل في persisted، ليُكتب عند الحفظ ما تغير منها فقط.
+    """
+
+    def __init__(self, product_id, fallback_cost, quantity=0, average_cost=Decimal('0'), layers=(), checkpoint=0):
+        self.product_id = product_id
+        self.fallback_cost = fallback_cost or Decimal('0')
+        self.quantity = quantity
+        self.average_cost = average_cost
+        self.layers = deque(list(layer) for layer in layers)
+        self.persisted = {layer[3]: layer[1] for layer in self.layers}
+        self.checkpoint = checkpoint
+
+    def apply(self, movement_id, movement_type, quantity, unit_cost):
+        if movement_id <= self.checkpoint:
+            return  # عولجت في تشغيل سابق
+        if movement_type == StockMovement.MOVEMENT_IN:
+            self._receive(movement_id, quantity, self.fallback_cost if unit_cost is None else unit_cost)
+        elif movement_type == StockMovement.MOVEMENT_OUT:
+            self._issue(quantity)
+        elif quantity > self.quantity:
+            self._receive(movement_id, quantity - self.quantity, self.average_cost or self.fallback_cost)
+        else:
+            self._issue(self.quantity - quantity)
+        self.checkpoint = movement_id
+
+    def _receive(self, movement_id, quantity, unit_cost):
+        total = self.quantity * self.average_cost + quantity * unit_cost
+        self.quantity += quantity
+        self.average_cost = (total / self.quantity).quantize(COST_PLACES)
+        self.layers.append([movement_id, quantity, unit_cost, None])
+
+    def _issue(self, quantity):
+        self.quantity = max(self.quantity - quantity, 0)
+        while quantity and self.layers:
+            layer = self.layers[0]
+            taken = min(layer[1], quantity)
+            layer[1] -= taken
+            quantity -= taken
+            if not layer[1]:
+                self.layers.popleft()
+
+    @property
+    def fifo_value(self):
+        return sum((layer[1] * layer[2] for layer in self.layers), Decimal('0')).quantize(CENT)
+
+    @property
+    def average_value(self):
+        return (self.quantity * self.average_cost).quantize(CENT)
+
+
+def _load(product_ids):
+    """حالة المنتجات المحفوظة: صف ProductValuation وطبقاتها المفتوحة بترتيب الاستهلاك"""
+    layers = defaultdict(list)
+    for product_id, *layer in CostLayer.objects.filter(product_id__in=product_ids).order_by(
+        'product_id', 'movement_id',
+    ).values_list('product_id', 'movement_id', 'remaining', 'unit_cost', 'pk'):
+        layers[product_id].append(layer)
+    saved = {
+        row['product_id']: row
+        for row in ProductValuation.objects.filter(product_id__in=product_ids).values(
+            'product_id', 'quantity', 'average_cost', 'checkpoint',
+        )
+    }
+    states = {}
+    for product_id, cost_price in Product.objects.filter(pk__in=product_ids).values_list('pk', 'cost_price'):
+        row = saved.get(product_id, {})
+        states[product_id] = ProductCost(
+            product_id, cost_price,
+            quantity=row.get('quantity', 0),
+            average_cost=row.get('average_cost', Decimal('0')),
+            layers=layers[product_id],
+            checkpoint=row.get('checkpoint', 0),
+        )
+    return states
+
+
+def _save(states, replace=False):
+    """
+    حفظ حالة المنتجات: تُكتب الطبقات التي تغيرت فقط (المستهلكة تُحذف، والمستهلكة جزئيًا تُستبدل لأن
+    bulk_create أسرع كثيرًا من bulk_update، والجديدة تُضاف).
+
+    replace=True تحذف كل طبقات هذه المنتجات أولًا (إعادة البناء من الصفر).
+    """
+    if replace:
+        CostLayer.objects.filter(product_id__in=[state.product_id for state in states]).delete()
+    stale, created = [], []
+    for state in states:
+        unchanged = set()
+        for movement_id, remaining, unit_cost, pk in state.layers:
+            if pk is not None and remaining == state.persisted[pk]:
+                unchanged.add(pk)
+            else:
+                created.append(CostLayer(
+                    product_id=state.product_id, movement_id=movement_id, remaining=remaining, unit_cost=unit_cost,
+                ))
+        stale.extend(pk for pk in state.persisted if pk not in unchanged)
+    for start in range(0, len(stale), 1000):
+        CostLayer.objects.filter(pk__in=stale[start:start + 1000]).delete()
+    CostLayer.objects.bulk_create(created, batch_size=2000)
+    ProductValuation.objects.bulk_create(
+        [
+            ProductValuation(
+                product_id=state.product_id,
+                quantity=state.quantity,
+                average_cost=state.average_cost,
+                average_value=state.average_value,
+                fifo_value=state.fifo_value,
+                checkpoint=state.checkpoint,
+            )
+            for state in states
+        ],
+        update_conflicts=True, unique_fields=['product'], update_fields=VALUATION_FIELDS, batch_size=2000,
+    )
+    bump(ProductValuation)
+
+
+def current_checkpoint():
+    """آخر حركة عولجت في كل التقييمات (الحركات بعدها هي ما يقرأه التشغيل التالي)"""
+    return ProductValuation.objects.aggregate(checkpoint=Max('checkpoint'))['checkpoint'] or 0
+
+
+def update_valuations(batch_size=50000):
+    """
+    معالجة الحركات الجديدة منذ آخر تشغيل على دفعات بالمفتاح؛ تعيد عدد الحركات.
+
+    كل دفعة تقرأ وتكتب حالة كل منتج ظهر فيها مرة واحدة، لذا دفعات أكبر أقل كلفة؛ الذاكرة تتبع
+    batch_size وطبقات منتجات الدفعة فقط.
+    """
+    since = current_checkpoint()
+    # الحد الأعلى يُثبت في البداية حتى ينتهي التشغيل مهما استمر الإدخال
+    until = StockMovement.objects.aggregate(last=Max('pk'))['last'] or 0
+    movements = StockMovement.objects.filter(pk__lte=until).order_by('pk').values_list(*MOVEMENT_FIELDS)
+    processed = 0
+    while True:
+        batch = list(movements.filter(pk__gt=since)[:batch_size])
+        if not batch:
+            return processed
+        states = _load({row[1] for row in batch})
+        for movement_id, product_id, *movement in batch:
+            states[product_id].apply(movement_id, *movement)
+        with transaction.atomic():
+            _save(list(states.values()))
+        since = batch[-1][0]
+        processed += len(batch)
+
+
+def recompute(product_ids, until):
+    """إعادة بناء تقييم هذه المنتجات من الصفر بكل حركاتها حتى المعرف until؛ تعيد عدد الحركات"""
+    states = {
+        product_id: ProductCost(product_id, cost_price)
+        for product_id, cost_price in Product.objects.filter(pk__in=product_ids).values_list('pk', 'cost_price')
+    }
+    processed = 0
+    movements = StockMovement.objects.filter(product_id__in=product_ids, pk__lte=until).order_by('product_id', 'pk')
+    for movement_id, product_id, *movement in movements.values_list(*MOVEMENT_FIELDS).iterator(chunk_size=5000):
+        states[product_id].apply(movement_id, *movement)
+        processed += 1
+    with transaction.atomic():
+        _save(list(states.values()), replace=True)
+    return processed
+
+
+def _init_worker(database_name):
+    # عملية spawn جديدة: تهيئة Django والإشارة إلى نفس قاعدة البيانات (قد تكون قاعدة اختبار أو قياس)
+    import django
+
+    django.setup()
+    from django.db import connection
+
+    connection.settings_dict['NAME'] = database_name
+
+
+def _recompute_chunk(product_ids, until):
+    try:
+        return len(product_ids), recompute(product_ids, until)
+    finally:
+        connection.close()
+
+
+def recompute_all(workers=1, chunk_size=500):
+    """
+    إعادة بناء كل التقييمات على مجموعات من chunk_size منتج، بالتوازي في workers عملية.
+
+    تُعاد (chunk_products, movements) لكل مجموعة عند انتهائها. الحد الأعلى للحركات يُثبت في
+    البداية، والتشغيلات اللاحقة لـ update_valuations تكمل منه.
+    """
+    until = StockMovement.objects.aggregate(last=Max('pk'))['last'] or 0
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    chunks = [product_ids[i:i + chunk_size] for i in range(0, len(product_ids), chunk_size)]
+    if workers <= 1:
+        for chunk in chunks:
+            yield len(chunk), recompute(chunk, until)
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(str(connection.settings_dict['NAME']),),
+    )
+    with executor:
+        yield from executor.map(_recompute_chunk, chunks, [until] * len(chunks))
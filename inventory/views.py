@@ -1,61 +1,88 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Sum, F, ExpressionWrapper, DecimalField
-from django.core.paginator import Paginator
+from inventory_management.cache import cached_queryset
+from inventory_management.exports import export_response
+from inventory_management.routers import use_replica
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
 from .models import Product, Category, StockMovement
-from .forms import ProductForm, CategoryForm, StockMovementForm
+from .forms import ProductForm, CategoryForm, StockMovementForm, ProductPicker
+from .ledger import record_movement
+from .search import search_products
+from .caching import PageValidators, rows_version
+from . import typeahead
+from .pagination import KeysetPaginator
+from .utils import get_product_summary, CountedPaginator
+
+# مفاتيح ترتيب المنتجات للتصفح؛ pk في النهاية يجعل الترتيب فريدًا
+PRODUCT_ORDERINGS = {
+    'name': ('name', 'pk'),
+    'quantity': ('quantity', 'pk'),
+    '-quantity': ('-quantity', '-pk'),
+    'price': ('selling_price', 'pk'),
+    '-price': ('-selling_price', '-pk'),
+}
 
 # Views for Products
 @login_required
+@use_replica
 def product_list(request):
     search_query = request.GET.get('search', '')
     category_id = request.GET.get('category', '')
     
-    products = Product.objects.all()
+    products = Product.objects.select_related('category')
     
-    # تطبيق البحث
+    # تطبيق البحث (فهرس نصي مع ترتيب حسب الصلة، أو icontains إذا لم يوجد الفهرس)
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(sku__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = search_products(products, search_query)
     
     # تصفية حسب الفئة
     if category_id:
         products = products.filter(category_id=category_id)
     
-    # ترتيب المنتجات
-    sort_by = request.GET.get('sort', 'name')
-    if sort_by == 'quantity':
-        products = products.order_by('quantity')
-    elif sort_by == '-quantity':
-        products = products.order_by('-quantity')
-    elif sort_by == 'price':
-        products = products.order_by('selling_price')
-    elif sort_by == '-price':
-        products = products.order_by('-selling_price')
-    else:
-        products = products.order_by('name')
-    
-    # إحصائيات المخزون
-    total_products = products.count()
-    total_value = products.aggregate(
-        total=Sum(ExpressionWrapper(F('quantity') * F('cost_price'), output_field=DecimalField()))
-    )['total'] or 0
-    low_stock_count = products.filter(quantity__lte=F('reorder_level')).count()
-    
-    # التصفح
-    paginator = Paginator(products, 10)  # 10 منتجات في كل صفحة
+    # ترتيب المنتجات (نتائج البحث تُرتب حسب الصلة ما لم يُطلب ترتيب آخر)
+    sort_by = request.GET.get('sort', 'relevance' if search_query else 'name')
+    ordering = PRODUCT_ORDERINGS.get(sort_by, PRODUCT_ORDERINGS['name'])
+    
+    # إحصائيات المخزون (استعلام واحد)
+    summary = get_product_summary(products)
+    total_products = summary['total_products']
+    total_value = summary['total_value']
+    low_stock_count = summary['low_stock_count']
+    
+    # قائمة الفئات للتصفية (مخزنة حتى تتغير إحدى الفئات)
+    categories = cached_queryset(Category.objects.all())
+    
+    # الصفحة تتغير بتغير أي منتج في النتائج (الحركات تحدّث updated_at) أو أي فئة
+    validators = PageValidators(
+        request,
+        total_products,
+        summary['last_modified'],
+        [(category.pk, category.updated_at) for category in categories],
+        last_modified=max(
+            filter(None, [summary['last_modified'], *(category.updated_at for category in categories)]), default=None,
+        ),
+    )
+    not_modified = validators.not_modified()
+    if not_modified is not None:
+        return not_modified
+    
+    # التصفح (يعيد استخدام العدد المحسوب بدلًا من COUNT إضافي)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # قائمة الفئات للتصفية
-    categories = Category.objects.all()
+    if sort_by == 'relevance' and search_query:
+        # الترتيب حسب الصلة ليس مفتاحًا ثابتًا، ونتائج البحث قليلة، فنستخدم التصفح العادي
+        products = products.order_by(F('search_rank').desc(nulls_last=True), 'name', 'pk')
+        page_obj = CountedPaginator(products, 10, count=total_products).get_page(page_number)
+    else:
+        page_obj = KeysetPaginator(products, 10, ordering, count=total_products).get_page(page_number)
     
     context = {
         'page_obj': page_obj,
+        # مفتاح جزء الصفوف المخزن: الإصدار يتغير مع كل كتابة، والمفاتيح تحدد صفوف الصفحة
+        'rows_version': rows_version(),
+        'rows_key': ','.join(str(product.pk) for product in page_obj),
         'total_products': total_products,
         'total_value': total_value,
         'low_stock_count': low_stock_count,
@@ -66,11 +93,29 @@ def product_list(request):
         'title': 'Products List'
     }
     
-    return render(request, 'inventory/product_list.html', context)
+    return validators.apply(render(request, 'inventory/product_list.html', context))
 
 @login_required
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
+    latest_movement = StockMovement.objects.filter(product=OuterRef('pk')).order_by('-created_at', '-pk')
+    product = get_object_or_404(
+        Product.objects.select_related('category').annotate(
+            latest_movement_id=Subquery(latest_movement.values('pk')[:1]),
+            latest_movement_at=Subquery(latest_movement.values('created_at')[:1]),
+        ),
+        pk=pk,
+    )
+    
+    validators = PageValidators(
+        request,
+        product.updated_at,
+        product.category.updated_at,
+        product.latest_movement_id,
+        last_modified=max(filter(None, [product.updated_at, product.category.updated_at, product.latest_movement_at])),
+    )
+    not_modified = validators.not_modified()
+    if not_modified is not None:
+        return not_modified
     
     # الحركات الأخيرة لهذا المنتج
     stock_movements = StockMovement.objects.filter(product=product).order_by('-created_at')[:10]
@@ -81,25 +126,30 @@ def product_detail(request, pk):
         'title': product.name
     }
     
-    return render(request, 'inventory/product_detail.html', context)
+    return validators.apply(render(request, 'inventory/product_detail.html', context))
 
 @login_required
 def product_create(request):
     if request.method == 'POST':
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
-            product = form.save()
-            
-            # إنشاء حركة مخزون أولية إذا كانت الكمية أكبر من 0
             initial_quantity = form.cleaned_data['quantity']
-            if initial_quantity > 0:
-                StockMovement.objects.create(
-                    product=product,
-                    movement_type=StockMovement.MOVEMENT_IN,
-                    quantity=initial_quantity,
-                    reference='Initial Stock',
-                    created_by=request.user
-                )
+            
+            with transaction.atomic():
+                # الكمية الأولية تُضاف عبر حركة المخزون وليس عبر حفظ النموذج، حتى لا تُحتسب مرتين
+                product = form.save(commit=False)
+                product.quantity = 0
+                product.save()
+                
+                # إنشاء حركة مخزون أولية إذا كانت الكمية أكبر من 0
+                if initial_quantity > 0:
+                    record_movement(
+                        product,
+                        StockMovement.MOVEMENT_IN,
+                        initial_quantity,
+                        reference='Initial Stock',
+                        created_by=request.user
+                    )
             
             messages.success(request, f'Product "{product.name}" has been created successfully.')
             return redirect('product-list')
@@ -122,26 +172,36 @@ def product_update(request, pk):
         form = ProductForm(request.POST, request.FILES, instance=product)
         if form.is_valid():
             new_quantity = form.cleaned_data['quantity']
-            product = form.save()
             
-            # إنشاء حركة مخزون إذا تغيرت الكمية
-            if new_quantity != original_quantity:
-                if new_quantity > original_quantity:
-                    # إضافة مخزون
-                    movement_type = StockMovement.MOVEMENT_IN
-                    quantity = new_quantity - original_quantity
-                else:
-                    # تخفيض مخزون
-                    movement_type = StockMovement.MOVEMENT_OUT
-                    quantity = original_quantity - new_quantity
-                
-                StockMovement.objects.create(
-                    product=product,
-                    movement_type=movement_type,
-                    quantity=quantity,
-                    reference='Manual Adjustment',
-                    created_by=request.user
-                )
+            try:
+                with transaction.atomic():
+                    # حفظ الحقول المعدلة فقط؛ الكمية تتغير عبر حركة مخزون ذرية
+                    product = form.save(commit=False)
+                    product.quantity = original_quantity
+                    changed_fields = [name for name in form.changed_data if name != 'quantity']
+                    product.save(update_fields=changed_fields + ['updated_at'])
+                    
+                    # إنشاء حركة مخزون إذا تغيرت الكمية
+                    if new_quantity != original_quantity:
+                        if new_quantity > original_quantity:
+                            # إضافة مخزون
+                            movement_type = StockMovement.MOVEMENT_IN
+                            quantity = new_quantity - original_quantity
+                        else:
+                            # تخفيض مخزون
+                            movement_type = StockMovement.MOVEMENT_OUT
+                            quantity = original_quantity - new_quantity
+                        
+                        record_movement(
+                            product,
+                            movement_type,
+                            quantity,
+                            reference='Manual Adjustment',
+                            created_by=request.user
+                        )
+            except ValueError as e:
+                messages.error(request, str(e))
+                return redirect('product-detail', pk=product.pk)
             
             messages.success(request, f'Product "{product.name}" has been updated successfully.')
             return redirect('product-detail', pk=product.pk)
@@ -175,19 +235,27 @@ def product_delete(request, pk):
 
 # Views for Categories
 @login_required
+@use_replica
 def category_list(request):
-    categories = Category.objects.all().order_by('name')
-    
-    # إحصائيات لكل فئة
-    for category in categories:
-        category.product_count = Product.objects.filter(category=category).count()
+    # العدادات مخزنة في جدول الفئات، لذا تكفي قراءة واحدة مهما كان عدد الفئات، ولا قراءة حتى تتغير
+    categories = cached_queryset(Category.objects.all().order_by('name'))
+    
+    # عدادات الفئة تحدّث updated_at، فالفئات وحدها تكفي للتحقق
+    validators = PageValidators(
+        request,
+        [(category.pk, category.updated_at) for category in categories],
+        last_modified=max((category.updated_at for category in categories), default=None),
+    )
+    not_modified = validators.not_modified()
+    if not_modified is not None:
+        return not_modified
     
     context = {
         'categories': categories,
         'title': 'Categories'
     }
     
-    return render(request, 'inventory/category_list.html', context)
+    return validators.apply(render(request, 'inventory/category_list.html', context))
 
 @login_required
 def category_create(request):
@@ -247,6 +315,7 @@ def category_delete(request, pk):
 
 # Views for Stock Movements
 @login_required
+@use_replica
 def stock_movement_list(request):
     product_id = request.GET.get('product', '')
     movement_type = request.GET.get('type', '')
@@ -259,17 +328,16 @@ def stock_movement_list(request):
     if movement_type:
         stock_movements = stock_movements.filter(movement_type=movement_type)
     
-    stock_movements = stock_movements.order_by('-created_at')
+    # تصفح بالمفاتيح: لا COUNT ولا OFFSET، فالصفحات العميقة بنفس سرعة الأولى
+    paginator = KeysetPaginator(stock_movements, 15, ('-created_at', '-pk'))
+    page_obj = paginator.get_page(request.GET.get('page'))
     
-    paginator = Paginator(stock_movements, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    products = Product.objects.all().order_by('name')
+    # فلتر المنتج يحمل المنتج المختار فقط، والبحث عن غيره من product-typeahead
+    product_picker = ProductPicker(attrs={'class': 'form-select', 'id': 'product-filter'})
     
     context = {
         'page_obj': page_obj,
-        'products': products,
+        'product_picker': product_picker.render('product', product_id),
         'selected_product': product_id,
         'selected_type': movement_type,
         'movement_types': StockMovement.MOVEMENT_TYPES,
@@ -278,6 +346,19 @@ def stock_movement_list(request):
     
     return render(request, 'inventory/stock_movement_list.html', context)
 
+@login_required
+def product_typeahead(request):
+    """بحث المنتجات بالبادئة في SKU وكلمات الاسم لقوائم الاختيار: {"results": [{id, sku, name, text}]}"""
+    try:
+        limit = int(request.GET.get('limit', typeahead.DEFAULT_LIMIT))
+    except ValueError:
+        limit = typeahead.DEFAULT_LIMIT
+    results = [
+        {'id': pk, 'sku': sku, 'name': name, 'text': f'{sku} - {name}'}
+        for pk, sku, name in typeahead.search(request.GET.get('q', ''), limit)
+    ]
+    return JsonResponse({'results': results})
+
 @login_required
 def stock_movement_create(request):
     initial_product = request.GET.get('product', None)
@@ -294,7 +375,7 @@ def stock_movement_create(request):
             
             try:
                 stock_movement.save()
-                messages.success(request, f'Stock movement has been recorded successfully.')
+                messages.success(request, 'Stock movement has been recorded successfully.')
                 
                 # رجوع إلى صفحة المنتج إذا كان محددًا
                 if 'product' in request.GET:
@@ -313,15 +394,25 @@ def stock_movement_create(request):
     return render(request, 'inventory/stock_movement_form.html', context)
 
 @login_required
+@use_replica
 def low_stock_products(request):
-    products = Product.objects.filter(
-        quantity__lte=F('reorder_level'),
+    # العلم المخزن يخدمه الفهرس الجزئي product_low_stock_idx، والنتيجة مخزنة حتى يتغير منتج
+    products = cached_queryset(Product.objects.filter(
+        is_low_stock=True,
         is_active=True
-    ).order_by('quantity')
+    ).order_by('quantity'))
     
     context = {
         'products': products,
         'title': 'Low Stock Products'
     }
     
-    return render(request, 'inventory/low_stock_products.html', context)
\ No newline at end of file
+    return render(request, 'inventory/low_stock_products.html', context)
+
+@login_required
+def product_export(request):
+    return export_response('products', request.GET.get('format', 'csv'), request.GET)
+
+@login_required
+def stock_movement_export(request):
+    return export_response('movements', request.GET.get('format', 'csv'), request.GET)
@@ -0,0 +1,162 @@
+"""
+ذاكرة مؤقتة لنتائج القراءات المكلفة، مفاتيحها أرقام أجيال النماذج التي تعتمد عليها.
+
+لكل نموذج متتبع رقم جيل في الذاكرة المؤقتة يزداد عند كل حفظ أو حذف (track) وعند الكتابات الجماعية
+التي لا ترسل إشارات (bump من مسارات update و bulk_create). مفتاح كل نتيجة مخزنة يتضمن أجيال
+النماذج التي تعتمد عليها، فتغيّر أحدها يُبطل ما يعتمد عليه فقط، والمفاتيح القديمة تنتهي بمدتها.
+
+- cached: مزخرف لدالة قراءة، المفتاح من اسمها ووسائطها.
+- cached_queryset: نتيجة QuerySet كقائمة، المفتاح من SQL الاستعلام.
+- statistics: عدادات الإصابة والإخفاق لكل اسم في العملية الحالية.
+
+الحساب عند الإخفاق يقرأ من default دائمًا (انظر inventory_management/routers.py).
+
+يعمل مع أي backend في CACHES (الذاكرة المحلية والملفات للتشغيل دون خدمات خارجية). الذاكرة المحلية
+خاصة بكل عملية، فمع عدة عمليات يلزم backend مشترك حتى يصل رفع الجيل إليها كلها.
+"""
+import hashlib
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .routers import primary_reads
+
+GENERATION_PREFIX = 'generation'
+RESULT_PREFIX = 'result'
+
+_MISSING = object()
+_hits = Counter()
+_misses = Counter()
+
+
+def _cache():
+    return caches[getattr(settings, 'QUERY_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(model):
+    return f'{GENERATION_PREFIX}:{model._meta.label_lower}'
+
+
+def _initial_generation():
+    # جيل يبدأ من الوقت وليس من 1، فلا يعود مفتاح قديم صالحًا إذا حُذف عداد الجيل من الذاكرة
+    return time.time_ns() // 1000
+
+
+def generations(*models):
+    """أجيال النماذج الحالية بنفس الترتيب (قراءة واحدة من الذاكرة المؤقتة)"""
+    cache = _cache()
+    keys = [_generation_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_generation(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump(*models):
+    """رفع جيل النماذج: كل نتيجة مخزنة تعتمد على أحدها تُحسب من جديد"""
+    cache = _cache()
+    keys = [_generation_key(model) for model in models]
+
+    def bump_now():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _initial_generation(), None)
+
+    bump_now()
+    # قارئ أثناء المعاملة قد يخزن نتيجة قديمة بالجيل الجديد، لذا نرفعه مرة أخرى بعد الالتزام
+    transaction.on_commit(bump_now)
+
+
+def _saved_or_deleted(sender, **kwargs):
+    bump(sender)
+
+
+def track(*models):
+    """رفع جيل هذه النماذج مع كل حفظ أو حذف عبر ORM"""
+    for model in models:
+        label = model._meta.label_lower
+        post_save.connect(_saved_or_deleted, sender=model, dispatch_uid=f'cache:{label}:save')
+        post_delete.connect(_saved_or_deleted, sender=model, dispatch_uid=f'cache:{label}:delete')
+
+
+def _timeout(timeout):
+    if timeout is None:
+        return getattr(settings, 'QUERY_CACHE_TIMEOUT', 300)
+    return timeout() if callable(timeout) else timeout
+
+
+def _result_key(name, models, identity):
+    digest = hashlib.sha256(repr((generations(*models), identity)).encode()).hexdigest()[:32]
+    return f'{RESULT_PREFIX}:{name}:{digest}'
+
+
+def _get_or_compute(name, key, compute, timeout):
+    cache = _cache()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _hits[name] += 1
+        return value
+    _misses[name] += 1
+    # من default: نتيجة من نسخة قراءة متأخرة قد تُخزن بالجيل الجديد فتبقى حتى تنتهي مدتها
+    with primary_reads():
+        value = compute()
+    cache.set(key, value, _timeout(timeout))
+    return value
+
+
+def cached(*models, timeout=None, name=None):
+    """
+    تخزين نتيجة الدالة حسب وسائطها (repr) وأجيال models.
+
+    timeout بالثواني أو دالة تعيدها؛ None تعني QUERY_CACHE_TIMEOUT. الدالة الأصلية في .uncached.
+    """
+    def decorator(function):
+        label = name or f'{function.__module__}.{function.__qualname__}'
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            key = _result_key(label, models, (args, sorted(kwargs.items())))
+            return _get_or_compute(label, key, lambda: function(*args, **kwargs), timeout)
+
+        wrapper.uncached = function
+        return wrapper
+    return decorator
+
+
+def cached_queryset(queryset, *models, timeout=None, name=None):
+    """
+    نتيجة queryset كقائمة، مخزنة حسب SQL الاستعلام وأجيال نموذجه و models (النماذج المرتبطة التي
+    يقرأ منها عبر select_related أو الشروط).
+    """
+    try:
+        sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+    except EmptyResultSet:
+        return []
+    identity = (
+        queryset.db, sql, params, queryset._iterable_class.__name__, queryset._fields,
+        [getattr(lookup, 'prefetch_to', lookup) for lookup in queryset._prefetch_related_lookups],
+    )
+    label = name or queryset.model._meta.label_lower
+    key = _result_key(label, (queryset.model, *models), identity)
+    # نسخة من queryset حتى لا تحتفظ الأصلية بنتيجتها فتعيدها بعد تغير الجيل
+    return _get_or_compute(label, key, lambda: list(queryset.all()), timeout)
+
+
+def statistics():
+    """{name: {'hits': n, 'misses': n}} منذ بدء العملية (أو آخر reset_statistics)"""
+    return {name: {'hits': _hits[name], 'misses': _misses[name]} for name in sorted(_hits.keys() | _misses.keys())}
+
+
+def reset_statistics():
+    _hits.clear()
+    _misses.clear()
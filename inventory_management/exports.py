@@ -0,0 +1,166 @@
+"""
+تصدير المنتجات والحركات والطلبات والفواتير إلى CSV أو XLSX دون تحميل الجدول في الذاكرة.
+
+هنا آلية التصدير فقط؛ مجموعات البيانات يعرّفها التطبيق المالك لكل نموذج في exports.py الخاص به
+(inventory و orders و invoices) ويسجلها بـ register.
+
+كل مجموعة بيانات تُقرأ بـ values_list(...).iterator(chunk_size=...) فلا تُنشأ نسخ من النماذج،
+والأعمدة المرتبطة (مثل اسم الفئة) تأتي من الـ JOIN الذي يضيفه values_list نفسه. CSV يُرسل صفًا صفًا
+عبر StreamingHttpResponse؛ XLSX يُكتب بوضع write_only في ملف مؤقت على القرص ثم يُرسل على أجزاء.
+"""
+import csv
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX اختياري
+    Workbook = None
+
+CHUNK_SIZE = 2000
+CENT = Decimal('0.01')
+FILE_CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """مجموعة بيانات قابلة للتصدير: أعمدة (العنوان، المسار) ومعاملات التصفية المسموحة"""
+    name: str
+    queryset: Callable
+    columns: tuple
+    filters: dict = field(default_factory=dict)
+
+    @property
+    def headers(self):
+        return [header for header, _lookup in self.columns]
+
+    def clean_filters(self, params=None):
+        """
+        {lookup: value} من معاملات التصفية، كل قيمة محولة بـ to_python لحقلها.
+
+        القيمة غير الصالحة (category=abc أو نوع حركة غير معروف مثلًا) ترفع ValidationError هنا، قبل بدء التدفق.
+        """
+        opts = self.queryset().model._meta
+        filters = {}
+        for param, lookup in self.filters.items():
+            value = (params or {}).get(param)
+            if value:
+                model_field = opts.get_field(lookup)
+                try:
+                    value = model_field.to_python(value)
+                    if model_field.choices and value not in dict(model_field.flatchoices):
+                        raise ValidationError('Not a valid choice')
+                except ValidationError as e:
+                    raise ValidationError(f'Invalid {param}: {(params or {}).get(param)!r}') from e
+                filters[lookup] = value
+        return filters
+
+    def rows(self, filters=None, chunk_size=CHUNK_SIZE):
+        """filters من clean_filters"""
+        queryset = self.queryset().filter(**(filters or {}))
+        lookups = [lookup for _header, lookup in self.columns]
+        return queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=chunk_size)
+
+
+# name -> Dataset؛ كل تطبيق يسجل مجموعات نماذجه في <app>/exports.py (يُستورد من AppConfig.ready)
+DATASETS = {}
+
+
+def register(*datasets):
+    for dataset in datasets:
+        DATASETS[dataset.name] = dataset
+
+
+def _cell(value):
+    # Excel لا يدعم المناطق الزمنية، ونعرض الوقت المحلي في الصيغتين
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    # كل القيم العشرية المصدرة مبالغ بخانتين، والقيم المحسوبة في SQLite تعود دون تقريب
+    if isinstance(value, Decimal):
+        return value.quantize(CENT)
+    return value
+
+
+class _Echo:
+    """كائن يشبه الملف يعيد ما يُكتب فيه، ليُستخدم مع csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(dataset, filters=None, rows_per_chunk=500):
+    """أسطر CSV مجمعة في أجزاء نصية"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(dataset.headers)
+    chunk = []
+    for row in dataset.rows(filters):
+        chunk.append(writer.writerow([_cell(value) for value in row]))
+        if len(chunk) >= rows_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def xlsx_chunks(dataset, filters=None):
+    """ملف XLSX مكتوب بوضع write_only على القرص ثم مقروء على أجزاء"""
+    # نتحقق قبل بدء التدفق حتى لا يظهر الخطأ بعد إرسال الترويسات
+    if Workbook is None:
+        raise ImproperlyConfigured('XLSX export requires openpyxl')
+    return _xlsx_blocks(dataset, filters)
+
+
+def _xlsx_blocks(dataset, filters):
+    with tempfile.TemporaryFile() as output:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(dataset.name)
+        sheet.append(dataset.headers)
+        for row in dataset.rows(filters):
+            sheet.append([_cell(value) for value in row])
+        workbook.save(output)
+        output.seek(0)
+        while block := output.read(FILE_CHUNK_SIZE):
+            yield block
+
+
+def export_chunks(name, fmt, params=None):
+    """أجزاء ملف التصدير؛ معاملات التصفية تُتحقق منها فورًا (ValidationError) وليس أثناء التدفق"""
+    dataset = DATASETS[name]
+    filters = dataset.clean_filters(params)
+    if fmt == 'xlsx':
+        return xlsx_chunks(dataset, filters)
+    return csv_chunks(dataset, filters)
+
+
+def export_response(name, fmt, params=None):
+    """استجابة متدفقة لتصدير مجموعة البيانات name بالصيغة fmt (csv أو xlsx)؛ 400 لمعاملات تصفية غير صالحة"""
+    if fmt not in CONTENT_TYPES:
+        fmt = 'csv'
+    try:
+        chunks = export_chunks(name, fmt, params)
+    except ValidationError as e:
+        return HttpResponseBadRequest(' '.join(e.messages))
+    if fmt == 'csv':
+        # BOM حتى يتعرف Excel على الترميز (الأسماء العربية)
+        chunks = _prepend('\ufeff', chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    filename = f'{name}-{timezone.localdate():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _prepend(first, chunks):
+    yield first
+    yield from chunks
@@ -0,0 +1,111 @@
+"""
+توجيه القراءات الثقيلة (القوائم والتقارير) إلى نسخة القراءة REPLICA_DATABASE مع بقاء كل كتابة على default.
+
+- use_replica: مزخرف لعروض القراءة؛ قراءاتها تذهب إلى النسخة، وباقي الطلبات تقرأ من default.
+- قراءة ما كُتب: بعد أي كتابة تعود قراءات الطلب إلى default، و ReplicaPinMiddleware يضع ملف تعريف
+  يبقي طلبات المستخدم التالية على default مدة REPLICA_PIN_SECONDS (أطول من تأخر المزامنة المتوقع).
+  طلبات POST وأمثالها تقرأ من default دائمًا.
+- القراءة داخل معاملة على default تبقى عليها حتى ترى ما كتبته المعاملة.
+- نتائج inventory_management.cache تُحسب من default (primary_reads) حتى لا تُخزن نتيجة متأخرة بجيل جديد.
+
+إذا لم يكن REPLICA_DATABASE في DATABASES تذهب القراءات كلها إلى default. في الاختبارات تكون النسخة
+مرآة لقاعدة الاختبار (TEST: MIRROR).
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pinned'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_replica = contextvars.ContextVar('replica_reads', default=False)
+# ملف تعريف التثبيت أو طلب غير آمن: القراءات على default طوال الطلب
+_pinned = contextvars.ContextVar('replica_pinned', default=False)
+# كُتب شيء في هذا الطلب (أو السياق)
+_wrote = contextvars.ContextVar('database_written', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def _reads(enabled):
+    token = _replica.set(enabled)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def replica_reads():
+    """القراءات داخل هذه الكتلة من نسخة القراءة ما لم يُكتب شيء"""
+    return _reads(True)
+
+
+def primary_reads():
+    """القراءات داخل هذه الكتلة من default"""
+    return _reads(False)
+
+
+def use_replica(view):
+    """مزخرف لعروض القوائم والتقارير التي تقرأ فقط"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    # default صراحة وليس None، وإلا اتبعت القراءة قاعدة الكائن المرتبط (hints['instance']) وقد يكون من النسخة
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None or not _replica.get() or _pinned.get() or _wrote.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # النسخة هي نفس البيانات، فكائن مقروء منها يُربط بكائن يُحفظ في default
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # النسخة تُزامن من default ولا تُرحّل وحدها
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """يبقي قراءات المستخدم على default بعد أن يكتب، حتى تلحق النسخة"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = _pinned.set(PIN_COOKIE in request.COOKIES or request.method not in SAFE_METHODS)
+        wrote = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10), httponly=True,
+                    samesite='Lax',
+                )
+        finally:
+            _wrote.reset(wrote)
+            _pinned.reset(pinned)
+        return response
@@ -42,6 +42,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventory_management.routers.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'inventory_management.urls'
@@ -65,13 +66,50 @@ TEMPLATES = [
 WSGI_APPLICATION = 'inventory_management.wsgi.application'
 
 # Database
+# PRAGMAs run on every new SQLite connection (Django's init_command); see benchmarks/sqlite_profile.py
+SQLITE_PRAGMAS = [
+    'journal_mode=WAL',  # القراءات لا تنتظر الكتابة ولا العكس
+    'synchronous=NORMAL',  # آمن مع WAL؛ المزامنة عند نقاط التحقق وليس مع كل التزام
+    'busy_timeout=20000',  # انتظار القفل (بالملي ثانية) بدلًا من "database is locked" فورًا
+    'mmap_size=268435456',
+    'cache_size=-65536',  # بالكيلوبايت (64 MB لكل اتصال)
+    'temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # اتصال دائم لكل عامل بدلًا من اتصال جديد (وتنفيذ PRAGMAs) لكل طلب
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {pragma}' for pragma in SQLITE_PRAGMAS),
+            # المعاملات تأخذ قفل الكتابة عند BEGIN، فلا تفشل فورًا عند ترقية قفل قراءة إلى كتابة
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # نسخة قراءة للقوائم والتقارير (inventory_management/routers.py). هنا نفس الملف للقراءة فقط؛ في
+    # الإنتاج ملف ثانٍ يُزامن من default. في الاختبارات مرآة لقاعدة default
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # وضع السجل والمزامنة يضبطهما الكاتب
+            'init_command': ';'.join(
+                f'PRAGMA {pragma}' for pragma in SQLITE_PRAGMAS if not pragma.startswith(('journal_mode', 'synchronous'))
+            ),
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['inventory_management.routers.ReplicaRouter']
+REPLICA_DATABASE = 'replica'  # None: كل القراءات من default
+REPLICA_PIN_SECONDS = 10  # قراءات المستخدم من default بعد كتابته
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -114,5 +152,25 @@ LOGIN_URL = '/users/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/users/login/'
 
+# Invoice PDFs (invoices/pdf.py)
+# خارج MEDIA_ROOT لأن الفواتير لا تُعرض إلا عبر العرض المحمي بتسجيل الدخول
+INVOICE_PDF_CACHE_DIR = BASE_DIR / 'cache' / 'invoice_pdfs'
+INVOICE_PDF_WORKERS = None  # None = عدد الأنوية
+
+# Product picker index (inventory/typeahead.py), rebuilt per process after this many seconds
+PRODUCT_TYPEAHEAD_REFRESH = 300
+
+# Cache (inventory_management/cache.py, template fragments). LocMemCache is per process; with several
+# worker processes use a shared backend such as django.core.cache.backends.filebased.FileBasedCache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventory-management',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+QUERY_CACHE_TIMEOUT = 300  # ثوانٍ؛ الأجيال تُبطل النتائج قبلها عند أي كتابة
+
 # Crispy forms
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
\ No newline at end of file
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class InvoicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoices'
+
+    def ready(self):
+        from . import exports, signals  # noqa: F401
@@ -0,0 +1,20 @@
+"""مجموعة بيانات تصدير الفواتير بإجمالياتها المحسوبة في SQL (انظر inventory_management/exports.py)"""
+from inventory_management.exports import Dataset, register
+
+from .models import Invoice
+
+register(
+    Dataset('invoices', Invoice.objects.with_totals, (
+        ('Invoice Number', 'invoice_number'),
+        ('Order Number', 'order__order_number'),
+        ('Issue Date', 'issue_date'),
+        ('Due Date', 'due_date'),
+        ('Status', 'status'),
+        ('Subtotal', 'annotated_subtotal'),
+        ('Tax', 'annotated_tax_amount'),
+        ('Discount', 'discount'),
+        ('Total', 'annotated_total_amount'),
+        ('Paid', 'amount_paid'),
+        ('Balance Due', 'balance_due'),
+    ), {'status': 'status'}),
+)
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from invoices.models import Invoice, Payment
+
+
+class Command(BaseCommand):
+    help = 'Check the running amount_paid/balance_due of invoices against the full payment sums'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fix', action='store_true', help='Rewrite the running balances that do not match')
+
+    def handle(self, *args, **options):
+        money = DecimalField(max_digits=12, decimal_places=2)
+        payments = (
+            Payment.objects.filter(invoice=OuterRef('pk')).order_by().values('invoice')
+            .annotate(total=Sum('amount')).values('total')[:1]
+        )
+        payments_total = Coalesce(Subquery(payments, output_field=money), Value(Decimal('0'), output_field=money))
+        invoices = Invoice.objects.with_totals().annotate(payments_total=payments_total).order_by('pk')
+
+        checked = mismatched = 0
+        last_pk = 0
+        while True:
+            # مسح على دفعات حسب المفتاح الأساسي حتى لا تُقفل الجداول ولا تُحمّل كلها في الذاكرة
+            batch = list(invoices.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            wrong = []
+            for invoice in batch:
+                expected_balance = invoice.annotated_total_amount - invoice.payments_total
+                if invoice.amount_paid != invoice.payments_total or invoice.balance_due != expected_balance:
+                    mismatched += 1
+                    self.stdout.write(
+                        f'{invoice.invoice_number}: amount_paid {invoice.amount_paid} (expected {invoice.payments_total}), '
+                        f'balance_due {invoice.balance_due} (expected {expected_balance})'
+                    )
+                    wrong.append(invoice.pk)
+
+            if options['fix'] and wrong:
+                # إعادة الحساب داخل UPDATE نفسه حتى لا تضيع دفعة سُجلت بعد القراءة
+                with transaction.atomic():
+                    fixed = Invoice.objects.filter(pk__in=wrong)
+                    fixed.update(amount_paid=payments_total)
+                    fixed.refresh_balances()
+
+        action = 'fixed' if options['fix'] else 'found'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} invoices, {action} {mismatched} mismatches.'))
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.models import Invoice
+from invoices.pdf import build_document, create_executor, load_invoices, pisa, render_file
+
+
+def month(value):
+    try:
+        return date.fromisoformat(f'{value}-01')
+    except ValueError:
+        raise ValueError(f'Invalid month: {value}')
+
+
+class Command(BaseCommand):
+    help = 'Render invoice PDFs into the PDF cache using a process pool (e.g. a month-end run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=month, help='Only invoices issued in this month (YYYY-MM)')
+        parser.add_argument('--status', choices=Invoice.InvoiceStatus.values)
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to INVOICE_PDF_WORKERS or the CPU count')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help='Render again even if the PDF is already cached')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.order_by('pk')
+        if options['month']:
+            start = options['month']
+            end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+            invoices = invoices.filter(issue_date__gte=start, issue_date__lt=end)
+        if options['status']:
+            invoices = invoices.filter(status=options['status'])
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if pisa is None:
+            raise CommandError('Invoice PDFs require xhtml2pdf')
+
+        self.rendered = self.cached = self.failed = 0
+        workers = options['workers'] or settings.INVOICE_PDF_WORKERS or os.cpu_count() or 1
+        if workers == 1:
+            for document in self.documents(invoices, options):
+                self.finish(document, render_file, document.html, document.path, options['force'])
+        else:
+            self.render_parallel(invoices, workers, options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {self.rendered} PDFs, {self.cached} already cached, {self.failed} failed.'
+        ))
+        if self.failed:
+            raise CommandError(f'{self.failed} invoices could not be rendered')
+
+    def documents(self, invoices, options):
+        """HTML الفواتير التي تحتاج تحويلًا، مقروءة على دفعات حسب المفتاح الأساسي"""
+        invoices = load_invoices(invoices)
+        last_pk = 0
+        while True:
+            batch = list(invoices.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            for invoice in batch:
+                document = build_document(invoice)
+                if not options['force'] and document.is_cached():
+                    self.cached += 1
+                else:
+                    yield document
+
+    def render_parallel(self, invoices, workers, options):
+        executor = create_executor(workers)
+        # نافذة محدودة من التحويلات الجارية: تكفي لإبقاء كل العمليات مشغولة دون تحميل كل HTML في الذاكرة
+        window = workers * 4
+        running = {}
+        try:
+            for document in self.documents(invoices, options):
+                running[executor.submit(render_file, document.html, document.path, options['force'])] = document
+                if len(running) >= window:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.finish(running.pop(future), future.result)
+            for future in list(running):
+                self.finish(running.pop(future), future.result)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def finish(self, document, function, *args):
+        try:
+            function(*args)
+        except Exception as e:
+            self.failed += 1
+            self.stderr.write(f'{document.filename}: {e}')
+        else:
+            self.rendered += 1
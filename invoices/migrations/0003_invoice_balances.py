@@ -0,0 +1,37 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+def initialize_balances(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    Payment = apps.get_model('invoices', 'Payment')
+
+    for invoice in Invoice.objects.select_related('order').iterator(chunk_size=1000):
+        amount_paid = Payment.objects.filter(invoice=invoice).aggregate(total=models.Sum('amount'))['total'] or Decimal('0')
+        subtotal = invoice.order.cached_total_amount
+        tax_amount = (subtotal * invoice.tax_rate / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        balance_due = subtotal + tax_amount - invoice.discount - amount_paid
+        Invoice.objects.filter(pk=invoice.pk).update(amount_paid=amount_paid, balance_due=balance_due)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0002_initial'),
+        ('orders', '0004_order_cached_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Amount Paid'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='balance_due',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Balance Due'),
+        ),
+        migrations.RunPython(initialize_balances, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,87 @@
 # في ملف invoices/models.py
 
-from django.db import models
+from decimal import Decimal, ROUND_HALF_UP
+from typing import NamedTuple
+
+from django.db import models, transaction
+from django.db.models import F, Case, When, Value, OuterRef, Subquery, ExpressionWrapper, DecimalField
+from django.db.models.functions import Round
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from inventory_management.cache import bump
 from orders.models import Order
+from orders.numbering import next_number
+
+CENT = Decimal('0.01')
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+class InvoicePricing(NamedTuple):
+    """أرقام الفاتورة محسوبة مرة واحدة"""
+    subtotal: Decimal
+    tax_amount: Decimal
+    discount: Decimal
+    total_amount: Decimal
+
+
+def compute_pricing(subtotal, tax_rate, discount):
+    """حساب الضريبة والإجمالي من المبلغ الفرعي"""
+    subtotal = Decimal(subtotal or 0)
+    # ROUND_HALF_UP يطابق ROUND() في SQL المستخدمة في with_totals و refresh_balances
+    tax_amount = (subtotal * Decimal(tax_rate or 0) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    discount = Decimal(discount or 0)
+    return InvoicePricing(subtotal, tax_amount, discount, subtotal + tax_amount - discount)
+
+
+def total_expression(subtotal):
+    """إجمالي الفاتورة كتعبير SQL انطلاقًا من المبلغ الفرعي"""
+    return subtotal + Round(subtotal * F('tax_rate') / 100, 2) - F('discount')
+
+
+class InvoiceQuerySet(models.QuerySet):
+    def with_totals(self):
+        """إضافة المبلغ الفرعي والضريبة والخصم والإجمالي لكل فاتورة في نفس الاستعلام"""
+        subtotal = F('order__cached_total_amount')
+        tax_amount = ExpressionWrapper(Round(subtotal * F('tax_rate') / 100, 2), output_field=MONEY_FIELD)
+        return self.annotate(
+            annotated_subtotal=ExpressionWrapper(subtotal, output_field=MONEY_FIELD),
+            annotated_tax_amount=tax_amount,
+        ).annotate(
+            annotated_total_amount=ExpressionWrapper(
+                F('annotated_subtotal') + F('annotated_tax_amount') - F('discount'), output_field=MONEY_FIELD
+            ),
+        )
+    
+    def apply_payment(self, amount):
+        """إضافة مبلغ (أو طرحه إذا كان سالبًا) إلى المدفوع وتحديث الحالة في UPDATE ذري واحد"""
+        # تعابير SET تقرأ القيم السابقة للتحديث، لذا: الرصيد الجديد <= 0 يعني balance_due <= amount
+        bump(Invoice)
+        return self.update(
+            amount_paid=F('amount_paid') + amount,
+            balance_due=F('balance_due') - amount,
+            status=Case(
+                When(status=Invoice.InvoiceStatus.CANCELLED, then=F('status')),
+                When(balance_due__lte=amount, amount_paid__gt=-amount, then=Value(Invoice.InvoiceStatus.PAID)),
+                When(status=Invoice.InvoiceStatus.PAID, then=Value(Invoice.InvoiceStatus.PENDING)),
+                default=F('status'),
+            ),
+        )
+    
+    def refresh_balances(self):
+        """إعادة حساب الرصيد المستحق بعد تغير إجمالي الفاتورة (عناصر الطلب، الضريبة، الخصم)"""
+        subtotal = Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('cached_total_amount')[:1])
+        updated = self.update(
+            balance_due=ExpressionWrapper(total_expression(subtotal) - F('amount_paid'), output_field=MONEY_FIELD),
+        )
+        self.filter(
+            status=Invoice.InvoiceStatus.PENDING, balance_due__lte=0, amount_paid__gt=0,
+        ).update(status=Invoice.InvoiceStatus.PAID)
+        self.filter(
+            status=Invoice.InvoiceStatus.PAID, balance_due__gt=0,
+        ).update(status=Invoice.InvoiceStatus.PENDING)
+        bump(Invoice)
+        return updated
+
 
 class Invoice(models.Model):
     """نموذج للفواتير"""
@@ -23,42 +101,88 @@ class Invoice(models.Model):
     created_by = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, related_name='invoices', verbose_name=_('Created By'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
+    # أرصدة جارية تُحدّث ذريًا مع كل دفعة (انظر InvoiceQuerySet.apply_payment)
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, verbose_name=_('Amount Paid'))
+    balance_due = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, verbose_name=_('Balance Due'))
+    
+    objects = InvoiceQuerySet.as_manager()
+    
+    BALANCE_FIELDS = ('amount_paid', 'balance_due', 'status')
     
     def __str__(self):
         return f"Invoice #{self.invoice_number} for Order #{self.order.order_number}"
     
+    @property
+    def pricing(self):
+        """
+        المبلغ الفرعي والضريبة والخصم والإجمالي، محسوبة مرة واحدة لكل نسخة.
+        
+        تُعاد الحسابات تلقائيًا عند تغير مدخلاتها (إجمالي الطلب المخزن، نسبة الضريبة، الخصم).
+        إذا جاءت الفاتورة من with_totals() تُستخدم القيم المحسوبة في SQL دون أي استعلام إضافي.
+        """
+        if hasattr(self, 'annotated_subtotal'):
+            subtotal = self.annotated_subtotal
+        else:
+            subtotal = self.order.cached_total_amount
+        key = (subtotal, self.tax_rate, self.discount)
+        cached = getattr(self, '_pricing_cache', None)
+        if cached is None or cached[0] != key:
+            cached = (key, compute_pricing(*key))
+            self._pricing_cache = cached
+        return cached[1]
+    
+    def invalidate_pricing(self):
+        """تجاهل الأرقام المحسوبة سابقًا (تُستدعى عند تغير عناصر الطلب)"""
+        for attr in ('_pricing_cache', 'annotated_subtotal', 'annotated_tax_amount', 'annotated_total_amount'):
+            self.__dict__.pop(attr, None)
+    
     @property
     def subtotal(self):
         """حساب المبلغ الفرعي للفاتورة (بدون ضريبة وخصم)"""
-        return self.order.total_amount
+        return self.pricing.subtotal
     
     @property
     def tax_amount(self):
         """حساب مبلغ الضريبة"""
-        return self.subtotal * (self.tax_rate / 100)
+        return self.pricing.tax_amount
     
     @property
     def total_amount(self):
         """حساب المبلغ الإجمالي للفاتورة (بعد الضريبة والخصم)"""
-        return self.subtotal + self.tax_amount - self.discount
+        return self.pricing.total_amount
     
     def save(self, *args, **kwargs):
         """إنشاء رقم فاتورة فريد إذا لم يكن موجودًا"""
         if not self.invoice_number:
-            prefix = 'INV'
-            timestamp = timezone.now().strftime('%Y%m%d%H%M')
-            self.invoice_number = f"{prefix}{timestamp}"
+            self.invoice_number = next_number('INV')
         
         # تعيين تاريخ الاستحقاق كـ 30 يومًا بعد تاريخ الإصدار إذا لم يتم تحديده
         if not self.due_date:
             self.due_date = self.issue_date + timezone.timedelta(days=30)
         
-        super().save(*args, **kwargs)
+        if self._state.adding:
+            self.balance_due = self.pricing.total_amount - self.amount_paid
+            return super().save(*args, **kwargs)
+        
+        # المدفوع والرصيد تديرهما الدفعات فقط، فلا نكتب فوقهما قيمًا قديمة من الذاكرة
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('amount_paid', 'balance_due')
+            ]
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            Invoice.objects.filter(pk=self.pk).refresh_balances()
+        self.refresh_from_db(fields=self.BALANCE_FIELDS)
     
     class Meta:
         verbose_name = _('Invoice')
         verbose_name_plural = _('Invoices')
         ordering = ['-issue_date']
+        indexes = [
+            models.Index(fields=['status', '-issue_date'], name='invoice_status_issued_idx'),
+            models.Index(fields=['-issue_date'], name='invoice_issued_idx'),
+        ]
 
 
 class Payment(models.Model):
@@ -82,18 +206,31 @@ class Payment(models.Model):
         return f"Payment of {self.amount} for Invoice #{self.invoice.invoice_number}"
     
     def save(self, *args, **kwargs):
-        """تحديث حالة الفاتورة إذا تم دفع المبلغ بالكامل"""
-        super().save(*args, **kwargs)
-        
-        # حساب إجمالي المدفوعات للفاتورة
-        total_paid = self.invoice.payments.aggregate(total=models.Sum('amount'))['total'] or 0
+        """تحديث المدفوع والرصيد وحالة الفاتورة بفرق مبلغ الدفعة فقط"""
+        with transaction.atomic(using=kwargs.get('using')):
+            old = None
+            if self.pk is not None and not self._state.adding:
+                old = Payment.objects.select_for_update().filter(pk=self.pk).values('invoice_id', 'amount').first()
+            
+            super().save(*args, **kwargs)
+            
+            delta = self.amount
+            if old is not None:
+                if old['invoice_id'] == self.invoice_id:
+                    delta -= old['amount']
+                else:
+                    # نُقلت الدفعة إلى فاتورة أخرى
+                    Invoice.objects.filter(pk=old['invoice_id']).apply_payment(-old['amount'])
+            if delta:
+                Invoice.objects.filter(pk=self.invoice_id).apply_payment(delta)
         
-        # تحديث حالة الفاتورة إذا تم دفع المبلغ بالكامل
-        if total_paid >= self.invoice.total_amount and self.invoice.status != Invoice.InvoiceStatus.PAID:
-            self.invoice.status = Invoice.InvoiceStatus.PAID
-            self.invoice.save()
+        if Payment.invoice.is_cached(self):
+            self.invoice.refresh_from_db(fields=Invoice.BALANCE_FIELDS)
     
     class Meta:
         verbose_name = _('Payment')
         verbose_name_plural = _('Payments')
-        ordering = ['-payment_date']
\ No newline at end of file
+        ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['invoice', '-payment_date'], name='payment_invoice_date_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+تصدير الفواتير إلى PDF خارج مسار الطلب، مع ذاكرة تخزين على القرص.
+
+HTML الفاتورة يُولّد من القالب invoices/invoice_pdf.html (سريع)، وتحويله إلى PDF بـ xhtml2pdf (بطيء)
+يتم في ProcessPoolExecutor. الملف الناتج يُحفظ باسم sha256 لمحتوى HTML نفسه، فأي تغيير في الفاتورة
+أو عناصر طلبها أو أرصدتها أو القالب يعطي مفتاحًا جديدًا، ولا حاجة لإبطال أي شيء. المفتاح نفسه يُستخدم
+كـ ETag. النسخ القديمة تبقى على القرص حتى تُحذف (أي ملف في المجلد يمكن حذفه في أي وقت).
+
+العمليات تُنشأ بـ spawn: الخادم قد يكون متعدد الخيوط، ولا تحتاج العمليات إلى Django ولا إلى قاعدة البيانات.
+"""
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import cached_property
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import render_to_string
+
+try:
+    from xhtml2pdf import pisa
+except ImportError:  # PDF اختياري
+    pisa = None
+
+TEMPLATE_NAME = 'invoices/invoice_pdf.html'
+
+
+class PDFRenderError(Exception):
+    """فشل xhtml2pdf في تحويل HTML الفاتورة"""
+
+
+@dataclass(frozen=True)
+class InvoiceDocument:
+    """HTML فاتورة جاهز للتحويل ومفتاحه في الذاكرة المؤقتة"""
+    invoice_id: int
+    filename: str
+    html: str
+
+    @cached_property
+    def key(self):
+        return hashlib.sha256(self.html.encode()).hexdigest()
+
+    @property
+    def path(self):
+        key = self.key
+        return os.path.join(settings.INVOICE_PDF_CACHE_DIR, key[:2], f'{key}.pdf')
+
+    @property
+    def etag(self):
+        return f'"{self.key}"'
+
+    def is_cached(self):
+        return os.path.exists(self.path)
+
+
+def load_invoices(queryset):
+    """كل ما يحتاجه القالب في استعلامين: الفواتير بأرقامها ثم عناصر طلباتها"""
+    from django.db.models import Prefetch
+
+    from orders.models import OrderItem
+
+    return queryset.with_totals().select_related('order', 'order__client').prefetch_related(
+        Prefetch('order__items', queryset=OrderItem.objects.select_related('product').order_by('pk')),
+    )
+
+
+def build_document(invoice):
+    """توليد HTML الفاتورة (المحملة بـ load_invoices)"""
+    html = render_to_string(TEMPLATE_NAME, {
+        'invoice': invoice,
+        'order': invoice.order,
+        'items': invoice.order.items.all(),
+    })
+    return InvoiceDocument(invoice.pk, f'{invoice.invoice_number}.pdf', html)
+
+
+def render_file(html, path, overwrite=False):
+    """تحويل HTML إلى PDF في path؛ تعمل داخل عمليات المجموعة (دالة على مستوى الوحدة لتُمرر إليها)"""
+    if not overwrite and os.path.exists(path):
+        return path
+    if pisa is None:
+        raise ImproperlyConfigured('Invoice PDFs require xhtml2pdf')
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # الكتابة في ملف مؤقت ثم os.replace حتى لا يُقرأ ملف ناقص، حتى لو حوّلت عمليتان نفس الفاتورة
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            status = pisa.CreatePDF(html, dest=output, encoding='utf-8')
+        if status.err:
+            raise PDFRenderError(f'xhtml2pdf reported {status.err} errors')
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return path
+
+
+def create_executor(max_workers=None):
+    """ProcessPoolExecutor لتحويل الفواتير؛ max_workers الافتراضي INVOICE_PDF_WORKERS ثم عدد الأنوية"""
+    if pisa is None:
+        raise ImproperlyConfigured('Invoice PDFs require xhtml2pdf')
+    return ProcessPoolExecutor(
+        max_workers=max_workers or settings.INVOICE_PDF_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+_executor = None
+_pending = {}  # key -> Future للتحويلات الجارية في هذه العملية
+_lock = threading.RLock()  # add_done_callback يستدعي _forget فورًا إذا انتهى التحويل
+
+
+def render_in_background(document):
+    """
+    بدء تحويل الفاتورة في مجموعة العمليات المشتركة (مرة واحدة لكل مفتاح) وإعادة الـ Future.
+
+    إذا فشل تحويل سابق لنفس المفتاح يُرفع خطؤه هنا مرة واحدة، والطلب التالي يعيد المحاولة.
+    """
+    global _executor
+    key = document.key
+    with _lock:
+        future = _pending.get(key)
+        if future is not None and future.done() and not future.cancelled() and future.exception() is not None:
+            del _pending[key]
+            raise future.exception()
+        if future is None or future.cancelled():
+            if _executor is None:
+                _executor = create_executor()
+            try:
+                future = _executor.submit(render_file, document.html, document.path)
+            except BrokenProcessPool:
+                # عملية ماتت (مثلًا بسبب نفاد الذاكرة)؛ نبدأ مجموعة جديدة
+                _executor = create_executor()
+                future = _executor.submit(render_file, document.html, document.path)
+            _pending[key] = future
+            future.add_done_callback(lambda done: _forget(key, done))
+    return future
+
+
+def _forget(key, future):
+    # التحويلات الناجحة صارت على القرص؛ الفاشلة تبقى حتى يُبلّغ عنها الطلب التالي
+    if future.cancelled() or future.exception() is None:
+        with _lock:
+            if _pending.get(key) is future:
+                del _pending[key]
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from inventory_management.cache import track
+
+from .models import Invoice, Payment
+
+# نتائج القراءة المخزنة التي تعتمد على الفواتير (inventory_management/cache.py)
+track(Invoice, Payment)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    """طرح مبلغ الدفعة المحذوفة من المدفوع على الفاتورة"""
+    # عند حذف الفاتورة نفسها تُحذف دفعاتها معها، فلا داعي للتحديث
+    origin = kwargs.get('origin')
+    if isinstance(origin, Invoice) or getattr(origin, 'model', None) is Invoice:
+        return
+    Invoice.objects.filter(pk=instance.invoice_id).apply_payment(-instance.amount)
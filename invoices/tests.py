@@ -1,3 +1,218 @@
-from django.test import TestCase
+import csv
+import io
+import tempfile
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+
+from inventory.models import Category, Product
+from inventory_management.exports import export_chunks
+from orders.models import Order, OrderItem
+
+from . import pdf
+from .models import Invoice, Payment
+from .views import invoice_pdf
+
+
+class InvoiceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('client')
+        category = Category.objects.create(name='Invoices')
+        cls.products = [
+            Product.objects.create(
+                name=f'Item {i}', sku=f'INV-{i}', category=category, quantity=50,
+                cost_price=Decimal('5.00'), selling_price=Decimal('10.00'),
+            )
+            for i in range(2)
+        ]
+
+    def create_invoice(self, amount='100.00', tax_rate='15', discount='5'):
+        order = Order.objects.create(client=self.user)
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=1, price=Decimal(amount))
+        return Invoice.objects.create(order=order, tax_rate=Decimal(tax_rate), discount=Decimal(discount))
+
+
+class InvoicePricingTests(InvoiceTestCase):
+
+    def test_pricing_is_computed_once(self):
+        invoice = Invoice.objects.get(pk=self.create_invoice().pk)
+        # تحميل الطلب مرة واحدة فقط ثم لا استعلامات إضافية
+        with self.assertNumQueries(1):
+            figures = (invoice.subtotal, invoice.tax_amount, invoice.discount, invoice.total_amount)
+            self.assertEqual(invoice.total_amount, figures[3])
+        self.assertEqual(figures, (Decimal('100.00'), Decimal('15.00'), Decimal('5'), Decimal('110.00')))
+
+    def test_pricing_follows_order_item_changes(self):
+        invoice = self.create_invoice()
+        self.assertEqual(invoice.total_amount, Decimal('110.00'))
+        OrderItem.objects.create(order=invoice.order, product=self.products[1], quantity=2, price=Decimal('50.00'))
+        self.assertEqual(invoice.total_amount, Decimal('225.00'))
+
+        invoice.tax_rate = Decimal('0')
+        self.assertEqual(invoice.total_amount, Decimal('195.00'))
+
+    def test_with_totals_lists_invoices_in_one_query(self):
+        for amount in ('10.00', '20.00', '33.33'):
+            self.create_invoice(amount=amount, tax_rate='7.5', discount='1')
+
+        with self.assertNumQueries(1):
+            rows = [
+                (invoice.subtotal, invoice.tax_amount, invoice.discount, invoice.total_amount)
+                for invoice in Invoice.objects.with_totals().order_by('pk')
+            ]
+        self.assertEqual(rows, [
+            (Decimal('10.00'), Decimal('0.75'), Decimal('1.00'), Decimal('9.75')),
+            (Decimal('20.00'), Decimal('1.50'), Decimal('1.00'), Decimal('20.50')),
+            (Decimal('33.33'), Decimal('2.50'), Decimal('1.00'), Decimal('34.83')),
+        ])
+
+    def test_export_rows_carry_computed_totals(self):
+        invoice = Invoice.objects.get(pk=self.create_invoice().pk)
+        with self.assertNumQueries(1):
+            content = ''.join(export_chunks('invoices', 'csv', {'status': Invoice.InvoiceStatus.PENDING}))
+        header, row = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(dict(zip(header, row)), {
+            'Invoice Number': invoice.invoice_number, 'Order Number': invoice.order.order_number,
+            'Issue Date': str(invoice.issue_date), 'Due Date': str(invoice.due_date), 'Status': 'PENDING',
+            'Subtotal': '100.00', 'Tax': '15.00', 'Discount': '5.00', 'Total': '110.00',
+            'Paid': '0.00', 'Balance Due': '110.00',
+        })
+
+
+class PaymentBalanceTests(InvoiceTestCase):
+    def pay(self, invoice, amount):
+        return Payment.objects.create(invoice=invoice, amount=Decimal(amount), method=Payment.PaymentMethod.CASH)
+
+    def assertBalance(self, invoice, amount_paid, balance_due, status):
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        self.assertEqual(
+            (invoice.amount_paid, invoice.balance_due, invoice.status),
+            (Decimal(amount_paid), Decimal(balance_due), status),
+        )
+
+    def test_installments_update_running_balance(self):
+        invoice = self.create_invoice()
+        self.assertBalance(invoice, '0', '110.00', Invoice.InvoiceStatus.PENDING)
+
+        first = self.pay(invoice, '60.00')
+        self.assertBalance(invoice, '60.00', '50.00', Invoice.InvoiceStatus.PENDING)
+        self.pay(invoice, '50.00')
+        self.assertBalance(invoice, '110.00', '0.00', Invoice.InvoiceStatus.PAID)
+
+        first.amount = Decimal('40.00')
+        first.save()
+        self.assertBalance(invoice, '90.00', '20.00', Invoice.InvoiceStatus.PENDING)
+
+        first.delete()
+        self.assertBalance(invoice, '50.00', '60.00', Invoice.InvoiceStatus.PENDING)
+
+    def test_payment_costs_constant_queries(self):
+        invoice = self.create_invoice()
+        for _ in range(3):
+            self.pay(invoice, '1.00')
+        payment = Payment(invoice_id=invoice.pk, amount=Decimal('1.00'), method=Payment.PaymentMethod.CASH)
+        # savepoint + insert + update + release
+        with self.assertNumQueries(4):
+            payment.save()
+
+    def test_balance_follows_order_and_invoice_changes(self):
+        invoice = self.create_invoice()
+        self.pay(invoice, '110.00')
+        self.assertBalance(invoice, '110.00', '0.00', Invoice.InvoiceStatus.PAID)
+
+        OrderItem.objects.create(order=invoice.order, product=self.products[1], quantity=1, price=Decimal('20.00'))
+        self.assertBalance(invoice, '110.00', '23.00', Invoice.InvoiceStatus.PENDING)
+
+        invoice.discount = Decimal('28.00')
+        invoice.save()
+        self.assertBalance(invoice, '110.00', '0.00', Invoice.InvoiceStatus.PAID)
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        invoice = self.create_invoice()
+        self.pay(invoice, '10.00')
+        Invoice.objects.filter(pk=invoice.pk).update(amount_paid=0, balance_due=0)
+
+        out = io.StringIO()
+        call_command('reconcile_invoice_balances', stdout=out)
+        self.assertIn('found 1 mismatches', out.getvalue())
+
+        call_command('reconcile_invoice_balances', '--fix', '--batch-size', '1', stdout=io.StringIO())
+        self.assertBalance(invoice, '10.00', '100.00', Invoice.InvoiceStatus.PENDING)
+
+
+@skipUnless(pdf.pisa is not None, 'xhtml2pdf is not installed')
+class InvoicePDFTests(InvoiceTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(INVOICE_PDF_CACHE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def document(self, invoice):
+        with self.assertNumQueries(2):
+            return pdf.build_document(pdf.load_invoices(Invoice.objects.all()).get(pk=invoice.pk))
+
+    def get(self, invoice, **headers):
+        request = RequestFactory().get(f'/invoices/{invoice.pk}/pdf/', **headers)
+        request.user = self.user
+        return invoice_pdf(request, invoice.pk)
+
+    def test_key_follows_invoice_content(self):
+        invoice = self.create_invoice()
+        key = self.document(invoice).key
+        self.assertEqual(self.document(invoice).key, key)
+
+        Payment.objects.create(invoice=invoice, amount=Decimal('10.00'), method=Payment.PaymentMethod.CASH)
+        paid_key = self.document(invoice).key
+        self.assertNotEqual(paid_key, key)
+
+        OrderItem.objects.create(order=invoice.order, product=self.products[1], quantity=1, price=Decimal('20.00'))
+        self.assertNotIn(self.document(invoice).key, (key, paid_key))
+
+    def test_view_renders_in_background_then_serves_from_cache(self):
+        invoice = self.create_invoice()
+        response = self.get(invoice)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Retry-After'], '2')
+
+        # نفس الـ Future الجاري، لا تحويل ثانٍ
+        pdf.render_in_background(self.document(invoice)).result(timeout=120)
+
+        response = self.get(invoice)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        response.close()
+
+        not_modified = self.get(invoice, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_batch_command_skips_cached_invoices(self):
+        for _ in range(2):
+            self.create_invoice()
+        out = io.StringIO()
+        call_command('render_invoice_pdfs', '--workers', '1', stdout=out, stderr=io.StringIO())
+        self.assertIn('Rendered 2 PDFs, 0 already cached, 0 failed.', out.getvalue())
+
+        call_command('render_invoice_pdfs', '--workers', '1', '--status', 'PENDING', stdout=out)
+        self.assertIn('Rendered 0 PDFs, 2 already cached, 0 failed.', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+class InvoiceQueryPlanTests(TestCase):
+    def test_invoices_by_status(self):
+        plan = Invoice.objects.filter(status=Invoice.InvoiceStatus.PAID).order_by('-issue_date').explain()
+        self.assertIn('USING INDEX invoice_status_issued_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_invoice_payments(self):
+        plan = Payment.objects.filter(invoice_id=1).order_by('-payment_date').explain()
+        self.assertIn('USING INDEX payment_invoice_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
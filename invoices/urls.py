@@ -3,4 +3,6 @@ from . import views
 
 urlpatterns = [
     path('', views.invoices_list, name='invoices-list'),
+    path('export/', views.invoices_export, name='invoices-export'),
+    path('<int:pk>/pdf/', views.invoice_pdf, name='invoice-pdf'),
 ]
\ No newline at end of file
@@ -1,3 +1,59 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from inventory_management.exports import export_response
+from inventory_management.routers import use_replica
 
-# Create your views here.
+from .models import Invoice
+from .pdf import build_document, load_invoices, render_in_background
+
+PDF_RETRY_AFTER = 2  # ثوانٍ
+
+
+@login_required
+@use_replica
+def invoices_list(request):
+    """قائمة الفواتير مع أرقامها المحسوبة في نفس الاستعلام"""
+    status = request.GET.get('status', '')
+    
+    invoices = Invoice.objects.with_totals().select_related('order', 'order__client')
+    if status:
+        invoices = invoices.filter(status=status)
+    
+    paginator = Paginator(invoices, 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    context = {
+        'page_obj': page_obj,
+        'selected_status': status,
+        'statuses': Invoice.InvoiceStatus.choices,
+        'title': 'Invoices'
+    }
+    
+    return render(request, 'invoices/invoice_list.html', context)
+
+
+@login_required
+def invoices_export(request):
+    return export_response('invoices', request.GET.get('format', 'csv'), request.GET)
+
+
+@login_required
+def invoice_pdf(request, pk):
+    """PDF الفاتورة من الذاكرة المؤقتة؛ إذا لم يكن جاهزًا يبدأ تحويله في الخلفية ويعيد 202"""
+    invoice = get_object_or_404(load_invoices(Invoice.objects.all()), pk=pk)
+    document = build_document(invoice)
+
+    response = get_conditional_response(request, etag=document.etag)
+    if response is None:
+        if not document.is_cached():
+            render_in_background(document)
+            response = HttpResponse('The invoice PDF is being generated, please retry shortly.', status=202, content_type='text/plain')
+            response['Retry-After'] = str(PDF_RETRY_AFTER)
+            return response
+        response = FileResponse(open(document.path, 'rb'), content_type='application/pdf', filename=document.filename)
+    response['ETag'] = document.etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
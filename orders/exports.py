@@ -0,0 +1,15 @@
+"""مجموعة بيانات تصدير الطلبات (انظر inventory_management/exports.py)"""
+from inventory_management.exports import Dataset, register
+
+from .models import Order
+
+register(
+    Dataset('orders', Order.objects.all, (
+        ('Order Number', 'order_number'),
+        ('Date', 'created_at'),
+        ('Client', 'client__username'),
+        ('Status', 'status'),
+        ('Items', 'cached_total_items'),
+        ('Total Amount', 'cached_total_amount'),
+    ), {'status': 'status'}),
+)
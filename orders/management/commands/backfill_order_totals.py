@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored total_amount/total_items of every order from its items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        updated = 0
+        while True:
+            pks = list(
+                Order.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Order.objects.filter(pk__in=pks).refresh_totals()
+            last_pk = pks[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed totals for {updated} orders.'))
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, unique=True, verbose_name='Prefix')),
+                ('next_value', models.PositiveBigIntegerField(default=1, verbose_name='Next Value')),
+            ],
+            options={
+                'verbose_name': 'Number Sequence',
+                'verbose_name_plural': 'Number Sequences',
+            },
+        ),
+    ]
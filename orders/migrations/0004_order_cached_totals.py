@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    """حساب الإجماليات المخزنة للطلبات الموجودة في UPDATE واحد، كما في OrderQuerySet.refresh_totals"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        cached_total_amount=Coalesce(
+            Subquery(items.annotate(total=Sum(F('quantity') * F('price'), output_field=amount)).values('total')[:1]),
+            Value(0, output_field=amount),
+        ),
+        cached_total_items=Coalesce(
+            Subquery(items.annotate(total=Sum('quantity')).values('total')[:1], output_field=models.IntegerField()),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_numbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='cached_total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Total Amount'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='cached_total_items',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total Items'),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
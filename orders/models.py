@@ -1,8 +1,67 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Sum, F
+from django.db.models import Sum, F, OuterRef, Subquery, Value, DecimalField, IntegerField
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from inventory.models import Product
-from django.utils import timezone
+from inventory_management.cache import bump
+from .numbering import next_number
+
+
+class NumberSequence(models.Model):
+    """عداد لتوليد أرقام الطلبات والفواتير (انظر orders/numbering.py)"""
+    prefix = models.CharField(max_length=10, unique=True, verbose_name=_('Prefix'))
+    next_value = models.PositiveBigIntegerField(default=1, verbose_name=_('Next Value'))
+    
+    def __str__(self):
+        return f"{self.prefix} ({self.next_value})"
+    
+    class Meta:
+        verbose_name = _('Number Sequence')
+        verbose_name_plural = _('Number Sequences')
+
+
+# يُرسل بعد حفظ طلب تغيرت حالته، مع previous_status
+order_status_changed = Signal()
+# يُرسل بعد كتابات جماعية على عناصر الطلب (لا ترسل post_save)، مع items=[(order_id, product_id), ...]
+# قبل التعديل وبعده
+order_items_bulk_changed = Signal()
+
+LINE_TOTAL = F('quantity') * F('price')
+AMOUNT_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+class OrderQuerySet(models.QuerySet):
+    def annotate_totals(self):
+        """حساب الإجماليات من عناصر الطلب مباشرة (computed_total_amount و computed_total_items)"""
+        return self.annotate(
+            computed_total_amount=Coalesce(
+                Sum(F('items__quantity') * F('items__price'), output_field=AMOUNT_FIELD),
+                Value(0, output_field=AMOUNT_FIELD),
+            ),
+            computed_total_items=Coalesce(Sum('items__quantity'), Value(0)),
+        )
+    
+    def refresh_totals(self):
+        """إعادة حساب الإجماليات المخزنة لهذه الطلبات في استعلام UPDATE واحد"""
+        from invoices.models import Invoice
+        
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        updated = self.order_by().update(
+            cached_total_amount=Coalesce(
+                Subquery(items.annotate(total=Sum(LINE_TOTAL, output_field=AMOUNT_FIELD)).values('total')[:1]),
+                Value(0, output_field=AMOUNT_FIELD),
+            ),
+            cached_total_items=Coalesce(
+                Subquery(items.annotate(total=Sum('quantity')).values('total')[:1], output_field=IntegerField()),
+                Value(0),
+            ),
+        )
+        bump(Order)
+        # الرصيد المستحق على الفواتير يتبع إجمالي الطلب
+        Invoice.objects.filter(order__in=self.values('pk')).refresh_balances()
+        return updated
+
 
 class Order(models.Model):
     """نموذج للطلبات"""
@@ -20,35 +79,101 @@ class Order(models.Model):
     created_by = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, related_name='created_orders', verbose_name=_('Created By'))
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
+    # إجماليات مخزنة تُحدّث مع كل تغيير في عناصر الطلب (انظر OrderQuerySet.refresh_totals)
+    cached_total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, verbose_name=_('Total Amount'))
+    cached_total_items = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Total Items'))
+    
+    objects = OrderQuerySet.as_manager()
+    
+    TOTAL_FIELDS = ('cached_total_amount', 'cached_total_items')
     
     def __str__(self):
         return f"Order #{self.order_number} - {self.client.username}"
     
     @property
     def total_amount(self):
-        """حساب المبلغ الإجمالي للطلب"""
-        return self.items.aggregate(
-            total=Sum(F('quantity') * F('price'))
-        )['total'] or 0
+        """المبلغ الإجمالي للطلب"""
+        return self.cached_total_amount
     
     @property
     def total_items(self):
-        """حساب العدد الإجمالي للعناصر في الطلب"""
-        return self.items.aggregate(total=Sum('quantity'))['total'] or 0
+        """العدد الإجمالي للعناصر في الطلب"""
+        return self.cached_total_items
+    
+    def refresh_totals(self):
+        """إعادة حساب الإجماليات المخزنة وتحديث هذه النسخة"""
+        Order.objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=self.TOTAL_FIELDS)
+        
+        # الفاتورة المرتبطة (إن كانت محملة) تعيد حساب أرقامها من الإجمالي الجديد
+        invoice = self._state.fields_cache.get('invoice')
+        if invoice is not None:
+            invoice.invalidate_pricing()
+            invoice.refresh_from_db(fields=invoice.BALANCE_FIELDS)
     
     def save(self, *args, **kwargs):
         """إنشاء رقم طلب فريد إذا لم يكن موجودًا"""
         if not self.order_number:
-            prefix = 'ORD'
-            timestamp = timezone.now().strftime('%Y%m%d%H%M')
-            self.order_number = f"{prefix}{timestamp}"
+            self.order_number = next_number('ORD')
         
-        super().save(*args, **kwargs)
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        
+        # الإجماليات تُدار من عناصر الطلب فقط، فلا نكتب فوقها قيمًا قديمة من الذاكرة
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
+        
+        with transaction.atomic(using=kwargs.get('using')):
+            previous_status = Order.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).first()
+            super().save(*args, **kwargs)
+            if previous_status is not None and previous_status != self.status:
+                order_status_changed.send(sender=Order, order=self, previous_status=previous_status)
     
     class Meta:
         verbose_name = _('Order')
         verbose_name_plural = _('Orders')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+        ]
+
+
+class OrderItemQuerySet(models.QuerySet):
+    """عمليات جماعية على عناصر الطلب تحافظ على إجماليات الطلبات المخزنة"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        bump(OrderItem)
+        Order.objects.filter(pk__in={obj.order_id for obj in objs}).refresh_totals()
+        order_items_bulk_changed.send(sender=OrderItem, items={(obj.order_id, obj.product_id) for obj in objs})
+        return objs
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        bump(OrderItem)
+        Order.objects.filter(pk__in={obj.order_id for obj in objs}).refresh_totals()
+        return updated
+    
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            before = list(self.values_list('pk', 'order_id', 'product_id'))
+            updated = super().update(**kwargs)
+            items = {(order_id, product_id) for _pk, order_id, product_id in before}
+            # نقل العناصر إلى طلب أو منتج آخر (قيمة أو تعبير مثل Case من bulk_update) يغير الطلب الجديد أيضًا
+            if kwargs.keys() & {'order', 'order_id', 'product', 'product_id'}:
+                items.update(
+                    OrderItem.objects.using(self.db).filter(
+                        pk__in=[pk for pk, _order_id, _product_id in before],
+                    ).values_list('order_id', 'product_id')
+                )
+            bump(OrderItem)
+            Order.objects.filter(pk__in={order_id for order_id, _product_id in items}).refresh_totals()
+            order_items_bulk_changed.send(sender=OrderItem, items=items)
+        return updated
 
 
 class OrderItem(models.Model):
@@ -59,6 +184,8 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('Price'))
     notes = models.CharField(max_length=255, blank=True, null=True, verbose_name=_('Notes'))
     
+    objects = OrderItemQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Order #{self.order.order_number}"
     
@@ -68,26 +195,36 @@ class OrderItem(models.Model):
         return self.quantity * self.price
     
     def save(self, *args, **kwargs):
-        """تعيين السعر من المنتج إذا لم يتم تحديده"""
+        """تعيين السعر من المنتج إذا لم يتم تحديده، وتحديث إجماليات الطلب"""
         if not self.price:
-            self.price = self.product.price
-        
-        # إذا كان الطلب مكتمل، قم بتقليل المخزون
-        if self.order.status == Order.OrderStatus.COMPLETED and not self.id:
-            from inventory.models import StockMovement
-            # إنشاء حركة مخزون جديدة
-            StockMovement.objects.create(
-                product=self.product,
-                quantity=self.quantity,
-                movement_type=StockMovement.MovementType.REDUCTION,
-                reference=f"Order #{self.order.order_number}",
-                created_by=self.order.created_by
-            )
+            self.price = self.product.selling_price
         
-        super().save(*args, **kwargs)
+        with transaction.atomic(using=kwargs.get('using')):
+            # إذا كان الطلب مكتمل، قم بتقليل المخزون
+            if self.order.status == Order.OrderStatus.COMPLETED and not self.id:
+                from inventory.ledger import record_movement
+                from inventory.models import StockMovement
+                # إنشاء حركة مخزون جديدة
+                record_movement(
+                    self.product,
+                    StockMovement.MOVEMENT_OUT,
+                    self.quantity,
+                    reference=f"Order #{self.order.order_number}",
+                    created_by=self.order.created_by
+                )
+            
+            previous_order_id = None
+            if self.pk is not None and not self._state.adding:
+                previous_order_id = OrderItem.objects.select_for_update().filter(
+                    pk=self.pk,
+                ).values_list('order_id', flat=True).first()
+            super().save(*args, **kwargs)
+            self.order.refresh_totals()
+            # نُقل العنصر إلى طلب آخر: الطلب السابق (وفاتورته) يفقد إجماليه أيضًا
+            if previous_order_id is not None and previous_order_id != self.order_id:
+                Order.objects.filter(pk=previous_order_id).refresh_totals()
     
     class Meta:
         verbose_name = _('Order Item')
         verbose_name_plural = _('Order Items')
         unique_together = ('order', 'product')
-# Create your models here.
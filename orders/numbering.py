@@ -0,0 +1,116 @@
+"""
+توليد أرقام الطلبات والفواتير من جدول عدادات (NumberSequence) بأسلوب hi/lo.
+
+كل عملية تحجز كتلة من الأرقام بتحديث ذري واحد ثم توزعها من الذاكرة، فلا يحتاج
+معظم الأرقام إلى أي استعلام. الأرقام فريدة لكل بادئة عبر كل العمليات، ومتزايدة داخل
+العملية الواحدة؛ قد تظهر فجوات عند إعادة تشغيل العملية.
+
+داخل معاملة (إنشاء الطلبات دائمًا) تُحجز الكتلة على اتصال مستقل من خيط خاص وتُلتزم فورًا، فلا يبقى
+صف العداد مقفلًا حتى نهاية معاملة المستدعي ولا يعود العداد إن أُلغيت. على SQLite تحمل المعاملة
+الخارجية قفل الكتابة على القاعدة كلها (BEGIN IMMEDIATE)، فاتصال ثانٍ سينتظرها فقط؛ هناك يُحجز رقم
+واحد داخل المعاملة.
+
+يمكن استبدال المُخصص عبر الإعداد NUMBER_ALLOCATOR (مسار صنف)، وحجم الكتلة عبر
+NUMBER_ALLOCATOR_BLOCK_SIZE.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+
+NUMBER_WIDTH = 10
+
+
+class HiLoAllocator:
+    """مُخصص أرقام يحجز كتلًا من جدول العدادات ويوزعها من الذاكرة"""
+
+    def __init__(self, block_size=50):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._pid = os.getpid()
+        self._executor = None
+
+    def next_value(self, prefix):
+        with self._lock:
+            # العمليات المتفرعة (fork) لا ترث كتل العملية الأم حتى لا تتكرر الأرقام
+            if self._pid != os.getpid():
+                self._blocks.clear()
+                self._executor = None
+                self._pid = os.getpid()
+
+            block = self._blocks.get(prefix)
+            if block and block[0] < block[1]:
+                value = block[0]
+                block[0] += 1
+                return value
+
+            if not connection.in_atomic_block:
+                start, end = self.reserve(prefix, self.block_size)
+            elif self.reserves_outside_transaction():
+                start, end = self._reserve_outside_transaction(prefix, self.block_size)
+            else:
+                # إذا أُلغيت المعاملة الخارجية يعود العداد في قاعدة البيانات إلى قيمته السابقة،
+                # لذا لا نحتفظ بكتلة محجوزة داخل معاملة ونحجز رقمًا واحدًا فقط
+                start, _end = self.reserve(prefix, 1)
+                return start
+
+            self._blocks[prefix] = [start + 1, end]
+            return start
+
+    def reserves_outside_transaction(self):
+        """هل تُحجز الكتل داخل معاملة على اتصال مستقل (انظر وصف الوحدة)"""
+        return connection.vendor != 'sqlite'
+
+    def _reserve_outside_transaction(self, prefix, size):
+        # اتصالات Django لكل خيط، فالخيط الخاص له اتصال خارج معاملة المستدعي
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='number-allocator')
+        return self._executor.submit(self._reserve_in_worker, prefix, size).result()
+
+    def _reserve_in_worker(self, prefix, size):
+        connection.close_if_unusable_or_obsolete()
+        return self.reserve(prefix, size)
+
+    def reserve(self, prefix, size):
+        """حجز الأرقام [start, end) للبادئة المحددة"""
+        from .models import NumberSequence
+
+        sequences = NumberSequence.objects.filter(prefix=prefix)
+        while True:
+            with transaction.atomic():
+                if sequences.update(next_value=F('next_value') + size):
+                    # UPDATE يقفل الصف حتى نهاية المعاملة، فالقيمة المقروءة هي قيمتنا
+                    end = sequences.values_list('next_value', flat=True).get()
+                    return end - size, end
+            try:
+                with transaction.atomic():
+                    NumberSequence.objects.create(prefix=prefix, next_value=1 + size)
+                return 1, 1 + size
+            except IntegrityError:
+                # أنشأت عملية أخرى العداد في نفس اللحظة
+                continue
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                allocator_class = import_string(getattr(settings, 'NUMBER_ALLOCATOR', 'orders.numbering.HiLoAllocator'))
+                _allocator = allocator_class(block_size=getattr(settings, 'NUMBER_ALLOCATOR_BLOCK_SIZE', 50))
+    return _allocator
+
+
+def next_number(prefix):
+    """الرقم التالي بالشكل ORD0000000042"""
+    return f"{prefix}{get_allocator().next_value(prefix):0{NUMBER_WIDTH}d}"
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from inventory_management.cache import track
+
+from .models import Order, OrderItem
+
+# نتائج القراءة المخزنة التي تعتمد على الطلبات (inventory_management/cache.py)
+track(Order, OrderItem)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    """تحديث إجماليات الطلب بعد حذف أحد عناصره"""
+    # عند حذف الطلب نفسه تُحذف عناصره معه، فلا داعي للتحديث
+    origin = kwargs.get('origin')
+    if isinstance(origin, Order) or getattr(origin, 'model', None) is Order:
+        return
+    Order.objects.filter(pk=instance.order_id).refresh_totals()
@@ -1,3 +1,217 @@
-from django.test import TestCase
+import io
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from inventory.models import Category, Product, StockMovement
+
+from .models import NumberSequence, Order, OrderItem
+from .numbering import HiLoAllocator
+
+
+class NumberAllocatorTests(TestCase):
+    def test_reserve_returns_consecutive_blocks(self):
+        allocator = HiLoAllocator(block_size=10)
+        self.assertEqual(allocator.reserve('TST', 10), (1, 11))
+        self.assertEqual(allocator.reserve('TST', 10), (11, 21))
+        self.assertEqual(NumberSequence.objects.get(prefix='TST').next_value, 21)
+
+    def test_allocation_inside_transaction_does_not_keep_block(self):
+        allocator = HiLoAllocator(block_size=100)
+        self.assertEqual([allocator.next_value('TRX') for _ in range(3)], [1, 2, 3])
+        self.assertEqual(NumberSequence.objects.get(prefix='TRX').next_value, 4)
+
+    def test_allocation_inside_transaction_reserves_blocks_on_another_connection(self):
+        allocator = HiLoAllocator(block_size=100)
+        calls = []
+
+        def reserve(prefix, size):
+            calls.append((threading.get_ident(), connection.in_atomic_block, size))
+            return 1, 1 + size
+
+        with mock.patch.object(allocator, 'reserves_outside_transaction', return_value=True), \
+                mock.patch.object(allocator, 'reserve', side_effect=reserve):
+            self.assertEqual([allocator.next_value('OUT') for _ in range(3)], [1, 2, 3])
+        self.assertEqual(len(calls), 1)
+        thread_id, in_atomic_block, size = calls[0]
+        self.assertNotEqual(thread_id, threading.get_ident())
+        self.assertFalse(in_atomic_block)
+        self.assertEqual(size, 100)
+
+    def test_order_numbers_are_unique_within_a_minute(self):
+        client = get_user_model().objects.create_user('client')
+        numbers = {Order.objects.create(client=client).order_number for _ in range(5)}
+        self.assertEqual(len(numbers), 5)
+
+
+class NumberAllocatorConcurrencyTests(TransactionTestCase):
+    workers = 8
+    orders_per_worker = 250
+
+    def test_parallel_order_creation(self):
+        client = get_user_model().objects.create_user('client')
+        created = [[] for _ in range(self.workers)]
+
+        def worker(index):
+            try:
+                for _ in range(self.orders_per_worker):
+                    order = Order(client=client)
+                    while True:
+                        try:
+                            order.save()
+                            break
+                        except OperationalError:
+                            # قواعد SQLite في الذاكرة للاختبارات تستخدم shared cache ولا تنتظر القفل
+                            if connection.vendor != 'sqlite':
+                                raise
+                    created[index].append(order.order_number)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        numbers = [number for numbers in created for number in numbers]
+        self.assertEqual(len(numbers), self.workers * self.orders_per_worker)
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(Order.objects.count(), len(numbers))
+        for numbers in created:
+            self.assertEqual(numbers, sorted(numbers))
+
+
+def create_products(count, quantity=100):
+    category = Category.objects.create(name='Orders')
+    return [
+        Product.objects.create(
+            name=f'Item {i}', sku=f'ORD-{i}', category=category, quantity=quantity,
+            cost_price=Decimal('4.00'), selling_price=Decimal('6.50'),
+        )
+        for i in range(count)
+    ]
+
+
+class OrderTotalsTests(TestCase):
+    def setUp(self):
+        self.client_user = get_user_model().objects.create_user('client')
+        self.order = Order.objects.create(client=self.client_user)
+        self.products = create_products(3)
+
+    def assertTotals(self, amount, items):
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.total_amount, order.total_items), (Decimal(amount), items))
+
+    def test_totals_follow_item_writes(self):
+        item = OrderItem.objects.create(order=self.order, product=self.products[0], quantity=2, price=Decimal('5.00'))
+        OrderItem.objects.create(order=self.order, product=self.products[1], quantity=1)
+        self.assertTotals('16.50', 3)
+        self.assertEqual(self.order.total_amount, Decimal('16.50'))
+
+        item.quantity = 4
+        item.save()
+        self.assertTotals('26.50', 5)
+
+        item.delete()
+        self.assertTotals('6.50', 1)
+
+    def test_totals_follow_bulk_operations(self):
+        OrderItem.objects.bulk_create([
+            OrderItem(order=self.order, product=product, quantity=2, price=Decimal('1.25'))
+            for product in self.products
+        ])
+        self.assertTotals('7.50', 6)
+
+        OrderItem.objects.filter(product=self.products[0]).update(quantity=10)
+        self.assertTotals('17.50', 14)
+
+        OrderItem.objects.filter(product__in=self.products[1:]).delete()
+        self.assertTotals('12.50', 10)
+
+    def test_totals_follow_items_moved_between_orders(self):
+        other = Order.objects.create(client=self.order.client)
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=self.order, product=product, quantity=2, price=Decimal('1.25'))
+            for product in self.products
+        ])
+
+        OrderItem.objects.filter(product=self.products[0]).update(order=other)
+        self.assertTotals('5.00', 4)
+        other.refresh_from_db()
+        self.assertEqual((other.total_amount, other.total_items), (Decimal('2.50'), 2))
+
+        items[1].order = other
+        OrderItem.objects.bulk_update([items[1]], ['order'])
+        self.assertTotals('2.50', 2)
+        other.refresh_from_db()
+        self.assertEqual((other.total_amount, other.total_items), (Decimal('5.00'), 4))
+
+        OrderItem.objects.filter(order=other).update(order_id=self.order.pk)
+        self.assertTotals('7.50', 6)
+
+    def test_saving_item_on_another_order_refreshes_both(self):
+        from invoices.models import Invoice
+
+        other = Order.objects.create(client=self.order.client)
+        invoice = Invoice.objects.create(order=self.order, tax_rate=Decimal('0'))
+        item = OrderItem.objects.create(order=self.order, product=self.products[0], quantity=2, price=Decimal('3.00'))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.balance_due, Decimal('6.00'))
+
+        item.order = other
+        item.save()
+        self.assertTotals('0.00', 0)
+        other.refresh_from_db()
+        self.assertEqual((other.total_amount, other.total_items), (Decimal('6.00'), 2))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.balance_due, Decimal('0.00'))
+
+    def test_reading_totals_does_not_query(self):
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=2, price=Decimal('5.00'))
+        orders = list(Order.objects.all())
+        with self.assertNumQueries(0):
+            self.assertEqual([(o.total_amount, o.total_items) for o in orders], [(Decimal('10.00'), 2)])
+
+    def test_saving_stale_order_keeps_totals(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=3, price=Decimal('2.00'))
+        stale.notes = 'Call before delivery'
+        stale.save()
+        self.assertTotals('6.00', 3)
+
+    def test_annotate_totals_and_backfill(self):
+        OrderItem.objects.create(order=self.order, product=self.products[0], quantity=3, price=Decimal('2.00'))
+        Order.objects.update(cached_total_amount=0, cached_total_items=0)
+
+        order = Order.objects.annotate_totals().get(pk=self.order.pk)
+        self.assertEqual((order.computed_total_amount, order.computed_total_items), (Decimal('6.00'), 3))
+
+        call_command('backfill_order_totals', '--batch-size', '1', stdout=io.StringIO())
+        self.assertTotals('6.00', 3)
+
+    def test_item_of_completed_order_takes_stock(self):
+        self.order.status = Order.OrderStatus.COMPLETED
+        self.order.save()
+        OrderItem.objects.create(order=self.order, product=self.products[2], quantity=7)
+        self.products[2].refresh_from_db()
+        self.assertEqual(self.products[2].quantity, 93)
+        self.assertEqual(StockMovement.objects.get().movement_type, StockMovement.MOVEMENT_OUT)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+class OrderQueryPlanTests(TestCase):
+    def test_orders_by_status(self):
+        plan = Order.objects.filter(status=Order.OrderStatus.COMPLETED).order_by('-created_at').explain()
+        self.assertIn('USING INDEX order_status_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_orders_since(self):
+        plan = Order.objects.filter(created_at__gte=timezone.now()).explain()
+        self.assertIn('USING INDEX order_created_idx', plan)
@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('', views.orders_list, name='orders-list'),
+    path('export/', views.orders_export, name='orders-export'),
 ]
\ No newline at end of file
@@ -1,3 +1,9 @@
 from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
 
-# Create your views here.
+from inventory_management.exports import export_response
+
+
+@login_required
+def orders_export(request):
+    return export_response('orders', request.GET.get('format', 'csv'), request.GET)
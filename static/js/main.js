@@ -10,6 +10,9 @@ document.addEventListener('DOMContentLoaded', function() {
             bsAlert.close();
         });
     }, 5000);
+    
+    // قوائم المنتجات بالبحث بدلًا من تحميل الكتالوج كله
+    document.querySelectorAll('select[data-typeahead]').forEach(initTypeahead);
 });
 
 // وظيفة للبحث في الجداول
@@ -39,4 +42,50 @@ function tableSearch(inputId, tableId) {
             tr[i].style.display = "none";
         }
     }
+}
+
+// حقل بحث فوق قائمة المنتج: يملأ الخيارات من نقطة البحث (data-typeahead) مع الإبقاء على المختار
+function initTypeahead(select) {
+    if (select.hasAttribute('readonly')) {
+        return;
+    }
+    var input = document.createElement('input');
+    input.type = 'search';
+    input.className = 'form-control mb-1';
+    input.placeholder = 'Search by SKU or name...';
+    input.autocomplete = 'off';
+    select.parentNode.insertBefore(input, select);
+    
+    var timer = null;
+    var controller = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            var query = input.value.trim();
+            if (!query) {
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            var url = select.dataset.typeahead + '?q=' + encodeURIComponent(query);
+            fetch(url, {signal: controller.signal, headers: {'Accept': 'application/json'}})
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    var selected = select.value;
+                    Array.from(select.options).forEach(function(option) {
+                        if (option.value && option.value !== selected) {
+                            option.remove();
+                        }
+                    });
+                    data.results.forEach(function(product) {
+                        if (String(product.id) !== selected) {
+                            select.add(new Option(product.text, product.id));
+                        }
+                    });
+                })
+                .catch(function() {});
+        }, 200);
+    });
 }
\ No newline at end of file
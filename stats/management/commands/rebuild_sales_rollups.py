@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from orders.models import Order
+from stats.rollups import date_chunks, rebuild_range
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups for a date range in parallel chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD), defaults to the first order')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--chunk-days', type=int, default=31)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        if start is None:
+            first = Order.objects.aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write('No orders, nothing to rebuild.')
+                return
+            start = timezone.localdate(first)
+        if end is None:
+            last = Order.objects.aggregate(last=Max('created_at'))['last']
+            end = max(timezone.localdate(), timezone.localdate(last) if last else start)
+        if end < start:
+            raise CommandError('--end is before --start')
+
+        def rebuild(chunk):
+            try:
+                return chunk, rebuild_range(*chunk)
+            finally:
+                # كل خيط يفتح اتصالًا خاصًا به
+                connection.close()
+
+        chunks = list(date_chunks(start, end, options['chunk_days']))
+        if options['workers'] > 1:
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+            results = executor.map(rebuild, chunks)
+        else:
+            executor = None
+            results = ((chunk, rebuild_range(*chunk)) for chunk in chunks)
+
+        total = 0
+        try:
+            for (chunk_start, chunk_end), created in results:
+                total += created
+                self.stdout.write(f'{chunk_start} .. {chunk_end}: {created} rows')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} rollup rows in {len(chunks)} chunks.'))
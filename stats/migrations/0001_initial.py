@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('inventory', '0003_category_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('quantity', models.PositiveBigIntegerField(default=0, verbose_name='Quantity')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Revenue')),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Cost')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='inventory.category', verbose_name='Category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='inventory.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product', 'category'), name='stats_rollup_unique_cell')],
+            },
+        ),
+    ]
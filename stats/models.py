@@ -1,3 +1,28 @@
 from django.db import models
+from django.utils.translation import gettext_lazy as _
+from inventory.models import Category, Product
 
-# Create your models here.
+
+class DailySalesRollup(models.Model):
+    """مبيعات الطلبات المكتملة مجمعة لكل يوم ومنتج (انظر stats/rollups.py)"""
+    date = models.DateField(verbose_name=_('Date'))
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups', verbose_name=_('Product'))
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='sales_rollups', verbose_name=_('Category'))
+    quantity = models.PositiveBigIntegerField(default=0, verbose_name=_('Quantity'))
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('Revenue'))
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('Cost'))
+    
+    def __str__(self):
+        return f"{self.date} - {self.product.name}: {self.quantity}"
+    
+    @property
+    def profit(self):
+        return self.revenue - self.cost
+    
+    class Meta:
+        verbose_name = _('Daily Sales Rollup')
+        verbose_name_plural = _('Daily Sales Rollups')
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product', 'category'], name='stats_rollup_unique_cell'),
+        ]
@@ -0,0 +1,108 @@
+"""
+صيانة جدول DailySalesRollup.
+
+عند اكتمال الطلب (أو خروجه من حالة الاكتمال) وعند تعديل عناصر طلب مكتمل تُعاد حساب الخلايا
+المتأثرة فقط، القديمة والجديدة، من جداول الطلبات: لا فروق تُطبق على خلايا قد تكون تغيرت فئتها أو
+انتقل عنصرها. ويمكن إعادة بناء أي فترة عبر rebuild_range أو الأمر rebuild_sales_rollups.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inventory_management.cache import bump
+from orders.models import Order, OrderItem
+
+from .models import DailySalesRollup
+
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def sales_rows(items):
+    """تجميع عناصر الطلبات حسب اليوم والمنتج والفئة"""
+    return items.order_by().annotate(
+        day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()),
+    ).values('day', 'product_id', 'product__category_id').annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum(F('quantity') * F('price'), output_field=MONEY_FIELD),
+        total_cost=Sum(F('quantity') * F('product__cost_price'), output_field=MONEY_FIELD),
+    )
+
+
+def rebuild_order(order):
+    """إعادة حساب خلايا الطلب بعد دخوله حالة الاكتمال أو خروجه منها"""
+    day = timezone.localdate(order.created_at)
+    product_ids = OrderItem.objects.filter(order=order).values_list('product_id', flat=True)
+    rebuild_cells((day, product_id) for product_id in product_ids)
+
+
+def rebuild_items(items):
+    """إعادة حساب خلايا عناصر الطلبات [(order_id, product_id), ...] التي تقع في طلبات مكتملة"""
+    items = set(items)
+    days = {
+        pk: timezone.localdate(created_at)
+        for pk, created_at in Order.objects.filter(
+            pk__in={order_id for order_id, _product_id in items}, status=Order.OrderStatus.COMPLETED,
+        ).values_list('pk', 'created_at')
+    }
+    rebuild_cells((days[order_id], product_id) for order_id, product_id in items if order_id in days)
+
+
+def rebuild_cells(cells):
+    """إعادة حساب خلايا محددة [(date, product_id), ...] من جداول الطلبات"""
+    cells = set(cells)
+    if not cells:
+        return
+    with transaction.atomic():
+        for day in {day for day, _product_id in cells}:
+            product_ids = [product_id for cell_day, product_id in cells if cell_day == day]
+            DailySalesRollup.objects.filter(date=day, product_id__in=product_ids).delete()
+            _insert(day, day, product_ids)
+        bump(DailySalesRollup)
+
+
+def rebuild_range(start, end):
+    """إعادة بناء التجميعات للأيام من start إلى end (شاملة) في معاملة واحدة"""
+    with transaction.atomic():
+        DailySalesRollup.objects.filter(date__gte=start, date__lte=end).delete()
+        inserted = _insert(start, end)
+        bump(DailySalesRollup)
+        return inserted
+
+
+def _insert(start, end, product_ids=None):
+    items = OrderItem.objects.filter(
+        order__status=Order.OrderStatus.COMPLETED,
+        order__created_at__gte=_start_of(start),
+        order__created_at__lt=_start_of(end + timedelta(days=1)),
+    )
+    if product_ids is not None:
+        items = items.filter(product_id__in=product_ids)
+    rollups = [
+        DailySalesRollup(
+            date=row['day'],
+            product_id=row['product_id'],
+            category_id=row['product__category_id'],
+            quantity=row['total_quantity'],
+            revenue=row['total_revenue'] or Decimal('0'),
+            cost=row['total_cost'] or Decimal('0'),
+        )
+        for row in sales_rows(items)
+    ]
+    DailySalesRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def date_chunks(start, end, days):
+    """تقسيم الفترة إلى أجزاء متتالية بطول days يومًا"""
+    while start <= end:
+        chunk_end = min(start + timedelta(days=days - 1), end)
+        yield start, chunk_end
+        start = chunk_end + timedelta(days=1)
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from orders.models import Order, OrderItem, order_items_bulk_changed, order_status_changed
+
+from .rollups import rebuild_items, rebuild_order
+
+
+@receiver(order_status_changed, sender=Order)
+def order_status_updated(sender, order, previous_status, **kwargs):
+    """تحديث تجميعات المبيعات عند دخول الطلب حالة الاكتمال أو خروجه منها"""
+    if Order.OrderStatus.COMPLETED in (order.status, previous_status):
+        rebuild_order(order)
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_item_cell(sender, instance, **kwargs):
+    """الطلب والمنتج المخزنان قبل الحفظ، فتُعاد حساب الخلية القديمة إن نُقل العنصر"""
+    instance._previous_cell = None
+    if instance.pk is not None and not instance._state.adding:
+        instance._previous_cell = OrderItem.objects.filter(pk=instance.pk).values_list('order_id', 'product_id').first()
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    """إعادة حساب خلايا التجميع عند تعديل عنصر في طلب مكتمل"""
+    items = {(instance.order_id, instance.product_id)}
+    if getattr(instance, '_previous_cell', None):
+        items.add(instance._previous_cell)
+    rebuild_items(items)
+
+
+@receiver(order_items_bulk_changed, sender=OrderItem)
+def order_items_written_in_bulk(sender, items, **kwargs):
+    """الكتابات الجماعية على عناصر الطلب لا ترسل post_save"""
+    rebuild_items(items)
@@ -1,3 +1,198 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from inventory.ledger import record_movement
+from inventory.models import Category, Product, StockMovement
+from inventory.valuation import update_valuations
+from orders.models import Order, OrderItem
+
+from .models import DailySalesRollup
+from .rollups import rebuild_range
+from .utils import get_dashboard_stats, get_inventory_valuation, get_monthly_sales_data, get_yearly_breakdown
+from .views import statistics_view
+
+
+class StatsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('client')
+        category = Category.objects.create(name='Stats')
+        self.product = Product.objects.create(
+            name='Widget', sku='W-1', category=category, quantity=8,
+            cost_price=Decimal('2.50'), selling_price=Decimal('4.00'),
+        )
+        Product.objects.create(
+            name='Gadget', sku='G-1', category=category, quantity=100,
+            cost_price=Decimal('1.00'), selling_price=Decimal('3.00'),
+        )
+
+    def create_order(self, status=Order.OrderStatus.COMPLETED, quantity=1, created_at=None):
+        order = Order.objects.create(client=self.user, status=Order.OrderStatus.PENDING)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=Decimal('4.00'))
+        Order.objects.filter(pk=order.pk).update(created_at=created_at or timezone.now())
+        order.refresh_from_db()
+        order.status = status
+        order.save()
+        return order
+
+
+class DashboardStatsTests(StatsTestCase):
+    def test_dashboard_stats_in_two_queries(self):
+        self.create_order(quantity=2)
+        self.create_order(status=Order.OrderStatus.PENDING)
+        cache.clear()
+
+        # منتجات + طلبات
+        with self.assertNumQueries(2):
+            stats = get_dashboard_stats()
+        self.assertEqual(stats, {
+            'total_products': 2,
+            'low_stock_count': 1,
+            'stock_value': Decimal('120.00'),
+            'today_orders': 2,
+            'orders_this_month': 2,
+            'today_sales': Decimal('8.00'),
+            'monthly_sales': Decimal('8.00'),
+        })
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats(), stats)
+
+    def test_inventory_valuation_in_one_query(self):
+        record_movement(self.product, StockMovement.MOVEMENT_IN, 4, unit_cost=Decimal('3.00'))
+        update_valuations()
+        with self.assertNumQueries(1):
+            valuation = get_inventory_valuation()
+        # المخزون القديم دون حركات يظهر في القيمة بسعر التكلفة فقط
+        self.assertEqual(
+            (valuation['stock_value'], valuation['fifo_value'], valuation['average_value']),
+            (Decimal('130.00'), Decimal('12.00'), Decimal('12.00')),
+        )
+
+    def test_cache_is_invalidated_by_writes(self):
+        self.assertEqual(get_dashboard_stats()['low_stock_count'], 1)
+        StockMovement.objects.create(product=self.product, movement_type=StockMovement.MOVEMENT_IN, quantity=10)
+        self.assertEqual(get_dashboard_stats()['low_stock_count'], 0)
+
+        self.create_order(quantity=3)
+        self.assertEqual(get_dashboard_stats()['today_sales'], Decimal('12.00'))
+
+    def test_monthly_sales_data(self):
+        now = timezone.now()
+        self.create_order(quantity=5, created_at=now)
+        self.create_order(quantity=1, created_at=now - timedelta(days=400))
+
+        with self.assertNumQueries(1):
+            data = get_monthly_sales_data(now.year)
+        self.assertEqual(len(data['labels']), 12)
+        self.assertEqual(data['data'][timezone.localtime(now).month - 1], Decimal('20.00'))
+        self.assertEqual(sum(data['data']), Decimal('20.00'))
+
+
+class DailySalesRollupTests(StatsTestCase):
+    def rollup(self):
+        return list(DailySalesRollup.objects.values_list('product__sku', 'quantity', 'revenue', 'cost'))
+
+    def test_rollup_follows_completion(self):
+        order = self.create_order(status=Order.OrderStatus.PENDING, quantity=2)
+        self.assertEqual(self.rollup(), [])
+
+        order.status = Order.OrderStatus.COMPLETED
+        order.save()
+        self.assertEqual(self.rollup(), [('W-1', 2, Decimal('8.00'), Decimal('5.00'))])
+
+        self.create_order(quantity=1)
+        self.assertEqual(self.rollup(), [('W-1', 3, Decimal('12.00'), Decimal('7.50'))])
+
+        order.status = Order.OrderStatus.CANCELLED
+        order.save()
+        self.assertEqual(self.rollup(), [('W-1', 1, Decimal('4.00'), Decimal('2.50'))])
+
+    def test_rollup_follows_items_of_completed_orders(self):
+        order = self.create_order(quantity=2)
+        item = order.items.get()
+        item.quantity = 5
+        item.save()
+        self.assertEqual(self.rollup(), [('W-1', 5, Decimal('20.00'), Decimal('12.50'))])
+        item.delete()
+        self.assertEqual(self.rollup(), [])
+
+    def test_rollup_follows_category_change_before_uncompletion(self):
+        order = self.create_order(quantity=2)
+        self.product.category = Category.objects.create(name='Moved')
+        self.product.save()
+
+        order.status = Order.OrderStatus.CANCELLED
+        order.save()
+        self.assertEqual(self.rollup(), [])
+
+    def test_rollup_follows_items_moved_between_products_and_orders(self):
+        order = self.create_order(quantity=2)
+        other = self.create_order(quantity=1, created_at=timezone.now() - timedelta(days=3))
+        gadget = Product.objects.get(sku='G-1')
+        item = order.items.get()
+
+        item.product = gadget
+        item.save()
+        self.assertEqual(sorted(self.rollup()), [('G-1', 2, Decimal('8.00'), Decimal('2.00')), ('W-1', 1, Decimal('4.00'), Decimal('2.50'))])
+
+        item.order = other
+        item.save()
+        self.assertEqual(
+            sorted(DailySalesRollup.objects.values_list('date', 'product__sku', 'quantity')),
+            [(timezone.localdate(other.created_at), 'G-1', 2), (timezone.localdate(other.created_at), 'W-1', 1)],
+        )
+
+    def test_rollup_follows_bulk_item_writes(self):
+        order = self.create_order(quantity=2)
+        gadget = Product.objects.get(sku='G-1')
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=gadget, quantity=4, price=Decimal('3.00'))])
+        self.assertEqual(sorted(self.rollup()), [('G-1', 4, Decimal('12.00'), Decimal('4.00')), ('W-1', 2, Decimal('8.00'), Decimal('5.00'))])
+
+        OrderItem.objects.filter(product=gadget).update(quantity=1)
+        self.assertIn(('G-1', 1, Decimal('3.00'), Decimal('1.00')), self.rollup())
+
+        item = order.items.get(product=self.product)
+        item.quantity = 6
+        OrderItem.objects.bulk_update([item], ['quantity'])
+        self.assertIn(('W-1', 6, Decimal('24.00'), Decimal('15.00')), self.rollup())
+
+        pending = Order.objects.create(client=self.user)
+        OrderItem.objects.filter(order=order).update(order=pending)
+        self.assertEqual(self.rollup(), [])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        now = timezone.now()
+        for days in (0, 1, 1, 40, 75):
+            self.create_order(quantity=days + 1, created_at=now - timedelta(days=days))
+        incremental = sorted(DailySalesRollup.objects.values_list('date', 'product_id', 'quantity', 'revenue'))
+
+        DailySalesRollup.objects.all().delete()
+        call_command('rebuild_sales_rollups', '--chunk-days', '7', '--workers', '1', stdout=io.StringIO())
+        rebuilt = sorted(DailySalesRollup.objects.values_list('date', 'product_id', 'quantity', 'revenue'))
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(len(rebuilt), 4)
+
+        today = timezone.localdate()
+        self.assertEqual(rebuild_range(today, today), 1)
+
+    def test_statistics_view_ignores_out_of_range_year(self):
+        request = RequestFactory().get('/stats/', {'year': '10000'})
+        request.user = self.user
+        with mock.patch('stats.views.render') as render:
+            statistics_view(request)
+        self.assertEqual(render.call_args.args[2]['year'], timezone.localdate().year)
+
+    def test_yearly_breakdown_reads_rollups(self):
+        self.create_order(quantity=3)
+        breakdown = get_yearly_breakdown(timezone.localdate().year)
+        self.assertEqual(breakdown['top_products'][0]['total_revenue'], Decimal('12.00'))
+        self.assertEqual(breakdown['categories'][0]['category__name'], 'Stats')
@@ -1,18 +1,138 @@
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from inventory.models import Category, Product, ProductValuation
+from inventory_management.cache import cached
+from orders.models import Order
+
+from .models import DailySalesRollup
+
+MONTH_LABELS = [
+    'يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+    'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر',
+]
+
+
+def _stats_ttl():
+    # الإحصائيات تُبطل بأجيال النماذج التي تقرؤها؛ المدة لحدود "اليوم" و"الشهر" التي تتغير مع الوقت
+    return getattr(settings, 'DASHBOARD_STATS_TTL', 30)
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def compute_dashboard_stats():
+    """حساب إحصائيات لوحة التحكم في استعلامين: واحد للمنتجات وواحد للطلبات"""
+    today = timezone.localdate()
+    today_start = _start_of(today)
+    month_start = _start_of(today.replace(day=1))
+    completed = Q(status=Order.OrderStatus.COMPLETED)
+
+    # مجاميع المنتجات من عدادات الفئات المخزنة (صف لكل فئة بدلًا من صف لكل منتج)
+    products = Category.objects.aggregate(
+        total_products=Sum('product_count'),
+        low_stock_count=Sum('low_stock_count'),
+        total_value=Sum('stock_value'),
+    )
+    orders = Order.objects.filter(created_at__gte=month_start).aggregate(
+        today_orders=Count('pk', filter=Q(created_at__gte=today_start)),
+        orders_this_month=Count('pk'),
+        today_sales=Sum('cached_total_amount', filter=completed & Q(created_at__gte=today_start)),
+        monthly_sales=Sum('cached_total_amount', filter=completed),
+    )
+
+    return {
+        'total_products': products['total_products'] or 0,
+        'low_stock_count': products['low_stock_count'] or 0,
+        'stock_value': products['total_value'] or 0,
+        'today_orders': orders['today_orders'],
+        'orders_this_month': orders['orders_this_month'],
+        'today_sales': orders['today_sales'] or 0,
+        'monthly_sales': orders['monthly_sales'] or 0,
+    }
+
+
+@cached(Category, Order, timeout=_stats_ttl, name='stats.dashboard')
 def get_dashboard_stats():
     """استخراج البيانات الأساسية للوحة التحكم الرئيسية"""
+    return compute_dashboard_stats()
+
+
+def compute_monthly_sales_data(year):
+    """مبيعات كل شهر من السنة من جدول التجميعات اليومية (استعلام واحد على O(أيام) صفوف)"""
+    # التجميع حسب اليوم في القاعدة ثم حسب الشهر هنا: ExtractMonth على SQLite دالة بايثون تُستدعى لكل صف
+    daily = DailySalesRollup.objects.filter(
+        date__gte=date(year, 1, 1), date__lt=date(year + 1, 1, 1),
+    ).order_by().values('date').annotate(
+        total=Sum('revenue'),
+    ).values_list('date', 'total')
+    totals = [0] * 12
+    for day, total in daily:
+        totals[day.month - 1] += total or 0
     return {
-        'total_products': 0,
-        'low_stock_count': 0,
-        'stock_value': 0,
-        'today_orders': 0,
-        'orders_this_month': 0,
-        'today_sales': 0,
-        'monthly_sales': 0
+        'labels': MONTH_LABELS,
+        'data': totals,
     }
 
+
+def compute_yearly_breakdown(year):
+    """أفضل المنتجات ومبيعات كل فئة خلال السنة من جدول التجميعات"""
+    rollups = DailySalesRollup.objects.filter(date__gte=date(year, 1, 1), date__lt=date(year + 1, 1, 1)).order_by()
+    totals = {'total_quantity': Sum('quantity'), 'total_revenue': Sum('revenue'), 'total_cost': Sum('cost')}
+    return {
+        'top_products': list(
+            rollups.values('product_id', 'product__name').annotate(**totals).order_by('-total_revenue')[:10]
+        ),
+        'categories': list(
+            rollups.values('category_id', 'category__name').annotate(**totals).order_by('-total_revenue')
+        ),
+    }
+
+
+def compute_inventory_valuation():
+    """قيمة المخزون لكل فئة بسعر التكلفة الحالي وبطريقتي FIFO والمتوسط المتحرك (انظر inventory/valuation.py)"""
+    categories = list(
+        Category.objects.order_by('name').annotate(
+            fifo_value=Sum('products__valuation__fifo_value'),
+            average_value=Sum('products__valuation__average_value'),
+        ).values('pk', 'name', 'stock_value', 'fifo_value', 'average_value')
+    )
+    for row in categories:
+        row['fifo_value'] = row['fifo_value'] or 0
+        row['average_value'] = row['average_value'] or 0
+    return {
+        'categories': categories,
+        'stock_value': sum(row['stock_value'] for row in categories),
+        'fifo_value': sum(row['fifo_value'] for row in categories),
+        'average_value': sum(row['average_value'] for row in categories),
+    }
+
+
 def get_monthly_sales_data(year=None):
     """استخراج بيانات المبيعات الشهرية للسنة المحددة"""
-    return {
-        'labels': ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو'],
-        'data': [0, 0, 0, 0, 0, 0]
-    }
\ No newline at end of file
+    return _monthly_sales_data(year or timezone.localdate().year)
+
+
+@cached(DailySalesRollup, timeout=_stats_ttl, name='stats.monthly')
+def _monthly_sales_data(year):
+    return compute_monthly_sales_data(year)
+
+
+def get_yearly_breakdown(year=None):
+    """استخراج أفضل المنتجات ومبيعات الفئات للسنة المحددة"""
+    return _yearly_breakdown(year or timezone.localdate().year)
+
+
+@cached(DailySalesRollup, Product, Category, timeout=_stats_ttl, name='stats.breakdown')
+def _yearly_breakdown(year):
+    return compute_yearly_breakdown(year)
+
+
+@cached(Category, ProductValuation, timeout=_stats_ttl, name='stats.valuation')
+def get_inventory_valuation():
+    """استخراج تقييم المخزون لكل فئة"""
+    return compute_inventory_valuation()
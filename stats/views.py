@@ -1,8 +1,30 @@
+from datetime import MAXYEAR, MINYEAR
+
 from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.utils import timezone
+from inventory_management.routers import use_replica
+from .utils import get_inventory_valuation, get_monthly_sales_data, get_yearly_breakdown
 
+@login_required
+@use_replica
 def statistics_view(request):
-    """عرض الإحصائيات"""
+    """عرض الإحصائيات (من جدول التجميعات اليومية وتقييمات المخزون المحسوبة مسبقًا فقط)"""
+    try:
+        year = int(request.GET.get('year', ''))
+    except ValueError:
+        year = None
+    # الاستعلامات تحتاج date(year + 1, 1, 1)
+    if year is None or not MINYEAR <= year < MAXYEAR:
+        year = timezone.localdate().year
+    
+    breakdown = get_yearly_breakdown(year)
     context = {
-        'title': 'الإحصائيات'
+        'title': 'الإحصائيات',
+        'year': year,
+        'sales_data': get_monthly_sales_data(year),
+        'top_products': breakdown['top_products'],
+        'category_sales': breakdown['categories'],
+        'valuation': get_inventory_valuation(),
     }
-    return render(request, 'stats/statistics.html', context)
\ No newline at end of file
+    return render(request, 'stats/statistics.html', context)